@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: concurrent_hosts.py
+ Author: longhui
+ Created Time: 2026-10-19 02:05:51
+ Descriptions: the host drivers which can be called from many threads at the same time, to keep dozens of cmdb
+        requests in flight for bulk sync and delete. The requests in flight are limited by a semaphore, a failed
+        request is retried with exponential backoff and jitter, and the last response is kept per thread, so create,
+        delete, update, query and the respond_* properties work as in HostDriver.
+"""
+
+import random
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from app.cmdb.hosts import HostDriver, VirtualHostDriver
+from app.cmdb.settings import CMDB_MAX_IN_FLIGHT, CMDB_RETRIES, CMDB_RETRY_BACKOFF, QUERY_PAGE_SIZE
+from lib.Log.log import log
+
+
+# the idempotent methods are retried when the response is not got, POST and PATCH only when it is not sent
+IDEMPOTENT_METHODS = ("GET", "PUT", "DELETE")
+RETRY_STATUS = (requests.codes.too_many_requests, requests.codes.bad_gateway, requests.codes.service_unavailable,
+                requests.codes.gateway_timeout)
+
+
+class LimitedSession(object):
+    """
+    wrap a requests session, the failed requests are retried. The requests in flight are limited by the adapter of
+    the session from session manager, so the ones sent again after login are counted too.
+    """
+
+    def __init__(self, session, semaphore=None, retries=CMDB_RETRIES, backoff=CMDB_RETRY_BACKOFF):
+        """
+        :param semaphore: limit the requests in flight of a session not from session manager
+        """
+        self.session = session
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = semaphore
+
+    def __getattr__(self, name):
+        # cookies, headers and the others of session
+        return getattr(self.session, name)
+
+    def _sleep(self, attempt):
+        # full jitter, the requests failed together do not retry together
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        attempt = 0
+        while True:
+            try:
+                if self._semaphore is None:
+                    resp = self.session.request(method, url, **kwargs)
+                else:
+                    with self._semaphore:
+                        resp = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout as error:
+                if attempt >= self.retries:
+                    raise
+                log.debug("Connect to %s timeout: %s, retry.", url, error)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+                if attempt >= self.retries or method not in IDEMPOTENT_METHODS:
+                    raise
+                log.debug("Request %s %s failed: %s, retry.", method, url, error)
+            else:
+                if resp.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return resp
+                log.debug("Request %s %s return %s, retry.", method, url, resp.status_code)
+                resp.close()
+            self._sleep(attempt)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+
+def gather(func, items, workers=CMDB_MAX_IN_FLIGHT):
+    """
+    call func(item) for the items concurrently
+    :return: a list of the returns in same order as items, the exception raised by a call is returned in its place
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return func(item)
+        except Exception as error:
+            log.debug("Exception raise when call %s with %s: %s", getattr(func, "__name__", func), item, error)
+            return error
+
+    thread_pool = ThreadPool(min(workers, len(items)))
+    try:
+        return thread_pool.map(call, items)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+
+class ConcurrentMixin(object):
+    """
+    make a HostDriver safe to call in threads, and add the bulk methods
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super(ConcurrentMixin, self).__init__(*args, **kwargs)
+        if self.session is not None:
+            self.session = LimitedSession(self.session)
+
+    # the last response and its parsed result are per thread
+    @property
+    def resp(self):
+        return getattr(self._local, "resp", None)
+
+    @resp.setter
+    def resp(self, value):
+        self._local.resp = value
+
+    @property
+    def _result(self):
+        return getattr(self._local, "result", None)
+
+    @_result.setter
+    def _result(self, value):
+        self._local.result = value
+
+    def create_many(self, records, workers=CMDB_MAX_IN_FLIGHT):
+        """
+        :param records: a list of dict, the kwargs of create
+        :return: a list of True or False in same order as records
+        """
+        return [ret is True for ret in gather(lambda record: self.create(**record), records, workers)]
+
+    def delete_many(self, ids=None, sns=None, hostnames=None, workers=CMDB_MAX_IN_FLIGHT):
+        """
+        delete the records with the ids, sns or hostnames
+        :return: a list of True or False in same order as the given ones
+        """
+        if ids:
+            keys = [{"id": id} for id in ids]
+        elif sns:
+            keys = [{"sn": sn} for sn in sns]
+        else:
+            keys = [{"hostname": hostname} for hostname in hostnames or []]
+        return [ret is True for ret in gather(lambda key: self.delete(**key), keys, workers)]
+
+    def update_many(self, updates, workers=CMDB_MAX_IN_FLIGHT):
+        """
+        :param updates: a list of (record, data), the record got from query
+        :return: a list of True or False in same order as updates
+        """
+        return [ret is True for ret in gather(lambda update: self.update_record(update[0], data=update[1]),
+                                              updates, workers)]
+
+    def query_each(self, sns, **filters):
+        """
+        query the sns concurrently one by one
+        :return: {sn: record} of the sns found
+        """
+        sns = list(set(sns))
+        results = gather(lambda sn: self.query_page(sn=sn, **filters).records, sns)
+        return dict((sn, records[0]) for sn, records in zip(sns, results) if isinstance(records, list) and records)
+
+    def query_many(self, sns, page_size=QUERY_PAGE_SIZE, **filters):
+        """
+        the sns no more than the requests in flight are queried concurrently one by one, else read page by page
+        :return: {sn: record} of the sns found
+        """
+        if len(set(sns)) <= CMDB_MAX_IN_FLIGHT:
+            return self.query_each(sns, **filters)
+        return super(ConcurrentMixin, self).query_many(sns, page_size=page_size, **filters)
+
+
+class ConcurrentHostDriver(ConcurrentMixin, HostDriver):
+    pass
+
+
+class ConcurrentVirtualHostDriver(ConcurrentMixin, VirtualHostDriver):
+    pass
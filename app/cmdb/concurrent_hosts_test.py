@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: concurrent_hosts_test.py
+ Author: longhui
+ Created Time: 2026-10-19 02:37:14
+'''
+import threading
+import time
+import unittest
+
+import requests
+
+from app.cmdb.concurrent_hosts import ConcurrentHostDriver, LimitedSession, gather
+from app.cmdb.query_result import QueryResult
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.calls.append(method)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            result = self.results.pop(0) if self.results else FakeResponse(200)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class LimitedSessionTestCase(unittest.TestCase):
+
+    def test_retry(self):
+        session = FakeSession([requests.exceptions.ConnectionError("reset"), FakeResponse(503), FakeResponse(200)])
+        limited = LimitedSession(session, retries=3, backoff=0.001)
+        self.assertEqual(limited.get("http://cmdb/hosts/").status_code, 200)
+        self.assertEqual(len(session.calls), 3)
+
+        # a post may be handled by the server already, not sent again
+        session = FakeSession([requests.exceptions.ConnectionError("reset")])
+        limited = LimitedSession(session, retries=3, backoff=0.001)
+        self.assertRaises(requests.exceptions.ConnectionError, limited.post, "http://cmdb/hosts/")
+        self.assertEqual(len(session.calls), 1)
+        session = FakeSession([requests.exceptions.ReadTimeout("timeout")])
+        limited = LimitedSession(session, retries=3, backoff=0.001)
+        self.assertRaises(requests.exceptions.ReadTimeout, limited.patch, "http://cmdb/hosts/1")
+        self.assertEqual(len(session.calls), 1)
+
+        # the last response is returned when all retries failed
+        session = FakeSession([FakeResponse(503)] * 3)
+        limited = LimitedSession(session, retries=2, backoff=0.001)
+        self.assertEqual(limited.delete("http://cmdb/hosts/1").status_code, 503)
+
+    def test_gather_in_flight(self):
+        session = FakeSession([])
+        limited = LimitedSession(session, semaphore=threading.BoundedSemaphore(4))
+        results = gather(lambda index: limited.get("http://cmdb/hosts/%s" % index).status_code, range(20), workers=10)
+        self.assertEqual(results, [200] * 20)
+        self.assertTrue(session.max_in_flight <= 4)
+
+    def test_gather_exception(self):
+        results = gather(lambda item: 10 // item, [1, 0, 2])
+        self.assertEqual(results[0], 10)
+        self.assertTrue(isinstance(results[1], ZeroDivisionError))
+        self.assertEqual(results[2], 5)
+
+    def test_query_each(self):
+        driver = ConcurrentHostDriver.__new__(ConcurrentHostDriver)
+        driver._local = threading.local()
+        queried = []
+
+        def query_page(sn=None, **filters):
+            queried.append(sn)
+            return QueryResult(records=[{"sn": sn}] if sn != "unknown" else [])
+
+        driver.query_page = query_page
+        self.assertEqual(driver.query_each(["sn1", "sn2", "unknown", "sn1"]),
+                         {"sn1": {"sn": "sn1"}, "sn2": {"sn": "sn2"}})
+        # only the sns are queried, no page of other records
+        self.assertEqual(sorted(queried), ["sn1", "sn2", "unknown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,7 @@
 """
 
 
+from app.cmdb.query_result import QueryResult
 from lib.Db.db_driver import DatabaseDriver
 
 
@@ -30,8 +31,20 @@ class FakeDBDriver(DatabaseDriver):
     def delete(self, id=None):
         return True
 
-    def update(self, id=None, data=None):
+    def update(self, id=None, data=None, **kwargs):
         return True
 
-    def query(self, id=None):
+    def update_record(self, record, data=None, json_data=None):
         return True
+
+    def query(self, id=None, **kwargs):
+        return True
+
+    def query_by_host(self, vm_host_ip, **kwargs):
+        return QueryResult(records=[])
+
+    def query_many(self, sns, **kwargs):
+        return dict((sn, {"sn": sn}) for sn in sns)
+
+    def query_each(self, sns, **kwargs):
+        return dict((sn, {"sn": sn}) for sn in sns)
@@ -6,10 +6,8 @@
  Created Time: 2018-03-27 10:14:53
 """
 
-import json
-
-import requests
-
+from app.cmdb.query_result import QueryResult
+from app.cmdb.session_manager import get_session_manager
 from app.cmdb.settings import DB_HOST, LOGOUT_URL, LOGIN_URL
 from lib.Db.db_driver import DatabaseDriver
 from lib.Log.log import log
@@ -22,34 +20,18 @@ class HostDbDriver(DatabaseDriver):
         self.login_url = LOGIN_URL
         self.logout_url = LOGOUT_URL
         self.url = None
+        self._result = None
 
-        login_data = {'username': self.user, 'password': self.passwd}
-
-        try:
-            self.session = requests.Session()
-            login_res = self.session.post(self.login_url, data=login_data)
-            res_content = json.loads(login_res.content)
-
-            if res_content['status'] == 1:  # the success check depend on the login html
-                log.debug("Login url [%s] check with username [%s] success.", self.db_host, self.user)
-            else:
-                log.error("Login url [%s] check with username [%s] failed.", self.db_host, self.user)
-                self.session = None
-        except requests.exceptions.ConnectionError as connerror:
-            log.exception("Connection exception: %s", connerror)
-            self.session = None
-        except Exception as error:
-            log.exception("Exception when init session: %s", error)
-            self.session = None
+        # the logged in session is shared by all the drivers in process
+        self.session = get_session_manager().get_session(self.user, self.passwd)
+        if self.session is None:
+            log.error("Login url [%s] with username [%s] failed.", self.db_host, self.user)
 
     def close(self):
         """
-        logout and close the session
+        release the session, it is kept logged in for the other drivers and processes
         :return:
         """
-        self.session.get(self.logout_url)
-        self.session.cookies.clear()
-        self.session.close()
         self.session = None
 
     @classmethod
@@ -60,31 +42,29 @@ class HostDbDriver(DatabaseDriver):
         """
         return "/".join(url.strip('/').split('/')[3:])
 
+    @property
+    def result(self):
+        """
+        :return: the QueryResult of the last response, it is parsed only once
+        """
+        if self._result is None or self._result.resp is not self.resp:
+            self._result = QueryResult(self.resp)
+        return self._result
+
     @property
     def respond_data(self):
         """
         return the HTTP response data
         :return:
         """
-        try:
-            if isinstance(self.resp, requests.models.Response):
-                return json.loads(self.resp.content).get('data', {})
-            elif isinstance(self.resp, str):
-                return json.loads(self.resp).get('data', {})
-            elif isinstance(self.resp, dict):
-                return self.resp.get('data', {})
-        except ValueError as error:
-            log.exception(error)
-
-        return {}
+        return self.result.data
 
     @property
     def respond_data_count(self):
         """
         :return: return the record counts in response
         """
-        count = self.respond_data.get("count", 0)
-        return int(count)
+        return self.result.count
 
     @property
     def respond_data_list(self):
@@ -92,7 +72,7 @@ class HostDbDriver(DatabaseDriver):
         return the respond data list
         :return: a list of records and each record is a dict
         """
-        return self.respond_data.get("list", [])
+        return self.result.records
 
     @property
     def is_respond_error(self):
@@ -100,17 +80,14 @@ class HostDbDriver(DatabaseDriver):
         return True is error occur in the content else False
         :return:
         """
-        if "errors" in self.respond_data:
-            return True
-
-        return False
+        return self.result.is_error
 
     @property
     def respond_errors(self):
         """
         :return: the errors in response
         """
-        return self.respond_data.get('errors', "Can not get errors.")
+        return self.result.errors
 
     @property
     def respond_msg(self):
@@ -118,14 +95,7 @@ class HostDbDriver(DatabaseDriver):
         return the msg in http response content
         :return:
         """
-        if isinstance(self.resp, requests.models.Response):
-            return json.loads(self.resp.content).get("msg", "")
-        elif isinstance(self.resp, str):
-            return json.loads(self.resp).get("msg", "")
-        elif isinstance(self.resp, dict):
-            return self.resp.get("msg", "")
-
-        return ""
+        return self.result.msg
 
     @property
     def respond_code(self):
@@ -133,11 +103,4 @@ class HostDbDriver(DatabaseDriver):
         return the HTTP response code
         :return:
         """
-        if isinstance(self.resp, requests.models.Response):
-            return json.loads(self.resp.content).get("code", None)
-        elif isinstance(self.resp, str):
-            return json.loads(self.resp).get("code", None)
-        elif isinstance(self.resp, dict):
-            return self.resp.get("code", None)
-
-        return None
+        return self.result.code
@@ -6,7 +6,8 @@ import json
 import requests
 
 from app.cmdb.host_driver import HostDbDriver
-from app.cmdb.settings import HOSTs_URL
+from app.cmdb.query_result import QueryResult
+from app.cmdb.settings import HOSTs_URL, QUERY_BY_SN_MAX, QUERY_PAGE_SIZE
 from lib.Log.log import log
 
 
@@ -106,58 +107,76 @@ class HostDriver(HostDbDriver):
             log.error("No record found with ID:%s, hostname:%s, sn:%s", id, hostname, sn)
             return False
 
-        modified = query_list[0]['modified']
-        record_id = query_list[0]['id']
-        url = self.url + str(record_id) + "/"  # update url should be endwith "/"
+        return self.update_record(query_list[0], data=data, json_data=json_data)
+
+    def update_record(self, record, data=None, json_data=None):
+        """
+        update a record got from query, without query it again. It is safe to call in threads with the same driver.
+        :param record: the record dict with 'id' and 'modified'
+        :param data: Dict data
+        :param json_data: Dict data, the None values are set to null
+        :return: True or False
+        """
+        url = self.url + str(record['id']) + "/"  # update url should be endwith "/"
 
         if data:
-            data['modified'] = str(modified)
+            data = dict(data, modified=str(record['modified']))
             log.debug("Patch url:%s, data: %s", url, data.get('comment', data))
-            self.resp = self.session.patch(url, data=data)  # When dict value is None, pass in data will not set db null
+            resp = self.session.patch(url, data=data)  # When dict value is None, pass in data will not set db null
         elif json_data:
-            json_data['modified'] = str(modified)
-            json_data = json.dumps(json_data)
+            json_data = json.dumps(dict(json_data, modified=str(record['modified'])))
             log.debug("Patch url:%s, json data: %s", url, json_data)
             # when dict value is none, json value is null, pass in json=null will set db null
-            self.resp = self.session.patch(url, json=json_data)
+            resp = self.session.patch(url, json=json_data)
+        else:
+            return True
+        self.resp = resp
 
-        if self.resp.status_code == requests.codes.ok:
+        if resp.status_code == requests.codes.ok:
             log.info("Update to database successfully.")
             return True
-        elif self.is_respond_error:
-            log.error("Update failed. Return code: %s, content: %s", self.resp.status_code, self.resp.content)
+        try:
+            errors = json.loads(resp.content).get('data', {}).get('errors', None)
+        except (ValueError, AttributeError):
+            errors = None
+        if errors:
+            log.error("Update failed. Return code: %s, content: %s", resp.status_code, resp.content)
             return False
 
         return True
 
-    def query(self, id=None, sn=None, hostname=None):
+    def query(self, id=None, sn=None, hostname=None, vm_host_ip=None):
         """
         query from database
         :param id: PK id
         :param sn: UUID of VM or host
         :param hostname: The name of VM or host
+        :param vm_host_ip: the host server IP of VMs, to get all the VMs on a server in one query
         :return: the record with Dict
         """
+        result = self.query_page(id=id, sn=sn, hostname=hostname, vm_host_ip=vm_host_ip)
+        if not result.count:
+            return []
+        else:
+            return result.records
+
+    def query_page(self, page=None, page_size="max", **filters):
+        """
+        :param page: the page number from 1, None for the first page
+        :param page_size: the number of records in a page, "max" for all
+        :param filters: the fields to match as id, sn, hostname, vm_host_ip, the None ones are ignored
+        :return: a QueryResult
+        """
         url = self.url
         db_name = self.db_name(url)
 
-        data = {'pagesize': 'max'}
-        url += "?"
-        select_item = ["pagesize=max"]
-        if id:
-            data['id'] = id
-            select_item.append("id=%s" % id)
-        if sn:
-            data['sn'] = sn
-            select_item.append("sn=%s" % sn)
-        if hostname:
-            data['hostname'] = hostname
-            select_item.append("hostname=%s" % hostname)
-
-        url += "&".join(select_item)
-        log.debug("Query URL: %s", url)
-
-        self.resp = self.session.get(url)
+        data = dict((key, value) for key, value in filters.items() if value)
+        params = dict(data, pagesize=page_size)
+        if page is not None:
+            params['page'] = page
+
+        self.resp = self.session.get(url, params=params)
+        log.debug("Query URL: %s", self.resp.url)
         if self.resp.status_code == requests.codes.ok:
             log.debug("Query from database: [%s] with record [%s] successfully.", db_name, data)
         else:
@@ -165,11 +184,67 @@ class HostDriver(HostDbDriver):
                       db_name, data)
             log.debug(self.resp.content)
 
-        if not self.respond_data_count:
+        result = self.result
+        if not result.count:
             log.debug("No records found with query data: %s.", data)
-            return []
-        else:
-            return self.respond_data_list
+        return result
+
+    def iter_pages(self, page_size=QUERY_PAGE_SIZE, **filters):
+        """
+        query the records page by page, a large result is not loaded at once
+        :return: a generator of QueryResult
+        """
+        page, fetched = 1, 0
+        while True:
+            result = self.query_page(page=page, page_size=page_size, **filters)
+            if self.resp.status_code != requests.codes.ok:
+                return
+            yield result
+            fetched += len(result.records)
+            if not result.records or fetched >= result.count:
+                return
+            page += 1
+
+    def query_by_host(self, vm_host_ip, page_size=QUERY_PAGE_SIZE):
+        """
+        :return: a QueryResult with all the records of VMs on host vm_host_ip, use its by_sn, by_hostname and by_ip to
+                 look up the records
+        """
+        records = []
+        for result in self.iter_pages(page_size=page_size, vm_host_ip=vm_host_ip):
+            records.extend(result.records)
+        return QueryResult(records=records)
+
+    def query_many(self, sns, page_size=QUERY_PAGE_SIZE, **filters):
+        """
+        find the records of many sns by reading the records page by page, it stops when all of them are found. A few
+        sns are queried one by one, which is cheaper than reading the pages.
+        :param sns: a list of sn
+        :param filters: the fields to match, such as vm_host_ip to read less records
+        :return: {sn: record} of the sns found
+        """
+        wanted = set(sns)
+        if len(wanted) <= QUERY_BY_SN_MAX:
+            return self.query_each(wanted, **filters)
+        found = {}
+        for result in self.iter_pages(page_size=page_size, **filters):
+            for sn in wanted.intersection(result.by_sn):
+                found[sn] = result.by_sn[sn]
+            if len(found) == len(wanted):
+                break
+        return found
+
+    def query_each(self, sns, **filters):
+        """
+        query the sns one by one, no other record is read, for the sns may be not in database at all
+        :return: {sn: record} of the sns found
+        """
+        found = {}
+        for sn in set(sns):
+            records = self.query_page(sn=sn, **filters).records
+            if records:
+                found[sn] = records[0]
+        return found
 
 
 class VirtualHostDriver(HostDriver):
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: query_result.py
+ Author: longhui
+ Created Time: 2026-10-19 01:12:25
+ Descriptions: the result of a cmdb query. The response body is parsed once, and the indexes of the records by sn,
+        hostname or ip are built when first used, so the bulk callers can look up the records in memory.
+"""
+
+import json
+
+from lib.Log.log import log
+
+
+def parse_content(resp):
+    """
+    :param resp: a requests Response, a json string or a dict
+    :return: the dict in response content, {} if it can not be parsed
+    """
+    content = getattr(resp, "content", None)
+    try:
+        if content is not None:
+            payload = json.loads(content)
+        elif isinstance(resp, basestring):
+            payload = json.loads(resp)
+        else:
+            payload = resp
+    except ValueError as error:
+        log.exception(error)
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+class QueryResult(object):
+    """
+    A response content as: {"code": 200, "msg": "", "data": {"count": 2, "list": [{record}, ...]}}
+    """
+
+    def __init__(self, resp=None, records=None):
+        """
+        :param resp: the response of a query
+        :param records: the records merged from pages, used instead of the ones in resp
+        """
+        self.resp = resp
+        self._payload = None
+        self._records = records
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __nonzero__(self):
+        return bool(self.records)
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = parse_content(self.resp) if self.resp is not None else {}
+        return self._payload
+
+    @property
+    def data(self):
+        data = self.payload.get('data', {})
+        return data if isinstance(data, dict) else {}
+
+    @property
+    def count(self):
+        """
+        :return: the number of records matched, it is more than the records in one page
+        """
+        if self._records is not None:
+            return len(self._records)
+        return int(self.data.get("count", 0))
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = self.data.get("list", []) or []
+        return self._records
+
+    @property
+    def msg(self):
+        return self.payload.get("msg", "")
+
+    @property
+    def code(self):
+        return self.payload.get("code", None)
+
+    @property
+    def is_error(self):
+        return "errors" in self.data
+
+    @property
+    def errors(self):
+        return self.data.get('errors', "Can not get errors.")
+
+    def index(self, *fields):
+        """
+        :param fields: the fields of record to index
+        :return: {value: record} for the values of the fields, the first record wins when records have same value
+        """
+        if fields not in self._indexes:
+            index = {}
+            for record in self.records:
+                for field in fields:
+                    value = record.get(field, None)
+                    if value and value not in index:
+                        index[value] = record
+            self._indexes[fields] = index
+        return self._indexes[fields]
+
+    @property
+    def by_sn(self):
+        return self.index("sn")
+
+    @property
+    def by_hostname(self):
+        return self.index("hostname")
+
+    @property
+    def by_ip(self):
+        return self.index("first_ip", "second_ip")
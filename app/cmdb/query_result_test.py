@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: query_result_test.py
+ Author: longhui
+ Created Time: 2026-10-19 01:40:18
+'''
+import json
+import unittest
+
+from app.cmdb.query_result import QueryResult
+
+
+class FakeResponse(object):
+
+    def __init__(self, payload):
+        self._content = json.dumps(payload)
+        self.loads = 0
+
+    @property
+    def content(self):
+        self.loads += 1
+        return self._content
+
+
+class QueryResultTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [{"id": 1, "sn": "sn1", "hostname": "vm1", "first_ip": "10.0.0.2", "second_ip": None},
+                        {"id": 2, "sn": "sn2", "hostname": "vm2", "first_ip": "10.0.0.3", "second_ip": "172.16.0.3"}]
+        self.resp = FakeResponse({"code": 200, "msg": "ok", "data": {"count": 5, "list": self.records}})
+
+    def test_parse_once(self):
+        result = QueryResult(self.resp)
+        self.assertEqual(result.count, 5)
+        self.assertEqual(result.records, self.records)
+        self.assertEqual(result.code, 200)
+        self.assertEqual(result.msg, "ok")
+        self.assertFalse(result.is_error)
+        self.assertEqual(self.resp.loads, 1)
+
+    def test_indexes(self):
+        result = QueryResult(self.resp)
+        self.assertEqual(result.by_sn["sn2"]["id"], 2)
+        self.assertEqual(result.by_hostname["vm1"]["id"], 1)
+        self.assertEqual(result.by_ip["172.16.0.3"]["id"], 2)
+        self.assertEqual(sorted(result.by_ip), ["10.0.0.2", "10.0.0.3", "172.16.0.3"])
+        self.assertIs(result.by_sn, result.by_sn)
+
+    def test_records_and_errors(self):
+        result = QueryResult(records=self.records)
+        self.assertEqual(result.count, 2)
+        self.assertEqual(len(result), 2)
+        self.assertTrue(result)
+        self.assertFalse(QueryResult("not json"))
+        error = QueryResult({"code": 400, "data": {"errors": {"sn": ["exists"]}}})
+        self.assertTrue(error.is_error)
+        self.assertEqual(error.errors, {"sn": ["exists"]})
+        self.assertEqual(error.count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
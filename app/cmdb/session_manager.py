@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: session_manager.py
+ Author: longhui
+ Created Time: 2026-10-19 00:21:36
+ Descriptions: one logged in requests session to cmdb for each user in a process, its keep-alive connections are
+        shared by all the db drivers. The session cookie is saved to a file and reused by the next processes until it
+        expires, and a request answered with 401 logs in again and is sent once more. The requests in flight on the
+        sessions are limited together.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.cmdb.settings import CMDB_MAX_IN_FLIGHT, DB_HOST, HTTP_POOL_SIZE, LOGIN_URL, LOGOUT_URL, SESSION_COOKIE_FILE
+from app.cmdb.settings import SESSION_LIFETIME
+from lib.Log.log import log
+
+
+# shared by all the sessions in process, they use the same keep-alive connections
+_in_flight = threading.BoundedSemaphore(CMDB_MAX_IN_FLIGHT)
+
+
+class LimitedAdapter(HTTPAdapter):
+    """
+    the requests sent by the adapter at the same time are limited by a semaphore, the login and the requests sent
+    again after 401 included. The semaphore is released before the response hooks are called.
+    """
+
+    def __init__(self, semaphore=None, **kwargs):
+        self._semaphore = semaphore or _in_flight
+        super(LimitedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        with self._semaphore:
+            return super(LimitedAdapter, self).send(request, **kwargs)
+
+
+class SessionManager(object):
+    """
+    The cookie file has content: {"admin": {"db": "http://127.0.0.1:8000", "expire": 1539830400.0, "cookies": {...}}}
+    """
+
+    def __init__(self, cookie_file=SESSION_COOKIE_FILE, lifetime=SESSION_LIFETIME, pool_size=HTTP_POOL_SIZE):
+        """
+        :param cookie_file: the file to share the cookies with other processes, None to not share
+        :param lifetime: seconds a login is used
+        :param pool_size: max number of keep-alive connections
+        """
+        self.cookie_file = cookie_file
+        self.lifetime = lifetime
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.RLock()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = LimitedAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _load_cookies(self, user):
+        """
+        :return: (cookies dict, expire time) of user saved by a process before, (None, 0) if not there or expired
+        """
+        if not self.cookie_file:
+            return None, 0
+        try:
+            with open(self.cookie_file) as cookie_file:
+                entry = json.load(cookie_file).get(user, None)
+        except (IOError, OSError, ValueError, AttributeError):
+            return None, 0
+        if not isinstance(entry, dict) or entry.get("db", None) != DB_HOST or entry.get("expire", 0) <= time.time():
+            return None, 0
+        return entry.get("cookies", None) or None, entry["expire"]
+
+    def _save_cookies(self, user, cookies, expire):
+        """
+        :param cookies: the cookies dict, None to remove the user
+        """
+        if not self.cookie_file:
+            return
+        cookie_dir = os.path.dirname(self.cookie_file) or "."
+        try:
+            with open(self.cookie_file) as cookie_file:
+                entries = json.load(cookie_file)
+            if not isinstance(entries, dict):
+                entries = {}
+        except (IOError, OSError, ValueError):
+            entries = {}
+
+        if cookies is None:
+            entries.pop(user, None)
+        else:
+            entries[user] = {"db": DB_HOST, "expire": expire, "cookies": cookies}
+        try:
+            if not os.path.isdir(cookie_dir):
+                os.makedirs(cookie_dir)
+            # mkstemp creates the file readable only by the owner, the cookie is a credential
+            fd, tmp_path = tempfile.mkstemp(prefix=".cmdb_cookie", dir=cookie_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entries, tmp_file)
+            os.rename(tmp_path, self.cookie_file)
+        except (IOError, OSError) as error:
+            log.warn("Can not save cmdb session cookie to %s: %s", self.cookie_file, error)
+
+    def _login(self, session, user, passwd):
+        """
+        :return: True if login successfully, the cookie is saved
+        """
+        session.cookies.clear()
+        try:
+            login_res = session.post(LOGIN_URL, data={'username': user, 'password': passwd})
+            res_content = json.loads(login_res.content)
+        except requests.exceptions.ConnectionError as connerror:
+            log.exception("Connection exception: %s", connerror)
+            return False
+        except Exception as error:
+            log.exception("Exception when login: %s", error)
+            return False
+
+        if res_content.get('status', None) != 1:  # the success check depend on the login html
+            log.error("Login url [%s] check with username [%s] failed.", DB_HOST, user)
+            return False
+
+        log.debug("Login url [%s] check with username [%s] success.", DB_HOST, user)
+        session.expire = time.time() + self.lifetime
+        self._save_cookies(user, requests.utils.dict_from_cookiejar(session.cookies), session.expire)
+        return True
+
+    def _reauth_hook(self, user, passwd):
+        """
+        :return: a response hook, which logs in again and resend the request when it is answered with 401
+        """
+        def hook(resp, **kwargs):
+            request = resp.request
+            if resp.status_code != requests.codes.unauthorized or getattr(request, "reauthed", False) or \
+                    request.url.startswith(LOGIN_URL):
+                return resp
+
+            log.info("Session to cmdb is expired, login again.")
+            with self._lock:
+                session = self._sessions.get(user, None)
+                if session is None or not self._login(session, user, passwd):
+                    return resp
+
+            retry = request.copy()
+            retry.reauthed = True
+            retry.headers.pop("Cookie", None)
+            retry.prepare_cookies(session.cookies)
+            # release the connection to pool before sending again
+            resp.close()
+            new_resp = session.send(retry, **kwargs)
+            new_resp.history.append(resp)
+            return new_resp
+
+        return hook
+
+    def get_session(self, user, passwd):
+        """
+        :return: the logged in session of user, None if login failed
+        """
+        with self._lock:
+            session = self._sessions.get(user, None)
+            if session is not None and session.expire > time.time():
+                return session
+
+            if session is None:
+                session = self._new_session()
+                session.hooks['response'].append(self._reauth_hook(user, passwd))
+            cookies, expire = self._load_cookies(user)
+            if cookies:
+                log.debug("Reuse the cmdb session cookie of [%s] saved before.", user)
+                session.cookies.clear()
+                session.cookies.update(requests.utils.cookiejar_from_dict(cookies))
+                session.expire = expire
+            elif not self._login(session, user, passwd):
+                session.close()
+                self._sessions.pop(user, None)
+                return None
+
+            self._sessions[user] = session
+            return session
+
+    def logout(self, user):
+        """
+        logout user and remove the cookie saved, the drivers using the session can not query any more
+        """
+        with self._lock:
+            session = self._sessions.pop(user, None)
+            self._save_cookies(user, None, 0)
+            if session is None:
+                return
+            try:
+                session.get(LOGOUT_URL)
+            except requests.exceptions.RequestException as error:
+                log.debug("Exception when logout: %s", error)
+            session.cookies.clear()
+            session.close()
+
+
+_session_manager = SessionManager()
+
+
+def get_session_manager():
+    """
+    :return: the process wide cmdb session manager
+    """
+    return _session_manager
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: session_manager_test.py
+ Author: longhui
+ Created Time: 2026-10-19 00:48:53
+'''
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from requests.adapters import HTTPAdapter
+
+from app.cmdb.session_manager import LimitedAdapter, SessionManager
+
+
+class SessionManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cookie_file = os.path.join(self.tmp_dir, "cookie", "cmdb_cookie.json")
+        self.manager = SessionManager(cookie_file=self.cookie_file, lifetime=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reuse_saved_cookie(self):
+        expire = time.time() + 60
+        self.manager._save_cookies("admin", {"sessionid": "abc"}, expire)
+        # another process reuses the cookie without login
+        manager = SessionManager(cookie_file=self.cookie_file, lifetime=60)
+        session = manager.get_session("admin", "admin")
+        self.assertIsNotNone(session)
+        self.assertEqual(session.cookies.get("sessionid"), "abc")
+        self.assertEqual(session.expire, expire)
+        # shared by the drivers in process
+        self.assertIs(manager.get_session("admin", "admin"), session)
+
+    def test_expired_cookie(self):
+        self.manager._save_cookies("admin", {"sessionid": "abc"}, time.time() - 1)
+        self.assertEqual(self.manager._load_cookies("admin"), (None, 0))
+        self.assertEqual(self.manager._load_cookies("other"), (None, 0))
+
+    def test_logout(self):
+        self.manager._save_cookies("admin", {"sessionid": "abc"}, time.time() + 60)
+        self.manager.logout("admin")
+        self.assertEqual(self.manager._load_cookies("admin"), (None, 0))
+
+    def test_limited_adapter(self):
+        semaphore = threading.BoundedSemaphore(1)
+        adapter = LimitedAdapter(semaphore=semaphore)
+        held = []
+        original_send = HTTPAdapter.send
+        HTTPAdapter.send = lambda self, request, **kwargs: held.append(not semaphore.acquire(False))
+        try:
+            adapter.send(object())
+        finally:
+            HTTPAdapter.send = original_send
+        # held while sending, and released after
+        self.assertEqual(held, [True])
+        self.assertTrue(semaphore.acquire(False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,3 +11,18 @@ LOGOUT_URL = DB_HOST + '/user/logout'
 
 HOSTs_URL = DB_HOST + '/cmdb/hosts/'
 HOSTGROUP_URL = DB_HOST + '/cmdb/hostgroup/'
+# the number of records in a page when query the records page by page
+QUERY_PAGE_SIZE = 500
+# query_many queries the sns one by one when no more than it
+QUERY_BY_SN_MAX = 10
+
+# the cmdb session cookie is shared by processes through the file until it expires
+SESSION_COOKIE_FILE = os.getenv("VIRT_CMDB_COOKIE",
+                                os.path.join(os.path.expanduser("~"), ".dev_virt", "cmdb_cookie.json"))
+SESSION_LIFETIME = 3600
+# max number of keep-alive connections to cmdb
+HTTP_POOL_SIZE = 32
+# the concurrent drivers send at most so many requests at the same time, and retry a failed one with backoff
+CMDB_MAX_IN_FLIGHT = HTTP_POOL_SIZE
+CMDB_RETRIES = 3
+CMDB_RETRY_BACKOFF = 0.5
@@ -8,6 +8,7 @@
 '''
 
 import os
+from app.cmdb.concurrent_hosts import ConcurrentHostDriver, ConcurrentVirtualHostDriver
 from app.cmdb.hosts import HostDriver, VirtualHostDriver
 from app.cmdb.fake_db_driver import FakeDBDriver
 
@@ -15,11 +16,13 @@ from app.cmdb.fake_db_driver import FakeDBDriver
 class DbFactory(object):
 
     @classmethod
-    def get_db_driver(cls, table_class):
+    def get_db_driver(cls, table_class, concurrent=None):
         """
         return the relative database driver class
         If DB_HOST enviroment is not configure, return fake db driver that will do nothing
         :param table_class: the table class define in app folder
+        :param concurrent: return the driver which can be called from threads at the same time, default True if
+                           DB_CONCURRENT enviroment is set
         :return:
         """
 
@@ -27,9 +30,12 @@ class DbFactory(object):
         if DB_HOST is None:
             return FakeDBDriver()
 
+        if concurrent is None:
+            concurrent = bool(os.getenv("DB_CONCURRENT", None))
+
         if table_class == "Host":  # Physical server
-            return HostDriver()
+            return ConcurrentHostDriver() if concurrent else HostDriver()
         elif table_class == "VirtHost":  # Virtual machine
-            return VirtualHostDriver()
+            return ConcurrentVirtualHostDriver() if concurrent else VirtualHostDriver()
         else:
             raise NotImplementedError()
@@ -4,111 +4,317 @@
  File Name: lib/Db/mysqldb.py
  Author: longhui
  Created Time: 2019-04-24 17:28:11
+ Descriptions: the cmdb mysql client. The connections are kept in a pool shared by the process, and all the queries are
+        named statements in STATEMENTS with the values passed as parameters.
 """
 
+import atexit
+import re
+import threading
+import time
+import Queue
+
 import MySQLdb
-from lib.Utils.signal_utils import timeout_decrator, TimeoutError
+import MySQLdb.cursors
+from lib.Log.log import log
+from lib.Utils.constans import MYSQL_CONNECT_TIMEOUT, MYSQL_POOL_SIZE, MYSQL_STREAM_BATCH
+from lib.Utils.signal_utils import run_with_timeout, TimeoutError
+
+
+# all the sql used, the values are passed as parameters to execute and escaped by the driver
+STATEMENTS = {
+    "kvm_hosts": "select first_ip from cmdb_hosts where device_type='KVM Host' and machine_type='物理机';",
+    "first_ips": "select first_ip from cmdb_hosts where first_ip != 'NULL';",
+    "second_ips": "select second_ip from cmdb_hosts where second_ip != 'NULL';",
+    "vips": "select virtual_ip from cmdb_virtual_ip;",
+    # union removes the duplicates in db
+    "used_ips": "select first_ip from cmdb_hosts where first_ip != 'NULL' "
+                "union select second_ip from cmdb_hosts where second_ip != 'NULL' "
+                "union select virtual_ip from cmdb_virtual_ip;",
+    "vm_names": "select hostname from cmdb_hosts where machine_type='虚拟机';",
+    "vm_names_like": "select hostname from cmdb_hosts where hostname like %s and machine_type='虚拟机';",
+    # the 'kvm' prefix can use the index on hostname, and the regexp only checks the rows with it
+    "kvm_vm_names_regexp": "select hostname from cmdb_hosts where hostname like 'kvm%%' and hostname regexp %s "
+                           "and machine_type='虚拟机';",
+}
+
+_query_hook = None
+
+
+def set_query_hook(hook):
+    """
+    :param hook: function(name, seconds, rows) called after each query, such as to log the slow ones; None to remove
+    """
+    global _query_hook
+    _query_hook = hook
+
+
+def _call_query_hook(name, seconds, rows):
+    if _query_hook is None:
+        return
+    try:
+        _query_hook(name, seconds, rows)
+    except Exception as error:
+        log.debug("Exception in mysql query hook: %s", error)
+
+
+def _escape_like(value):
+    return re.sub(r"([%_\\])", r"\\\1", value)
+
+
+class MysqlPool(object):
+    """
+    idle connections to one database, a connection is pinged before reused. The connections are in autocommit mode
+    and rolled back when given back, so a reused connection never reads the snapshot of an old transaction.
+    """
+
+    def __init__(self, host, user, passwd, port, db, max_size=MYSQL_POOL_SIZE, connector=None):
+        """
+        :param connector: function(**params) to open a connection, default MySQLdb.connect
+        """
+        self._params = dict(host=host, user=user, password=passwd, port=port, database=db,
+                            connect_timeout=MYSQL_CONNECT_TIMEOUT)
+        self.host = host
+        self._connector = connector or MySQLdb.connect
+        self._idle = Queue.LifoQueue(maxsize=max_size)
+
+    def _connect(self):
+        conn = self._connector(**self._params)
+        conn.autocommit(True)
+        return conn
+
+    @staticmethod
+    def _close_conn(conn):
+        try:
+            conn.close()
+        except Exception as error:
+            log.debug("Exception when close mysql connection: %s", error)
+
+    def acquire(self):
+        """
+        :return: an idle connection which is alive, or a new one
+        :raise TimeoutError: when can not connect in MYSQL_CONNECT_TIMEOUT seconds
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                conn.ping()
+                return conn
+            except MySQLdb.Error as error:
+                log.debug("Pooled mysql connection to %s is not alive: %s", self.host, error)
+                self._close_conn(conn)
+
+        return run_with_timeout(self._connect, MYSQL_CONNECT_TIMEOUT, on_abandon=self._close_conn)
+
+    def release(self, conn, broken=False):
+        """
+        give back a connection got from acquire, it is closed when broken or the pool is full
+        """
+        if conn is None:
+            return
+        if not broken:
+            try:
+                # end the transaction opened by the queries, if any
+                conn.rollback()
+            except MySQLdb.Error as error:
+                log.debug("Rollback pooled mysql connection to %s failed: %s", self.host, error)
+                broken = True
+        if not broken:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except Queue.Full:
+                pass
+        self._close_conn(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Queue.Empty:
+                return
+            self._close_conn(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+
+
+atexit.register(_close_pools)
+
+
+def get_mysql_pool(host, user, passwd, port, db):
+    """
+    :return: the process wide pool of connections to the database, the connections opened with another password are
+             not shared
+    """
+    key = (host, user, passwd, port, db)
+    with _pools_lock:
+        pool = _pools.get(key, None)
+        if pool is None:
+            pool = _pools[key] = MysqlPool(host, user, passwd, port, db)
+        return pool
 
 
 class MysqlDB(object):
-    def __init__(self, host="127.0.0.1", user="root", passwd="rootpassword", port=3306, db="cmdb"):
+    def __init__(self, host="127.0.0.1", user="root", passwd="rootpassword", port=3306, db="cmdb", pool=None):
         self._host=host
-        self._user=user
-        self._passwd = passwd
-        self._port = port
-        self._db=db
-        self.conn = None #MySQLdb.connect(host=host, user=user, password=passwd, port=port, database=db)
+        self._pool = pool or get_mysql_pool(host, user, passwd, port, db)
+        self.conn = None
         self.cursor = None
-    
-    @timeout_decrator(6)
+        self._broken = False
+
     def connect(self):
+        """
+        take a connection from pool
+        :raise TimeoutError: when can not connect in MYSQL_CONNECT_TIMEOUT seconds
+        """
         if self.conn is None:
-            self.conn =  MySQLdb.connect(host=self._host, 
-                                         user=self._user, 
-                                         password=self._passwd, 
-                                         port=self._port, 
-                                         database=self._db)
+            self.conn = self._pool.acquire()
+            self._broken = False
         self.cursor = self.conn.cursor()
 
     def close(self):
+        """
+        give back the connection to pool
+        """
         if self.cursor:
-            self.cursor.close()
+            try:
+                self.cursor.close()
+            except MySQLdb.Error:
+                self._broken = True
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-        
+            self._pool.release(self.conn, broken=self._broken)
+            self.conn = None
+
     def __nonzero__(self):
         return self.conn is not None
 
     def __enter__(self):
         self.connect()
         return self
-        
+
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None and issubclass(exc_type, MySQLdb.Error):
+            self._broken = True
         self.close()
         if exc_type is not None:
             return False # reraise exception
         else:
             return True
-    
+
+    def execute(self, name, params=None):
+        """
+        :param name: the name of statement in STATEMENTS
+        :param params: a tuple of the values for the statement
+        :return: all the rows
+        """
+        start = time.time()
+        try:
+            self.cursor.execute(STATEMENTS[name], params)
+            rows = self.cursor.fetchall()
+        except MySQLdb.OperationalError:
+            self._broken = True
+            raise
+        _call_query_hook(name, time.time() - start, len(rows))
+        return rows
+
+    def stream(self, name, params=None, batch=MYSQL_STREAM_BATCH):
+        """
+        yield the rows batch by batch with a server side cursor, the result is not loaded in memory at once.
+        The connection can not run other queries until all the rows are read.
+        """
+        start = time.time()
+        count = 0
+        cursor = self.conn.cursor(MySQLdb.cursors.SSCursor)
+        try:
+            cursor.execute(STATEMENTS[name], params)
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        except MySQLdb.OperationalError:
+            self._broken = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except MySQLdb.Error:
+                # the rows not read are left on the connection
+                self._broken = True
+        _call_query_hook(name, time.time() - start, count)
+
     def get_kvm_host_list(self):
         """
         :return: kvm host ip list
         """
-        self.cursor.execute("select first_ip from cmdb_hosts where device_type='KVM Host' and machine_type='物理机';")
-        return [ip[0] for ip in self.cursor.fetchall()]
-    
+        return [ip[0] for ip in self.execute("kvm_hosts")]
+
     def get_firt_ip_list(self):
         """
         :return: all the ip on veth 0 used by vm in cmdb
         """
-        self.cursor.execute("select first_ip from cmdb_hosts where first_ip != 'NULL';")
-        return [ip[0] for ip in self.cursor.fetchall()]
-        
+        return [ip[0] for ip in self.execute("first_ips")]
+
     def get_second_ip_list(self):
         """
         :return: return a list of all second ip
         """
-        self.cursor.execute("select second_ip from cmdb_hosts where second_ip != 'NULL';")     
-        return [ip[0] for ip in self.cursor.fetchall()]
-    
+        return [ip[0] for ip in self.execute("second_ips")]
+
     def get_vip_list(self):
         """
         :return: a list of vip 
         """
-        self.cursor.execute("select virtual_ip from cmdb_virtual_ip;")
-        return [ip[0] for ip in self.cursor.fetchall()]
-    
+        return [ip[0] for ip in self.execute("vips")]
+
+    def get_used_ip_list(self):
+        """
+        :return: all the first ips, second ips and vips in one query
+        """
+        return [ip[0] for ip in self.stream("used_ips")]
+
     def get_vm_name_list(self, key=None):
         if key:
-            query = "select hostname from cmdb_hosts where hostname like '%%%s%%' and  machine_type='虚拟机';" %key
+            rows = self.execute("vm_names_like", ("%" + _escape_like(key) + "%",))
         else:
-            query = "select hostname from cmdb_hosts where machine_type='虚拟机';"
-            
-        self.cursor.execute(query)
-        return [name[0] for name in self.cursor.fetchall()]
+            rows = self.execute("vm_names")
+        return [name[0] for name in rows]
 
-        
     def get_kvm_vmname_list(self, key=None):
         """
         :return: return vm name list with key in name
         """
-        if key:
-            query = "select hostname from cmdb_hosts where hostname like 'kvm%%%s%%' and  machine_type='虚拟机';" %key
-        else:
-            query = "select hostname from cmdb_hosts where hostname like 'kvm%' and machine_type='虚拟机';"
-            
-        self.cursor.execute(query)
-        return [name[0] for name in self.cursor.fetchall()]
-
+        pattern = "kvm%" + _escape_like(key) + "%" if key else "kvm%"
+        return [name[0] for name in self.execute("vm_names_like", (pattern,))]
 
+    def get_kvm_vmname_list_by_key(self, key):
+        """
+        :return: the vm names as kvm<number>-<key><number>
+        """
+        pattern = "^kvm[0-9]+-%s[0-9]+$" % re.sub(r"([^A-Za-z0-9-])", r"\\\1", key)
+        return [name[0] for name in self.execute("kvm_vm_names_regexp", (pattern,))]
 
 
 if __name__ == "__main__":
+    set_query_hook(lambda name, seconds, rows: log.info("%s: %s rows in %.3fs", name, rows, seconds))
     try:
         with MysqlDB() as dbconn:
             print(dbconn.get_kvm_host_list())
-            print(dbconn.get_second_ip_list())
-            print(dbconn.get_vip_list())
+            print(len(dbconn.get_used_ip_list()))
             names = dbconn.get_kvm_vmname_list("k8s-master")
             for name in names:
                 print(name)
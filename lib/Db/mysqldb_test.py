@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: mysqldb_test.py
+ Author: longhui
+ Created Time: 2026-10-19 09:16:27
+'''
+import unittest
+from lib.Db.mysqldb import MysqlPool, get_mysql_pool
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.autocommit_mode = False
+        self.rollbacks = 0
+        self.closed = False
+
+    def autocommit(self, mode):
+        self.autocommit_mode = mode
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class MysqlPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conns = []
+
+        def connector(**params):
+            conn = FakeConnection()
+            self.conns.append(conn)
+            return conn
+
+        self.pool = MysqlPool("127.0.0.1", "root", "passwd", 3306, "cmdb", max_size=1, connector=connector)
+
+    def test_no_transaction_kept(self):
+        conn = self.pool.acquire()
+        # each query sees the latest data, not the snapshot of the first one
+        self.assertTrue(conn.autocommit_mode)
+        self.pool.release(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(self.pool.acquire(), conn)
+        self.assertEqual(len(self.conns), 1)
+
+    def test_release(self):
+        first, second = self.pool.acquire(), self.pool.acquire()
+        self.pool.release(first)
+        # the pool is full
+        self.pool.release(second)
+        self.assertTrue(second.closed)
+        third = self.pool.acquire()
+        self.pool.release(third, broken=True)
+        self.assertTrue(third.closed)
+
+    def test_pool_key(self):
+        self.assertIs(get_mysql_pool("10.0.0.1", "root", "a", 3306, "cmdb"),
+                      get_mysql_pool("10.0.0.1", "root", "a", 3306, "cmdb"))
+        self.assertIsNot(get_mysql_pool("10.0.0.1", "root", "a", 3306, "cmdb"),
+                         get_mysql_pool("10.0.0.1", "root", "b", 3306, "cmdb"))
+
+
+if __name__ == "__main__":
+    unittest.main()
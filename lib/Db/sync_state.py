@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: sync_state.py
+ Author: longhui
+ Created Time: 2026-10-18 23:36:42
+ Descriptions: a local json file of the VM fields last written to cmdb, a hash for each field of each sn, so a sync only
+        sends the fields changed since last time and skips the records not changed at all
+"""
+
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from lib.Log.log import log
+
+
+SYNC_STATE_FILE = os.getenv("VIRT_SYNC_STATE",
+                            os.path.join(os.path.expanduser("~"), ".dev_virt", "sync_state.json"))
+# the fields never compared, such as the comment with the time in it
+IGNORED_FIELDS = ("comment", "modified")
+
+
+def normalize_value(value):
+    """
+    the values in database records are strings, compare them as text
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return unicode(value)
+
+
+def compared_fields(data):
+    """
+    :return: the keys of data compared with the state, the ignored fields left out
+    """
+    return [key for key in data if key not in IGNORED_FIELDS]
+
+
+def field_hash(value):
+    value = normalize_value(value)
+    if value is None:
+        return None
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+class SyncState(object):
+    """
+    A json file with content: {"db": "http://127.0.0.1:8000", "records": {sn: {field: hash}}}, the records are dropped
+    when the database is another one
+    """
+
+    def __init__(self, path=SYNC_STATE_FILE, db=None):
+        """
+        :param db: the database synced to, default the DB_HOST environment
+        """
+        self.path = path
+        self.db = db if db is not None else os.getenv("DB_HOST", None)
+        # send all the fields no matter what is in the state
+        self.force_full = False
+        self._lock = threading.Lock()
+        self._records = None
+        self._dirty = set()
+        self._forgotten = set()
+        self.counters = {"records_skipped": 0, "records_written": 0, "fields_skipped": 0, "fields_written": 0}
+
+    def _load(self):
+        try:
+            with open(self.path) as state_file:
+                data = json.load(state_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("db", None) != self.db:
+            return {}
+        records = data.get("records", {})
+        return records if isinstance(records, dict) else {}
+
+    def _dump(self, records):
+        state_dir = os.path.dirname(self.path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".sync_state", dir=state_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump({"db": self.db, "records": records}, tmp_file, separators=(",", ":"))
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as error:
+            log.error("Can not write sync state to %s: %s", self.path, error)
+
+    def _get_records(self):
+        if self._records is None:
+            self._records = self._load()
+        return self._records
+
+    def changed_fields(self, sn, data, count=True):
+        """
+        :param sn: the uuid of VM
+        :param data: the fields to write
+        :param count: count the record in counters, False when the caller counts it after the record is written
+        :return: a dict of the fields changed since last commit, all of them when force_full; the ignored fields are
+                 not counted but kept when any other field changed
+        """
+        fields = compared_fields(data)
+        with self._lock:
+            last = {} if self.force_full else self._get_records().get(sn, {})
+            changed = [key for key in fields if key not in last or last[key] != field_hash(data[key])]
+            if count:
+                self._count(len(changed), len(fields))
+        if not changed:
+            return {}
+
+        result = dict((key, data[key]) for key in changed)
+        for key in IGNORED_FIELDS:
+            if key in data:
+                result[key] = data[key]
+        return result
+
+    def _count(self, changed, total):
+        self.counters["fields_skipped"] += total - changed
+        self.counters["fields_written"] += changed
+        if changed:
+            self.counters["records_written"] += 1
+        else:
+            self.counters["records_skipped"] += 1
+
+    def count(self, changed, total):
+        """
+        count a record diffed by the caller
+        :param changed: the number of fields to write
+        :param total: the number of fields compared
+        """
+        with self._lock:
+            self._count(changed, total)
+
+    def commit(self, sn, data):
+        """
+        remember the fields written to database
+        """
+        with self._lock:
+            record = self._get_records().setdefault(sn, {})
+            for key, value in data.items():
+                if key not in IGNORED_FIELDS:
+                    record[key] = field_hash(value)
+            self._dirty.add(sn)
+            self._forgotten.discard(sn)
+
+    def forget(self, sn):
+        """
+        drop the state of sn, such as its record is created again
+        """
+        with self._lock:
+            self._get_records().pop(sn, None)
+            self._dirty.discard(sn)
+            self._forgotten.add(sn)
+
+    def save(self):
+        """
+        merge the changes to the file under a file lock, the others synced meanwhile are kept
+        """
+        with self._lock:
+            if not self._dirty and not self._forgotten:
+                return
+            state_dir = os.path.dirname(self.path) or "."
+            try:
+                if not os.path.isdir(state_dir):
+                    os.makedirs(state_dir)
+                with open(self.path + ".lock", "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        records = self._load()
+                        for sn in self._forgotten:
+                            records.pop(sn, None)
+                        for sn in self._dirty:
+                            records[sn] = self._records[sn]
+                        self._dump(records)
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except (IOError, OSError) as error:
+                log.error("Can not save sync state to %s: %s", self.path, error)
+                return
+            self._records = records
+            self._dirty.clear()
+            self._forgotten.clear()
+
+    def summary(self):
+        return "%(records_written)s records written and %(records_skipped)s skipped as not changed, " \
+               "%(fields_written)s fields written and %(fields_skipped)s skipped." % self.counters
+
+
+_sync_state = SyncState()
+atexit.register(_sync_state.save)
+
+
+def get_sync_state():
+    """
+    :return: the process wide sync state
+    """
+    return _sync_state
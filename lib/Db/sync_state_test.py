@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: sync_state_test.py
+ Author: longhui
+ Created Time: 2026-10-18 23:58:07
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from lib.Db.sync_state import SyncState
+
+
+class SyncStateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "state", "sync_state.json")
+        self.state = SyncState(self.path, db="http://127.0.0.1:8000")
+        self.data = {"cpu_cores": 2, "memory_size": 4, "first_ip": "10.0.0.2", "comment": "sync at 10:00"}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_changed_fields(self):
+        self.assertEqual(self.state.changed_fields("sn1", self.data), self.data)
+        self.state.commit("sn1", self.data)
+        self.assertEqual(self.state.changed_fields("sn1", dict(self.data, comment="sync at 11:00")), {})
+        changed = self.state.changed_fields("sn1", dict(self.data, memory_size=8, comment="sync at 12:00"))
+        self.assertEqual(changed, {"memory_size": 8, "comment": "sync at 12:00"})
+        # the values from database are strings
+        self.assertEqual(self.state.changed_fields("sn1", {"cpu_cores": "2", "memory_size": 4.0}), {})
+        self.assertEqual(self.state.counters, {"records_written": 2, "records_skipped": 2,
+                                               "fields_written": 4, "fields_skipped": 7})
+        # counted by the caller after the record is written
+        self.assertEqual(self.state.changed_fields("sn2", self.data, count=False), self.data)
+        self.assertEqual(self.state.counters["records_written"], 2)
+
+    def test_force_full(self):
+        self.state.commit("sn1", self.data)
+        self.state.force_full = True
+        self.assertEqual(self.state.changed_fields("sn1", self.data), self.data)
+
+    def test_save(self):
+        self.state.commit("sn1", self.data)
+        self.state.commit("sn2", self.data)
+        self.state.save()
+        other = SyncState(self.path, db="http://127.0.0.1:8000")
+        self.assertEqual(other.changed_fields("sn1", self.data), {})
+        # the changes of both are kept
+        other.commit("sn3", self.data)
+        other.forget("sn2")
+        other.save()
+        self.state.commit("sn1", {"memory_size": 8})
+        self.state.save()
+        state = SyncState(self.path, db="http://127.0.0.1:8000")
+        self.assertEqual(state.changed_fields("sn1", {"memory_size": 8}), {})
+        self.assertEqual(state.changed_fields("sn3", self.data), {})
+        self.assertEqual(state.changed_fields("sn2", {"memory_size": 4}), {"memory_size": 4})
+        # the state of another database is not used
+        self.assertEqual(SyncState(self.path, db="http://10.0.0.1:8000").changed_fields("sn1", {"memory_size": 8}),
+                         {"memory_size": 8})
+
+
+if __name__ == "__main__":
+    unittest.main()
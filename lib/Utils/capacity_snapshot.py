@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: capacity_snapshot.py
+ Author: longhui
+ Created Time: 2026-10-18 19:02:14
+ Descriptions: a local json file with the free memory and disk of each server, the network of the templates on them
+        and the ips in use, written by scripts/collect_capacity.py periodically, so that the schedule reads it instead
+        of connecting to all the servers and scanning the subnet
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from lib.Log.log import log
+
+
+CAPACITY_SNAPSHOT_FILE = os.getenv("VIRT_CAPACITY_SNAPSHOT",
+                                   os.path.join(os.path.expanduser("~"), ".dev_virt", "capacity.json"))
+# a snapshot older than it is not used, the schedule falls back to read from servers
+CAPACITY_SNAPSHOT_MAX_AGE = int(os.getenv("VIRT_CAPACITY_SNAPSHOT_MAX_AGE", 900))
+
+
+class CapacitySnapshot(object):
+    """
+    A json file with content:
+    {"time": 1539830400.0,
+     "hosts": {"10.0.0.2": {"info": [logic-free-mem-without-overCommit, physic-free-mem, logic-free-mem-overCommit,
+                                     physic-free-disk, logic-free-disk, cpu-cores, logic-free-vcpus-overCommit],
+                            "networks": {"k8s-template": "10.0.0.0/24"}}},
+     "networks": {"10.0.0.0/24": {"down": ["10.0.0.5", ...]}},
+     "used_ips": ["10.0.0.3", ...]}
+    the "down" of a network is null when it is not scanned, then all the ips not in used_ips are candidates
+    """
+
+    def __init__(self, path=CAPACITY_SNAPSHOT_FILE, max_age=CAPACITY_SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        try:
+            with open(self.path) as snapshot_file:
+                data = json.load(snapshot_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("hosts", None), dict):
+            return None
+        return data
+
+    def _dump(self, data):
+        """
+        write to a temp file and rename it, so a concurrent reader never sees a partial file
+        :return: True or False
+        """
+        snapshot_dir = os.path.dirname(self.path) or "."
+        try:
+            if not os.path.isdir(snapshot_dir):
+                os.makedirs(snapshot_dir)
+            fd, tmp_path = tempfile.mkstemp(prefix=".capacity", dir=snapshot_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(data, tmp_file, separators=(",", ":"))
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as error:
+            log.error("Can not write capacity snapshot %s: %s", self.path, error)
+            return False
+        return True
+
+    def load(self):
+        """
+        :return: True if the snapshot is there and not expired, else False
+        """
+        with self._lock:
+            data = self._load()
+            if data is None:
+                log.debug("No capacity snapshot at %s.", self.path)
+                self._data = None
+                return False
+            age = time.time() - data.get("time", 0)
+            if age > self.max_age:
+                log.warn("Capacity snapshot %s is %d seconds old, ignore it.", self.path, age)
+                self._data = None
+                return False
+            self._data = data
+            return True
+
+    def __nonzero__(self):
+        return self._data is not None
+
+    @property
+    def age(self):
+        return time.time() - self._data.get("time", 0) if self._data else None
+
+    def write(self, hosts, networks, used_ips):
+        """
+        :param hosts: {host: {"info": [...], "networks": {template: cidr}}}
+        :param networks: {cidr: {"down": [ip, ...] or None}}
+        :param used_ips: the ips in use
+        :return: True or False
+        """
+        data = {"time": time.time(), "hosts": hosts, "networks": networks, "used_ips": sorted(set(used_ips))}
+        with self._lock:
+            if not self._dump(data):
+                return False
+            self._data = data
+        return True
+
+    def get_hosts(self):
+        return list(self._data["hosts"].keys()) if self._data else []
+
+    def get_server_infors(self, hosts=None):
+        """
+        :param hosts: the servers wanted, None for all in snapshot
+        :return: same as schedule.get_server_infors, the servers not in snapshot are left out
+        """
+        if not self._data:
+            return {}
+        entries = self._data["hosts"]
+        if hosts is None:
+            hosts = entries.keys()
+        return dict((str(host), list(entries[host]["info"])) for host in hosts
+                    if host in entries and entries[host].get("info", None) is not None)
+
+    def get_network(self, host, template_name):
+        """
+        :return: the network of the template's first vif on host as "10.0.0.0/24", None if not known
+        """
+        if not self._data:
+            return None
+        network = self._data["hosts"].get(host, {}).get("networks", {}).get(template_name, None)
+        return str(network) if network else None
+
+    def get_down_ips(self, network):
+        """
+        :return: the ips found down when collected, None if the network is not scanned
+        """
+        if not self._data:
+            return None
+        down_ips = self._data.get("networks", {}).get(network, {}).get("down", None)
+        return [str(ip) for ip in down_ips] if down_ips is not None else None
+
+    def get_used_ips(self):
+        if not self._data:
+            return set()
+        return set(str(ip) for ip in self._data.get("used_ips", []))
+
+    def consume(self, host, memory=0, ip=None, vcpus=0, disk=0):
+        """
+        take the memory, vcpus, disk and ip of a new vm from the snapshot, so the next schedule before the snapshot is
+        collected again does not choose the same ip or overfill the server
+        :param memory: memory size of the new vm in GB
+        :param vcpus: vcpu number of the new vm
+        :param disk: size of the disks added to the new vm in GB
+        :return: True or False
+        """
+        return self.consume_all([(host, memory, ip, vcpus, disk)])
+
+    def consume_all(self, vms):
+        """
+        :param vms: a list of (host, memory, ip, vcpus, disk) for the new vms, the file is rewritten once
+        :return: True or False
+        """
+        with self._lock:
+            data = self._load()
+            if data is None:
+                return False
+            used_ips = data.setdefault("used_ips", [])
+            for host, memory, ip, vcpus, disk in vms:
+                entry = data["hosts"].get(host, None)
+                if entry and entry.get("info", None) and memory:
+                    for index in (0, 1, 2):
+                        entry["info"][index] = float("%.3f" % (entry["info"][index] - memory))
+                if entry and entry.get("info", None) and disk:
+                    for index in (3, 4):
+                        entry["info"][index] = float("%.3f" % (entry["info"][index] - disk))
+                # the snapshot written before the vcpus are collected has 5 items in info
+                if entry and len(entry.get("info", None) or []) > 6 and entry["info"][6] is not None and vcpus:
+                    entry["info"][6] = float("%.3f" % (entry["info"][6] - vcpus))
+                if ip:
+                    if ip not in used_ips:
+                        used_ips.append(ip)
+                    for network in data.get("networks", {}).values():
+                        if network.get("down", None) and ip in network["down"]:
+                            network["down"].remove(ip)
+            if not self._dump(data):
+                return False
+            self._data = data
+        return True
+
+
+def load_capacity_snapshot(path=CAPACITY_SNAPSHOT_FILE, max_age=CAPACITY_SNAPSHOT_MAX_AGE):
+    """
+    :return: the CapacitySnapshot loaded, None if there is no snapshot or it expired
+    """
+    snapshot = CapacitySnapshot(path, max_age)
+    return snapshot if snapshot.load() else None
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: capacity_snapshot_test.py
+ Author: longhui
+ Created Time: 2026-10-18 19:31:08
+'''
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from lib.Utils.capacity_snapshot import CapacitySnapshot, load_capacity_snapshot
+
+
+class CapacitySnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "snapshot", "capacity.json")
+        hosts = {"10.0.0.2": {"info": [20.0, 30.0, 40.0, 500, 600], "networks": {"k8s-template": "10.0.0.0/24"}},
+                 "10.0.0.3": {"info": [10.0, 12.0, 14.0, 200, 300], "networks": {}}}
+        networks = {"10.0.0.0/24": {"down": ["10.0.0.5", "10.0.0.6"]}}
+        self.assertTrue(CapacitySnapshot(self.path).write(hosts, networks, ["10.0.0.3", "10.0.0.3"]))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read(self):
+        snapshot = load_capacity_snapshot(self.path, max_age=60)
+        self.assertTrue(snapshot)
+        self.assertEqual(sorted(snapshot.get_hosts()), ["10.0.0.2", "10.0.0.3"])
+        self.assertEqual(snapshot.get_server_infors(["10.0.0.2", "10.0.0.9"]),
+                         {"10.0.0.2": [20.0, 30.0, 40.0, 500, 600]})
+        self.assertEqual(snapshot.get_network("10.0.0.2", "k8s-template"), "10.0.0.0/24")
+        self.assertIsNone(snapshot.get_network("10.0.0.3", "k8s-template"))
+        self.assertEqual(snapshot.get_down_ips("10.0.0.0/24"), ["10.0.0.5", "10.0.0.6"])
+        self.assertIsNone(snapshot.get_down_ips("10.0.1.0/24"))
+        self.assertEqual(snapshot.get_used_ips(), set(["10.0.0.3"]))
+
+    def test_missing_and_expired(self):
+        self.assertIsNone(load_capacity_snapshot(os.path.join(self.tmp_dir, "none.json")))
+        with open(self.path) as snapshot_file:
+            data = json.load(snapshot_file)
+        data["time"] = time.time() - 120
+        with open(self.path, "w") as snapshot_file:
+            json.dump(data, snapshot_file)
+        self.assertIsNone(load_capacity_snapshot(self.path, max_age=60))
+
+    def test_consume(self):
+        snapshot = load_capacity_snapshot(self.path, max_age=60)
+        self.assertTrue(snapshot.consume("10.0.0.2", 8, "10.0.0.5", disk=100))
+        # seen by the next schedule
+        snapshot = load_capacity_snapshot(self.path, max_age=60)
+        self.assertEqual(snapshot.get_server_infors(["10.0.0.2"])["10.0.0.2"], [12.0, 22.0, 32.0, 400.0, 500.0])
+        self.assertEqual(snapshot.get_down_ips("10.0.0.0/24"), ["10.0.0.6"])
+        self.assertTrue("10.0.0.5" in snapshot.get_used_ips())
+        self.assertEqual([name for name in os.listdir(os.path.dirname(self.path))], ["capacity.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,5 +19,36 @@ DISK_POOL = "kvm-disk-pool"
 NETFS_POOL_TYPE="netfs"
 DEFAULT_NETWORK = "libvirtmgr-net"
 MEMORY_OVERCOMMIT_FRACTION = 1.2
+# the vcpus allocated to running vms on a server are at most its logical cores * CPU_OVERCOMMIT_FRACTION
+CPU_OVERCOMMIT_FRACTION = 4.0
 Libvirtd_User = "admin"
 Libvirtd_Pass = "admin"
+# max number of servers scanned at the same time when schedule, and seconds to wait for each server
+SCAN_WORKERS = 16
+SCAN_HOST_TIMEOUT = 60
+# seconds to wait for connecting to hypervisor and mysql
+HYPERVISOR_CONNECT_TIMEOUT = 4
+MYSQL_CONNECT_TIMEOUT = 6
+# max number of idle mysql connections kept in pool, and rows fetched at a time when stream a large result
+MYSQL_POOL_SIZE = 8
+MYSQL_STREAM_BATCH = 1000
+# seconds to wait for a VM to reach the power state after power on/off
+POWER_STATE_TIMEOUT = 60
+# max number of VMs powered on/off at the same time, and operations started per second on one host
+BULK_POWER_WORKERS = 8
+BULK_POWER_RATE = 2
+BULK_POWER_BURST = 4
+# max number of VMs created at the same time in setup_vms.py, in total and on one server
+PROVISION_WORKERS = 8
+PROVISION_HOST_WORKERS = 2
+# max number of VM records updated to database at the same time when sync a host
+DB_SYNC_WORKERS = 8
+# seconds an ip chosen for a new vm is reserved, it should be in cmdb after the vm is created
+IP_RESERVATION_TTL = 1800
+# seconds a name chosen for a new vm is reserved, it should be in cmdb after the vm is created
+NAME_RESERVATION_TTL = 1800
+# seconds to wait for the replies when probing whether ips are in use, seconds a result is kept, and the tcp ports
+# connected when no privilege for icmp
+PROBE_TIMEOUT = 1
+PROBE_CACHE_TTL = 30
+PROBE_TCP_PORTS = [22, 80, 443]
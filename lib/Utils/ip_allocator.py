@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: ip_allocator.py
+ Author: longhui
+ Created Time: 2026-10-18 21:18:05
+ Descriptions: allocate the ips for new vms. The ips used in a subnet are kept as a bitmap of integer offsets, a cursor
+        moves forward over the used ones, so a batch of allocations scans the subnet at most once even for /16. Only
+        the candidate ip is probed, and the ips allocated are reserved in a file until they are in cmdb.
+"""
+
+import os
+import socket
+import struct
+
+from lib.Log.log import log
+from lib.Utils.constans import IP_RESERVATION_TTL
+from lib.Utils.reservation import ReservationStore
+
+
+IP_RESERVATION_FILE = os.getenv("VIRT_IP_RESERVATIONS",
+                                os.path.join(os.path.expanduser("~"), ".dev_virt", "ip_reservations.json"))
+
+
+def ip_to_int(ip):
+    """
+    :raise socket.error, TypeError: when ip is not a valid ipv4 address
+    """
+    return struct.unpack("!I", socket.inet_aton(str(ip)))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+class SubnetBitmap(object):
+    """
+    a bit for each address in the subnet, 1 is used. The network and broadcast addresses are used.
+    All the addresses before the cursor are used.
+    """
+
+    def __init__(self, network):
+        """
+        :param network: as "10.0.0.0/24", the host bits are ignored
+        """
+        address, prefixlen = str(network).split("/")
+        prefixlen = int(prefixlen)
+        self.size = 1 << (32 - prefixlen)
+        self.first = ip_to_int(address) & ~(self.size - 1) & 0xFFFFFFFF
+        self.bits = bytearray((self.size + 7) // 8)
+        self.free = self.size
+        self.cursor = 0
+        if prefixlen < 31:
+            self.mark(self.first)
+            self.mark(self.first + self.size - 1)
+
+    def __contains__(self, value):
+        return self.first <= value < self.first + self.size
+
+    def is_marked(self, value):
+        offset = value - self.first
+        return bool(self.bits[offset >> 3] & (1 << (offset & 7)))
+
+    def mark(self, value):
+        """
+        :param value: the integer address in subnet
+        :return: True if it was free
+        """
+        offset = value - self.first
+        mask = 1 << (offset & 7)
+        if self.bits[offset >> 3] & mask:
+            return False
+        self.bits[offset >> 3] |= mask
+        self.free -= 1
+        return True
+
+    def next_free(self):
+        """
+        :return: the first free integer address from cursor, None if the subnet is full
+        """
+        offset = self.cursor
+        while offset < self.size:
+            byte = self.bits[offset >> 3]
+            if byte == 0xFF:
+                # 8 used addresses at a time
+                offset = (offset | 7) + 1
+                continue
+            if not byte & (1 << (offset & 7)):
+                self.cursor = offset
+                return self.first + offset
+            offset += 1
+        self.cursor = self.size
+        return None
+
+
+class IPAllocator(object):
+    """
+    allocate the free ips in one subnet
+    """
+
+    def __init__(self, network, used_ips=(), check_free=None):
+        """
+        :param network: as "10.0.0.0/24"
+        :param used_ips: the ips in use or reserved, the ones not in network are ignored
+        :param check_free: function(ips) to check the candidate ips at once, return the ones free such as they do not
+                           reply to probe, None to not check
+        """
+        self.network = str(network)
+        self.bitmap = SubnetBitmap(network)
+        self.check_free = check_free
+        for ip in used_ips:
+            try:
+                value = ip_to_int(ip)
+            except (socket.error, TypeError, UnicodeError):
+                # NULL or empty in db
+                continue
+            if value in self.bitmap:
+                self.bitmap.mark(value)
+
+    def allocate(self, count=1):
+        """
+        :return: a list of at most count ips, less when the subnet is full
+        """
+        ips = []
+        while len(ips) < count:
+            # the candidates for the ips still wanted are checked together
+            candidates = []
+            while len(ips) + len(candidates) < count:
+                value = self.bitmap.next_free()
+                if value is None:
+                    break
+                self.bitmap.mark(value)
+                candidates.append(int_to_ip(value))
+            if not candidates:
+                log.warn("No free ip in network %s.", self.network)
+                break
+            if self.check_free is not None:
+                free = set(self.check_free(candidates))
+                for ip in candidates:
+                    if ip not in free:
+                        log.debug("%s is not in cmdb but in use, skip it.", ip)
+                candidates = [ip for ip in candidates if ip in free]
+            ips.extend(candidates)
+        return ips
+
+
+_ip_reservations = ReservationStore(IP_RESERVATION_FILE, IP_RESERVATION_TTL)
+
+
+def get_ip_reservations():
+    """
+    :return: the store of ips allocated to the new vms
+    """
+    return _ip_reservations
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: ip_allocator_test.py
+ Author: longhui
+ Created Time: 2026-10-18 21:40:22
+'''
+import time
+import unittest
+from lib.Utils.ip_allocator import IPAllocator, SubnetBitmap, int_to_ip, ip_to_int
+
+
+class IPAllocatorTestCase(unittest.TestCase):
+
+    def test_bitmap(self):
+        bitmap = SubnetBitmap("10.0.0.9/29")
+        self.assertEqual(int_to_ip(bitmap.first), "10.0.0.8")
+        # network and broadcast address
+        self.assertEqual(bitmap.free, 6)
+        self.assertTrue(bitmap.is_marked(ip_to_int("10.0.0.15")))
+        self.assertFalse(ip_to_int("10.0.0.16") in bitmap)
+        self.assertEqual(int_to_ip(bitmap.next_free()), "10.0.0.9")
+
+    def test_allocate(self):
+        allocator = IPAllocator("10.0.0.0/29", ["10.0.0.1", "10.0.0.3", "10.1.0.2", None, "NULL", ""])
+        self.assertEqual(allocator.allocate(2), ["10.0.0.2", "10.0.0.4"])
+        self.assertEqual(allocator.allocate(5), ["10.0.0.5", "10.0.0.6"])
+        self.assertEqual(allocator.allocate(), [])
+
+    def test_probe_candidates(self):
+        probed = []
+
+        def check_free(ips):
+            probed.append(ips)
+            return [ip for ip in ips if ip != "10.0.0.2"]
+
+        allocator = IPAllocator("10.0.0.0/24", ["10.0.0.1"], check_free)
+        self.assertEqual(allocator.allocate(2), ["10.0.0.3", "10.0.0.4"])
+        # only the candidates are probed, the ones still wanted at once
+        self.assertEqual(probed, [["10.0.0.2", "10.0.0.3"], ["10.0.0.4"]])
+
+    def test_large_network(self):
+        used = [int_to_ip(ip_to_int("10.8.0.0") + offset) for offset in xrange(60000)]
+        start = time.time()
+        allocator = IPAllocator("10.8.0.0/16", used)
+        ips = allocator.allocate(100)
+        self.assertEqual(ips[0], "10.8.234.96")
+        self.assertEqual(len(set(ips)), 100)
+        self.assertTrue(time.time() - start < 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
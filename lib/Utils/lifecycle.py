@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: lifecycle.py
+ Author: longhui
+ Created Time: 2026-10-18 17:05:39
+ Descriptions: bulk power on, power off and reboot of the VMs on one host, run by a bounded number of workers with a
+        rate limit per host to avoid boot storms, and a report of the VMs succeeded and failed
+"""
+
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from lib.Log.log import log
+from lib.Utils.constans import BULK_POWER_BURST, BULK_POWER_RATE, BULK_POWER_WORKERS
+from lib.Val.virt_driver import POWER_HALTED, POWER_RUNNING
+from lib.Val.virt_factory import VirtFactory
+
+POWER_ON = "power_on"
+POWER_OFF = "power_off"
+REBOOT = "reboot"
+
+
+class TokenBucket(object):
+    """
+    at most burst operations at once, and then rate operations per second
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        :param rate: tokens added per second, 0 or less for no limit
+        :param burst: max tokens kept
+        """
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def configure(self, rate, burst=1):
+        """
+        change the rate and burst in place, the tokens left are kept, so the operations waiting are still limited
+        """
+        with self._lock:
+            self._refill(time.time())
+            self.rate = float(rate)
+            self.burst = max(float(burst), 1.0)
+            self._tokens = min(self._tokens, self.burst)
+
+    def acquire(self):
+        """
+        take a token, block until there is one
+        :return: seconds waited
+        """
+        if self.rate <= 0:
+            return 0
+        waited = 0
+        while True:
+            with self._lock:
+                self._refill(time.time())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(host, rate=BULK_POWER_RATE, burst=BULK_POWER_BURST):
+    """
+    :return: the token bucket shared by all the bulk operations to the host
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(host, None)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(rate, burst)
+        elif bucket.rate != rate or bucket.burst != max(burst, 1):
+            # the operations running with the bucket and the new ones share the same tokens
+            bucket.configure(rate, burst)
+        return bucket
+
+
+class LifecycleReport(object):
+    """
+    result of a bulk operation, the VMs already in the target state are skipped
+    """
+
+    def __init__(self, action):
+        self.action = action
+        self.succeeded = []
+        self.skipped = []
+        # {vm_name: reason}
+        self.failed = {}
+        self.start_time = time.time()
+        self.elapsed = 0
+
+    def __nonzero__(self):
+        return not self.failed
+
+    def add(self, vm_name, result, reason=None):
+        """
+        :param result: True, False or None when skipped
+        """
+        if result is None:
+            self.skipped.append(vm_name)
+        elif result:
+            self.succeeded.append(vm_name)
+        else:
+            self.failed[vm_name] = reason
+
+    def finish(self):
+        self.elapsed = time.time() - self.start_time
+        self.succeeded.sort()
+        self.skipped.sort()
+
+    def print_report(self):
+        log.info("%s finished in %.1fs: %s succeeded, %s skipped, %s failed.", self.action, self.elapsed,
+                 len(self.succeeded), len(self.skipped), len(self.failed))
+        if self.succeeded:
+            log.info("Succeeded: %s", ", ".join(self.succeeded))
+        if self.skipped:
+            log.info("Skipped: %s", ", ".join(self.skipped))
+        for vm_name in sorted(self.failed):
+            log.error("Failed: %s, %s", vm_name, self.failed[vm_name])
+
+
+def _apply(driver, action, vm_name, bucket, wait):
+    """
+    :return: (result, reason), result is None when the VM is already in the target state
+    """
+    if action == POWER_ON:
+        if driver.is_instance_running(vm_name):
+            return None, None
+        bucket.acquire()
+        if not driver.power_on_vm(vm_name):
+            return False, "power on failed"
+        if wait and not driver.wait_for_state(vm_name, [POWER_RUNNING]):
+            return False, "not running after power on"
+    elif action == POWER_OFF:
+        if driver.is_instance_halted(vm_name):
+            return None, None
+        bucket.acquire()
+        if not driver.power_off_vm(vm_name):
+            return False, "power off failed"
+        if wait and not driver.wait_for_state(vm_name, [POWER_HALTED]):
+            return False, "not halted after power off"
+    elif action == REBOOT:
+        bucket.acquire()
+        if not driver.reboot(vm_name):
+            return False, "reboot failed"
+    else:
+        raise ValueError("Unknown action: %s" % action)
+    return True, None
+
+
+def run_lifecycle(virt_driver, action, vm_names, workers=BULK_POWER_WORKERS, rate=BULK_POWER_RATE,
+                  burst=BULK_POWER_BURST, wait=True):
+    """
+    :param virt_driver: the driver to the host, shared by the workers when it is thread safe, otherwise each worker
+                        opens its own connection
+    :param action: POWER_ON, POWER_OFF or REBOOT
+    :param vm_names: list of VM names
+    :param workers: max number of VMs in operation at the same time
+    :param rate: max operations started per second on the host, 0 for no limit
+    :param wait: wait for the VM to reach the power state after power on/off
+    :return: LifecycleReport
+    """
+    report = LifecycleReport(action)
+    bucket = get_host_bucket(virt_driver.hostname, rate, burst)
+    concurrent = workers > 1 and len(vm_names) > 1
+    local = threading.local()
+    own_drivers = []
+    own_lock = threading.Lock()
+
+    def get_driver():
+        if virt_driver.thread_safe or not concurrent:
+            return virt_driver
+        if getattr(local, "driver", None) is None:
+            local.driver = VirtFactory.get_virt_driver(virt_driver.hostname, virt_driver.user, virt_driver.passwd,
+                                                       pooled=False)
+            with own_lock:
+                own_drivers.append(local.driver)
+        return local.driver
+
+    def worker(vm_name):
+        try:
+            driver = get_driver()
+            if not driver:
+                return vm_name, False, "can not connect to host"
+            result, reason = _apply(driver, action, vm_name, bucket, wait)
+            return vm_name, result, reason
+        except Exception as error:
+            log.exception("Exception when %s VM [%s]: %s", action, vm_name, error)
+            return vm_name, False, str(error)
+
+    log.info("Start to %s %s VMs with %s workers.", action, len(vm_names), workers)
+    if not concurrent:
+        results = [worker(vm_name) for vm_name in vm_names]
+    else:
+        pool = ThreadPool(min(workers, len(vm_names)))
+        try:
+            results = pool.map(worker, vm_names)
+        finally:
+            pool.close()
+            pool.join()
+            for driver in own_drivers:
+                driver.delete_handler()
+
+    for vm_name, result, reason in results:
+        report.add(vm_name, result, reason)
+    report.finish()
+    return report
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: lifecycle_test.py
+ Author: longhui
+ Created Time: 2026-10-18 17:42:16
+'''
+import threading
+import time
+import unittest
+from lib.Utils.lifecycle import get_host_bucket, run_lifecycle, TokenBucket, POWER_OFF, POWER_ON
+
+
+class FakeDriver(object):
+
+    thread_safe = True
+
+    def __init__(self, hostname, running=None, broken=None):
+        self.hostname = hostname
+        self.running = set(running or [])
+        self.broken = set(broken or [])
+        self.lock = threading.Lock()
+
+    def __nonzero__(self):
+        return True
+
+    def is_instance_running(self, inst_name):
+        return inst_name in self.running
+
+    def is_instance_halted(self, inst_name):
+        return inst_name not in self.running
+
+    def power_on_vm(self, inst_name):
+        if inst_name in self.broken:
+            return False
+        with self.lock:
+            self.running.add(inst_name)
+        return True
+
+    def power_off_vm(self, inst_name):
+        with self.lock:
+            self.running.discard(inst_name)
+        return True
+
+    def wait_for_state(self, inst_name, states, timeout=60):
+        return True
+
+
+class LifecycleTestCase(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.time()
+        for _ in range(4):
+            bucket.acquire()
+        # 2 tokens at once, then 2 more in 0.1s
+        self.assertGreater(time.time() - start, 0.08)
+        self.assertEqual(TokenBucket(rate=0).acquire(), 0)
+
+    def test_host_bucket_reconfigured(self):
+        bucket = get_host_bucket("bucket-test-host", rate=20, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+        # same bucket with new rate, the tokens taken are not given back
+        self.assertIs(get_host_bucket("bucket-test-host", rate=10, burst=4), bucket)
+        self.assertEqual((bucket.rate, bucket.burst), (10, 4))
+        self.assertLess(bucket._tokens, 1)
+
+    def test_report(self):
+        driver = FakeDriver("lifecycle-test-host", running=["vm1"], broken=["vm3"])
+        report = run_lifecycle(driver, POWER_ON, ["vm1", "vm2", "vm3", "vm4"], workers=4, rate=0)
+        self.assertFalse(report)
+        self.assertEqual(report.succeeded, ["vm2", "vm4"])
+        self.assertEqual(report.skipped, ["vm1"])
+        self.assertEqual(list(report.failed), ["vm3"])
+
+        report = run_lifecycle(driver, POWER_OFF, ["vm1", "vm2", "vm3"], workers=1, rate=0)
+        self.assertTrue(report)
+        self.assertEqual(report.succeeded, ["vm1", "vm2"])
+        self.assertEqual(driver.running, set(["vm4"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
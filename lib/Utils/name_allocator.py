@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: name_allocator.py
+ Author: longhui
+ Created Time: 2026-10-18 22:52:19
+ Descriptions: allocate the names of new vms as "kvm<last number of server ip>-<name key><suffix>". The suffixes used
+        by each name key are indexed from cmdb and updated by the allocations, the suffixes allocated are reserved in
+        a file, so the schedules at the same time never get the same name.
+"""
+
+import os
+import re
+import threading
+import time
+
+from lib.Utils.constans import NAME_RESERVATION_TTL
+from lib.Utils.reservation import ReservationStore
+
+
+NAME_RESERVATION_FILE = os.getenv("VIRT_NAME_RESERVATIONS",
+                                  os.path.join(os.path.expanduser("~"), ".dev_virt", "name_reservations.json"))
+# seconds the index of a name key is used before fetched from cmdb again
+NAME_INDEX_TTL = 60
+
+
+def name_pattern(key):
+    """
+    :return: the regular expression of vm names with the key, the suffix is in group 1
+    """
+    return r"^kvm[0-9]+-%s([0-9]+)$" % re.escape(key)
+
+
+def make_vm_name(server, key, suffix):
+    return "".join(["kvm", str.split(str(server), ".")[-1], "-", key, str(suffix)])
+
+
+class NameIndex(object):
+    """
+    the vm names with a key and their suffixes
+    """
+
+    def __init__(self, key, names=()):
+        self.key = key
+        self.names = []
+        # 1 is taken in case of no such vm, the first name has suffix 2
+        self.suffixes = set([1])
+        # all the suffixes below it are used
+        self.cursor = 1
+        self.loaded_at = time.time()
+        self._reg = re.compile(name_pattern(key))
+        for name in names:
+            self.add_name(name)
+
+    def add_name(self, name):
+        res = self._reg.search(name)
+        if res:
+            self.names.append(name)
+            self.suffixes.add(int(res.group(1)))
+
+    def allocate(self, count, taken=()):
+        """
+        :param taken: the suffixes reserved by others
+        :return: the smallest count suffixes not used or taken, they are used after it
+        """
+        taken = set(taken)
+        suffixes = []
+        while len(suffixes) < count:
+            if self.cursor not in self.suffixes and self.cursor not in taken:
+                suffixes.append(self.cursor)
+                self.suffixes.add(self.cursor)
+            self.cursor += 1
+        return suffixes
+
+    def release(self, suffixes):
+        for suffix in suffixes:
+            self.suffixes.discard(suffix)
+            self.cursor = min(self.cursor, suffix)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_name_index(key, fetch, ttl=NAME_INDEX_TTL):
+    """
+    :param fetch: function(key) return the vm names with the key from cmdb
+    :return: the NameIndex of key, fetched again when it is older than ttl
+    """
+    with _indexes_lock:
+        index = _indexes.get(key, None)
+        if index is None or time.time() - index.loaded_at > ttl:
+            index = _indexes[key] = NameIndex(key, fetch(key))
+        return index
+
+
+class NameAllocator(object):
+    """
+    allocate the vm names with the suffixes reserved in a ReservationStore, the reservation keys are "<key>/<suffix>"
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def allocate(self, index, servers):
+        """
+        :param index: the NameIndex of the name key
+        :param servers: the server ip of each new vm
+        :return: a list of new vm names in same order as servers
+        """
+        prefix = index.key + "/"
+        with self.store.transaction() as reservations:
+            taken = [int(name[len(prefix):]) for name in reservations if name.startswith(prefix)]
+            suffixes = index.allocate(len(servers), taken)
+            expire = time.time() + self.store.ttl
+            for suffix in suffixes:
+                reservations[prefix + str(suffix)] = expire
+        vm_names = [make_vm_name(server, index.key, suffix) for server, suffix in zip(servers, suffixes)]
+        for vm_name in vm_names:
+            index.names.append(vm_name)
+        return vm_names
+
+    def release(self, index, vm_names):
+        """
+        give back the names not created
+        """
+        reg = re.compile(name_pattern(index.key))
+        suffixes = [int(reg.search(vm_name).group(1)) for vm_name in vm_names if reg.search(vm_name)]
+        self.store.release([index.key + "/" + str(suffix) for suffix in suffixes])
+        index.release(suffixes)
+        index.names = [name for name in index.names if name not in vm_names]
+
+
+_name_allocator = NameAllocator(ReservationStore(NAME_RESERVATION_FILE, NAME_RESERVATION_TTL))
+
+
+def get_name_allocator():
+    """
+    :return: the name allocator with the reservations shared by processes
+    """
+    return _name_allocator
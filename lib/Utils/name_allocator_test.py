@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: name_allocator_test.py
+ Author: longhui
+ Created Time: 2026-10-18 23:10:34
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from lib.Utils.name_allocator import NameAllocator, NameIndex, get_name_index
+from lib.Utils.reservation import ReservationStore
+
+
+class NameAllocatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ReservationStore(os.path.join(self.tmp_dir, "names.json"), ttl=60)
+        self.names = ["kvm12-sa-k8s-node2", "kvm13-sa-k8s-node4", "kvm12-sa-k8s-node-old5", "kvm12-sa-k8s-nodes6"]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index(self):
+        index = NameIndex("sa-k8s-node", self.names)
+        # the names with other keys are left out
+        self.assertEqual(index.names, ["kvm12-sa-k8s-node2", "kvm13-sa-k8s-node4"])
+        self.assertEqual(index.allocate(3), [3, 5, 6])
+        index.release([5])
+        self.assertEqual(index.allocate(1), [5])
+
+    def test_allocate_batch(self):
+        allocator = NameAllocator(self.store)
+        index = NameIndex("sa-k8s-node", self.names)
+        self.assertEqual(allocator.allocate(index, ["10.0.0.12", "10.0.0.13"]), ["kvm12-sa-k8s-node3",
+                                                                                 "kvm13-sa-k8s-node5"])
+        # an other scheduler with its own index does not get the suffixes reserved
+        other = NameIndex("sa-k8s-node", self.names)
+        self.assertEqual(NameAllocator(self.store).allocate(other, ["10.0.0.14"]), ["kvm14-sa-k8s-node6"])
+
+        allocator.release(index, ["kvm12-sa-k8s-node3"])
+        self.assertEqual(allocator.allocate(NameIndex("sa-k8s-node", self.names), ["10.0.0.15"]),
+                         ["kvm15-sa-k8s-node3"])
+
+    def test_shared_index(self):
+        fetched = []
+
+        def fetch(key):
+            fetched.append(key)
+            return self.names
+
+        index = get_name_index("sa-k8s-node-shared", fetch)
+        self.assertTrue(get_name_index("sa-k8s-node-shared", fetch) is index)
+        self.assertEqual(fetched, ["sa-k8s-node-shared"])
+        self.assertFalse(get_name_index("sa-k8s-node-shared", fetch, ttl=-1) is index)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: placement.py
+ Author: longhui
+ Created Time: 2026-10-18 20:05:42
+ Descriptions: choose the server for new vms. The free resources of all servers are kept column by column, each
+        placement filters the servers by the thresholds, scores them with a policy from the registry and takes the
+        resources of the vm from the chosen one. Every server in the ranking carries its score components or the
+        reason it is rejected, so a schedule can be explained.
+"""
+
+from lib.Log.log import log
+
+
+# the key in etc/Nodeconfig.json for the placement config, it is not a role
+PLACEMENT_CONFIG_KEY = "placement"
+
+DEFAULT_PLACEMENT = {
+    "policy": "spread",
+    # GB of physical free memory a server keeps to start the new vm
+    "min_physic_free_memory": 10,
+    # GB of physical free disk in the disk pool a server keeps
+    "min_free_disk": 100,
+    # the weight of each resource headroom in score
+    "weights": {"memory": 1.0, "physic_memory": 0.5, "overcommit_memory": 0.5, "physic_disk": 0.2,
+                "overcommit_vcpus": 0.5},
+}
+
+# the items in the info list of schedule.get_server_infors
+INFO_FIELDS = ["memory", "physic_memory", "overcommit_memory", "physic_disk", "disk", "cpu_cores", "overcommit_vcpus"]
+MEMORY_FIELDS = ["memory", "physic_memory", "overcommit_memory"]
+DISK_FIELDS = ["physic_disk", "disk"]
+VCPU_FIELDS = ["overcommit_vcpus"]
+
+_policies = {}
+
+
+def register_policy(*names):
+    """
+    decorator to register a policy function(headroom, weights, peers), which returns the score of a server, higher
+    is better.
+    headroom: {field: free resource after placing the vm / the max of all servers}, at most 1
+    weights: {field: weight} from the placement config
+    peers: the number of vms with same name key of role and cluster on the server
+    """
+    def decorator(func):
+        for name in names:
+            _policies[name] = func
+        return func
+    return decorator
+
+
+def get_policy(name):
+    """
+    :raise ValueError: when no such policy
+    """
+    if name not in _policies:
+        raise ValueError("Unknown placement policy: %s, supported: %s" % (name, ", ".join(sorted(_policies))))
+    return _policies[name]
+
+
+@register_policy("spread", "worst-fit")
+def spread_policy(headroom, weights, peers):
+    """
+    the server with most free resources, the vms are spread over the servers
+    """
+    return sum(weight * headroom.get(field, 0) for field, weight in weights.items())
+
+
+@register_policy("best-fit")
+def best_fit_policy(headroom, weights, peers):
+    """
+    the server with least free resources which fits the vm, the free servers are kept for big vms
+    """
+    return -spread_policy(headroom, weights, peers)
+
+
+@register_policy("anti-affinity")
+def anti_affinity_policy(headroom, weights, peers):
+    """
+    the server with fewest vms of same role and cluster, and then most free resources
+    """
+    total = sum(weights.values()) or 1
+    return spread_policy(headroom, weights, peers) / total - peers
+
+
+class Candidate(object):
+    """
+    a server in ranking
+    """
+
+    def __init__(self, host, score=None, headroom=None, peers=0, reason=None):
+        self.host = host
+        self.score = score
+        self.headroom = headroom or {}
+        self.peers = peers
+        # why the server is rejected, None when it fits
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason is not None:
+            return "%s rejected: %s" % (self.host, self.reason)
+        components = " ".join("%s=%.3f" % (field, self.headroom[field]) for field in sorted(self.headroom))
+        return "%s score=%.3f %s peers=%s" % (self.host, self.score, components, self.peers)
+
+
+class PlacementEngine(object):
+    """
+    place vms one by one, the resources taken by the former vms are counted when placing the next one
+    """
+
+    def __init__(self, server_infors, config=None, peers=None):
+        """
+        :param server_infors: the return of schedule.get_server_infors
+        :param config: the placement config in etc/Nodeconfig.json, the items not given are from DEFAULT_PLACEMENT
+        :param peers: {server: the number of vms with same name key}, for anti-affinity
+        :raise ValueError: when the policy is unknown
+        """
+        self.config = dict(DEFAULT_PLACEMENT)
+        self.config.update(config or {})
+        self.policy_name = self.config["policy"]
+        self.policy = get_policy(self.policy_name)
+        self.weights = dict((field, float(weight)) for field, weight in self.config["weights"].items())
+        self.hosts = sorted(server_infors)
+        # None if the item is not known, such as the vcpus in a capacity snapshot collected by the old version
+        self.columns = dict((field, [float(server_infors[host][index])
+                                     if len(server_infors[host]) > index and server_infors[host][index] is not None
+                                     else None for host in self.hosts])
+                            for index, field in enumerate(INFO_FIELDS))
+        self.peers = [(peers or {}).get(host, 0) for host in self.hosts]
+
+    def _reject_reason(self, index, memory, disk, vcpus):
+        columns = self.columns
+        if columns["physic_memory"][index] <= self.config["min_physic_free_memory"]:
+            return "physic free memory %.1fGB <= %sGB" % (columns["physic_memory"][index],
+                                                         self.config["min_physic_free_memory"])
+        if columns["overcommit_memory"][index] - memory <= 0:
+            return "logic free memory %.1fGB with over commit < %sGB" % (columns["overcommit_memory"][index], memory)
+        if columns["physic_disk"][index] <= self.config["min_free_disk"]:
+            return "physic free disk %.1fGB <= %sGB" % (columns["physic_disk"][index], self.config["min_free_disk"])
+        if columns["physic_disk"][index] < disk:
+            return "physic free disk %.1fGB < %sGB" % (columns["physic_disk"][index], disk)
+        if columns["overcommit_vcpus"][index] is not None and columns["overcommit_vcpus"][index] - vcpus < 0:
+            return "logic free vcpus %.1f with over commit of %s cores < %s" % (
+                columns["overcommit_vcpus"][index], int(columns["cpu_cores"][index]), vcpus)
+        return None
+
+    def rank(self, memory, disk=0, vcpus=0):
+        """
+        :param memory: memory size of the new vm in GB
+        :param disk: size of the disks added to the new vm in GB
+        :param vcpus: vcpu number of the new vm
+        :return: a list of Candidate, the servers fit are first with the best one at head, the rejected ones follow
+        """
+        requests = dict([(field, memory) for field in MEMORY_FIELDS] + [(field, disk) for field in DISK_FIELDS] +
+                        [(field, vcpus) for field in VCPU_FIELDS])
+        fit, rejected = [], []
+        for index in xrange(len(self.hosts)):
+            reason = self._reject_reason(index, memory, disk, vcpus)
+            if reason is None:
+                fit.append(index)
+            else:
+                rejected.append(Candidate(self.hosts[index], reason=reason))
+
+        # the resources left after placing, scaled by the max of the servers fit
+        headrooms = {}
+        for field in self.weights:
+            if field not in requests:
+                continue
+            # an unknown item scores 0
+            left = [self.columns[field][index] - requests[field] if self.columns[field][index] is not None else 0.0
+                    for index in fit]
+            top = max([abs(value) for value in left] + [0])
+            headrooms[field] = [value / top if top > 0 else 0.0 for value in left]
+
+        candidates = []
+        for position, index in enumerate(fit):
+            headroom = dict((field, values[position]) for field, values in headrooms.items())
+            score = self.policy(headroom, self.weights, self.peers[index])
+            candidates.append(Candidate(self.hosts[index], score, headroom, self.peers[index]))
+        candidates.sort(key=lambda candidate: (-candidate.score, candidate.host))
+        return candidates + rejected
+
+    def place(self, memory, disk=0, vcpus=0):
+        """
+        choose the best server for a new vm, and take the resources of the vm from it
+        :return: (server or None if no one fits, the ranking)
+        """
+        ranking = self.rank(memory, disk, vcpus)
+        if not ranking or ranking[0].reason is not None:
+            return None, ranking
+
+        index = self.hosts.index(ranking[0].host)
+        for field in MEMORY_FIELDS:
+            self.columns[field][index] -= memory
+        for field in DISK_FIELDS:
+            self.columns[field][index] -= disk
+        for field in VCPU_FIELDS:
+            if self.columns[field][index] is not None:
+                self.columns[field][index] -= vcpus
+        self.peers[index] += 1
+        return ranking[0].host, ranking
+
+
+def explain_ranking(ranking, top=5, logger=log.debug):
+    """
+    log the first top servers fit and the rejected ones
+    """
+    fit = [candidate for candidate in ranking if candidate.reason is None]
+    rejected = [candidate for candidate in ranking if candidate.reason is not None]
+    for position, candidate in enumerate(fit[:top]):
+        logger("#%s %s", position + 1, candidate)
+    if len(fit) > top:
+        logger("... and %s other servers fit", len(fit) - top)
+    for candidate in rejected:
+        logger("%s", candidate)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: placement_test.py
+ Author: longhui
+ Created Time: 2026-10-18 20:31:16
+'''
+import unittest
+from lib.Utils.placement import PlacementEngine, get_policy
+
+
+class PlacementEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # [logic-free-mem-without-overCommit, physic-free-mem, logic-free-mem-overCommit, physic-free-disk, logic-free-disk]
+        self.server_infors = {"10.0.0.1": [100, 120, 140, 1000, 1000],
+                              "10.0.0.2": [40, 50, 60, 1000, 1000],
+                              "10.0.0.3": [20, 8, 30, 1000, 1000],
+                              "10.0.0.4": [100, 120, 140, 50, 50]}
+
+    def test_spread(self):
+        engine = PlacementEngine(self.server_infors)
+        server, ranking = engine.place(16)
+        self.assertEqual(server, "10.0.0.1")
+        self.assertEqual([candidate.host for candidate in ranking[:2]], ["10.0.0.1", "10.0.0.2"])
+        # the rejected servers are explained
+        reasons = dict((candidate.host, candidate.reason) for candidate in ranking[2:])
+        self.assertTrue("physic free memory" in reasons["10.0.0.3"])
+        self.assertTrue("physic free disk" in reasons["10.0.0.4"])
+        self.assertTrue("score=" in str(ranking[0]))
+        self.assertTrue("rejected" in str(ranking[-1]))
+
+    def test_resources_taken_by_former_vms(self):
+        engine = PlacementEngine(self.server_infors)
+        servers = [engine.place(32)[0] for _ in range(4)]
+        # 10.0.0.1 has 140GB with over commit, the vms go to 10.0.0.2 when it has less free memory
+        self.assertEqual(servers.count("10.0.0.2"), 1)
+        self.assertEqual(engine.place(32)[0], "10.0.0.1")
+        self.assertIsNone(engine.place(32)[0])
+
+    def test_best_fit(self):
+        engine = PlacementEngine(self.server_infors, {"policy": "best-fit"})
+        self.assertEqual(engine.place(16)[0], "10.0.0.2")
+
+    def test_anti_affinity(self):
+        engine = PlacementEngine(self.server_infors, {"policy": "anti-affinity"}, peers={"10.0.0.1": 2})
+        self.assertEqual([engine.place(8)[0] for _ in range(3)], ["10.0.0.2", "10.0.0.2", "10.0.0.1"])
+
+    def test_thresholds(self):
+        engine = PlacementEngine(self.server_infors, {"min_physic_free_memory": 200})
+        server, ranking = engine.place(16)
+        self.assertIsNone(server)
+        self.assertTrue(all(candidate.reason for candidate in ranking))
+
+    def test_vcpu_overcommit(self):
+        # with cpu-cores and logic-free-vcpus-overCommit
+        server_infors = {"10.0.0.1": [100, 120, 140, 1000, 1000, 16, 8],
+                         "10.0.0.2": [40, 50, 60, 1000, 1000, 32, 64]}
+        engine = PlacementEngine(server_infors)
+        server, ranking = engine.place(8, vcpus=16)
+        self.assertEqual(server, "10.0.0.2")
+        self.assertTrue("vcpus" in ranking[-1].reason)
+        self.assertEqual([engine.place(8, vcpus=16)[0] for _ in range(4)], ["10.0.0.2", "10.0.0.2", "10.0.0.2", None])
+        # the vcpus are not checked for the servers without them
+        self.assertEqual(PlacementEngine(self.server_infors).place(16, vcpus=1000)[0], "10.0.0.1")
+        server_infors = {"10.0.0.1": [100, 120, 140, 1000, 1000, None, None]}
+        self.assertEqual(PlacementEngine(server_infors).place(16, vcpus=1000)[0], "10.0.0.1")
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, get_policy, "no-such-policy")
+        self.assertRaises(ValueError, PlacementEngine, self.server_infors, {"policy": "no-such-policy"})
+
+
+if __name__ == "__main__":
+    unittest.main()
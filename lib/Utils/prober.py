@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: prober.py
+ Author: longhui
+ Created Time: 2026-10-18 22:06:13
+ Descriptions: check whether a few ips are in use at the same time. With the privilege for raw socket, an icmp echo is
+        sent to each ip and the replies are read until timeout; without it, or for the ips not replied, non-blocking
+        tcp connects to some ports are waited with select, a refused connect means the host is up, and the neighbours
+        resolved by arp are up too.
+        The results are cached for a short time.
+"""
+
+import errno
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from lib.Log.log import log
+from lib.Utils.constans import PROBE_CACHE_TTL, PROBE_TCP_PORTS, PROBE_TIMEOUT
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+# keep the sockets opened at the same time under the limit of select
+MAX_SOCKETS = 256
+ARP_TABLE = "/proc/net/arp"
+# the flag of a completed arp entry
+ATF_COM = 0x2
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_request(ident, seq):
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    payload = b"dev_virt"
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, _checksum(header + payload), ident, seq) + payload
+
+
+def _chunks(items, size):
+    for index in xrange(0, len(items), size):
+        yield items[index:index + size]
+
+
+def arp_neighbours(path=ARP_TABLE):
+    """
+    :return: a set of the ips with a completed entry in the arp table, empty if not on Linux
+    """
+    neighbours = set()
+    try:
+        with open(path) as arp_file:
+            # IP address, HW type, Flags, HW address, Mask, Device
+            for line in arp_file.readlines()[1:]:
+                fields = line.split()
+                if len(fields) >= 4 and int(fields[2], 16) & ATF_COM and fields[3] != "00:00:00:00:00:00":
+                    neighbours.add(fields[0])
+    except (IOError, OSError, ValueError):
+        pass
+    return neighbours
+
+
+class Prober(object):
+    """
+    probe a list of ips concurrently, and cache the results
+    """
+
+    def __init__(self, timeout=PROBE_TIMEOUT, ttl=PROBE_CACHE_TTL, ports=PROBE_TCP_PORTS):
+        """
+        :param timeout: seconds to wait for the replies of a probe
+        :param ttl: seconds a result is cached, 0 to not cache
+        :param ports: the tcp ports to connect when icmp is not allowed
+        """
+        self.timeout = timeout
+        self.ttl = ttl
+        self.ports = list(ports)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._icmp_allowed = None
+
+    def _open_icmp(self):
+        """
+        :return: a raw icmp socket, None without the privilege
+        """
+        if self._icmp_allowed is False:
+            return None
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.getprotobyname("icmp"))
+        except (socket.error, OSError) as error:
+            log.debug("Can not open raw socket for icmp: %s, probe with tcp connect.", error)
+            self._icmp_allowed = False
+            return None
+        self._icmp_allowed = True
+        return sock
+
+    def _probe_icmp(self, sock, ips):
+        """
+        :return: a set of ips replied
+        """
+        ident = (os.getpid() ^ threading.current_thread().ident) & 0xFFFF
+        pending = set(ips)
+        alive = set()
+        try:
+            for seq, ip in enumerate(ips):
+                try:
+                    sock.sendto(_echo_request(ident, seq & 0xFFFF), (ip, 0))
+                except socket.error as error:
+                    log.debug("Can not send icmp echo to %s: %s", ip, error)
+                    pending.discard(ip)
+
+            expire_at = time.time() + self.timeout
+            while pending:
+                remaining = expire_at - time.time()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    break
+                try:
+                    packet, (address, _) = sock.recvfrom(1024)
+                except socket.error as error:
+                    log.debug("Can not read icmp reply: %s", error)
+                    break
+                header_len = (ord(packet[0]) & 0x0F) * 4
+                if len(packet) < header_len + 8:
+                    continue
+                icmp_type, _, _, reply_ident, _ = struct.unpack("!BBHHH", packet[header_len:header_len + 8])
+                if icmp_type == ICMP_ECHO_REPLY and reply_ident == ident and address in pending:
+                    pending.discard(address)
+                    alive.add(address)
+        finally:
+            sock.close()
+        return alive
+
+    def _probe_tcp(self, ips):
+        """
+        :return: a set of ips accepted or refused the connect on any port
+        """
+        alive = set()
+        pending = {}
+        try:
+            for ip in ips:
+                for port in self.ports:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.setblocking(0)
+                    err = sock.connect_ex((ip, port))
+                    if err in (0, errno.ECONNREFUSED):
+                        alive.add(ip)
+                        sock.close()
+                    elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                        pending[sock] = ip
+                    else:
+                        sock.close()
+
+            expire_at = time.time() + self.timeout
+            while pending:
+                remaining = expire_at - time.time()
+                if remaining <= 0:
+                    break
+                _, writable, _ = select.select([], list(pending), [], remaining)
+                if not writable:
+                    break
+                for sock in writable:
+                    ip = pending.pop(sock)
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) in (0, errno.ECONNREFUSED):
+                        alive.add(ip)
+                    sock.close()
+        finally:
+            for sock in pending:
+                sock.close()
+
+        # a host drops the connects still answers the arp request sent for them
+        return alive | (set(ips) & arp_neighbours())
+
+    def probe_many(self, ips):
+        """
+        :param ips: a short list of ips
+        :return: {ip: True if it is in use}
+        """
+        now = time.time()
+        results = {}
+        with self._lock:
+            for ip in ips:
+                entry = self._cache.get(ip, None)
+                if entry is not None and now - entry[0] < self.ttl:
+                    results[ip] = entry[1]
+        to_probe = [ip for ip in ips if ip not in results]
+
+        for chunk in _chunks(to_probe, max(MAX_SOCKETS // max(len(self.ports), 1), 1)):
+            sock = self._open_icmp()
+            if sock is None:
+                alive = self._probe_tcp(chunk)
+            else:
+                alive = self._probe_icmp(sock, chunk)
+                # a host drops icmp may still answer the arp request or the tcp connect
+                silent = [ip for ip in chunk if ip not in alive]
+                if silent:
+                    alive |= self._probe_tcp(silent)
+            probed_at = time.time()
+            with self._lock:
+                for ip in chunk:
+                    results[ip] = ip in alive
+                    if self.ttl > 0:
+                        self._cache[ip] = (probed_at, results[ip])
+        return results
+
+    def is_alive(self, ip):
+        """
+        :return: True if the ip is in use
+        """
+        return self.probe_many([ip])[ip]
+
+    def forget(self, ip=None):
+        """
+        drop the cached result of ip, or all when ip is None
+        """
+        with self._lock:
+            if ip is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(ip, None)
+
+
+_prober = Prober()
+
+
+def get_prober():
+    """
+    :return: the process wide prober
+    """
+    return _prober
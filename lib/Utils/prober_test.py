@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: prober_test.py
+ Author: longhui
+ Created Time: 2026-10-18 22:31:45
+'''
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+from lib.Utils.prober import Prober, _checksum, _echo_request, arp_neighbours
+
+
+class CountingProber(Prober):
+
+    def __init__(self, alive, **kwargs):
+        Prober.__init__(self, **kwargs)
+        self.alive = set(alive)
+        self.probed = []
+
+    def _open_icmp(self):
+        return None
+
+    def _probe_tcp(self, ips):
+        self.probed.append(list(ips))
+        return self.alive & set(ips)
+
+
+class IcmpProber(CountingProber):
+
+    def __init__(self, alive, replied, **kwargs):
+        CountingProber.__init__(self, alive, **kwargs)
+        self.replied = set(replied)
+
+    def _open_icmp(self):
+        return object()
+
+    def _probe_icmp(self, sock, ips):
+        return self.replied & set(ips)
+
+
+class ProberTestCase(unittest.TestCase):
+
+    def test_echo_request(self):
+        packet = _echo_request(0x1234, 1)
+        self.assertEqual(struct.unpack("!BBHHH", packet[:8])[3], 0x1234)
+        # the checksum of a packet with its checksum is 0
+        self.assertEqual(_checksum(packet), 0)
+
+    def test_arp_neighbours(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "arp")
+            with open(path, "w") as arp_file:
+                arp_file.write("IP address       HW type     Flags       HW address            Mask     Device\n"
+                               "10.0.0.2         0x1         0x2         52:54:00:12:34:56     *        br0\n"
+                               "10.0.0.3         0x1         0x0         00:00:00:00:00:00     *        br0\n")
+            self.assertEqual(arp_neighbours(path), set(["10.0.0.2"]))
+            self.assertEqual(arp_neighbours(os.path.join(tmp_dir, "none")), set())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_cache(self):
+        prober = CountingProber(["10.0.0.2"], ttl=60)
+        self.assertEqual(prober.probe_many(["10.0.0.2", "10.0.0.3"]), {"10.0.0.2": True, "10.0.0.3": False})
+        self.assertTrue(prober.is_alive("10.0.0.2"))
+        self.assertFalse(prober.is_alive("10.0.0.4"))
+        self.assertEqual(prober.probed, [["10.0.0.2", "10.0.0.3"], ["10.0.0.4"]])
+        prober.forget("10.0.0.2")
+        prober.is_alive("10.0.0.2")
+        self.assertEqual(prober.probed[-1], ["10.0.0.2"])
+
+    def test_icmp_not_replied(self):
+        prober = IcmpProber(["10.0.0.3"], ["10.0.0.2"], ttl=0)
+        self.assertEqual(prober.probe_many(["10.0.0.2", "10.0.0.3", "10.0.0.4"]),
+                         {"10.0.0.2": True, "10.0.0.3": True, "10.0.0.4": False})
+        # only the ips not replied are connected
+        self.assertEqual(prober.probed, [["10.0.0.3", "10.0.0.4"]])
+
+    def test_tcp_connect(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        try:
+            prober = Prober(timeout=1, ttl=0, ports=[server.getsockname()[1]])
+            self.assertEqual(prober._probe_tcp(["127.0.0.1"]), set(["127.0.0.1"]))
+        finally:
+            server.close()
+        # refused by a host which is up
+        self.assertEqual(prober._probe_tcp(["127.0.0.1"]), set(["127.0.0.1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: provision.py
+ Author: longhui
+ Created Time: 2026-10-18 18:06:52
+ Descriptions: create the VMs parsed from the setup xml concurrently. Each VM is a chain of steps:
+        clone -> configure -> disks -> power on, the chains of different VMs and servers are independent and run in
+        a thread pool, with a limit of VMs in progress on each server. The steps done are saved to a state file, so a
+        partially applied xml can be resumed.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from lib.Log.log import log
+from lib.Utils.constans import PROVISION_HOST_WORKERS, PROVISION_WORKERS
+from lib.Utils.signal_utils import Deadline, wait_until
+from lib.Utils.vm_utils import VirtHostDomain
+from lib.Val.virt_driver import POWER_RUNNING
+
+STEP_CLONE = "clone"
+STEP_CONFIGURE = "configure"
+STEP_DISK = "disk:%s"
+STEP_POWER_ON = "power_on"
+
+
+def vm_steps(vm):
+    """
+    :param vm: the vm dict parsed from xml
+    :return: the step names of the vm in order, each disk is a step so that it is not added twice when resumed
+    """
+    return [STEP_CLONE, STEP_CONFIGURE] + [STEP_DISK % index for index in range(len(vm['disks']))] + [STEP_POWER_ON]
+
+
+class ProvisionState(object):
+    """
+    A json file as {"host/vmname": ["clone", "configure", ...]}, with the steps done of each VM
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._steps = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as state_file:
+                    self._steps = json.load(state_file)
+            except (IOError, OSError, ValueError) as error:
+                log.warn("Can not load provision state from %s: %s", path, error)
+
+    @staticmethod
+    def _key(host, vmname):
+        return "%s/%s" % (host, vmname)
+
+    def done_steps(self, host, vmname):
+        with self._lock:
+            return list(self._steps.get(self._key(host, vmname), []))
+
+    def mark_done(self, host, vmname, step):
+        with self._lock:
+            self._steps.setdefault(self._key(host, vmname), []).append(step)
+            self._dump()
+
+    def _dump(self):
+        """
+        write to a temp file and rename it, so the file is never partial when the process is killed
+        """
+        if not self.path:
+            return
+        state_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".provision_state", dir=state_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(self._steps, tmp_file)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as error:
+            log.warn("Can not save provision state to %s: %s", self.path, error)
+
+    def remove(self):
+        if self.path and os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class ProvisionExecutor(object):
+    """
+    run the steps of all VMs in parsed xml
+    """
+
+    def __init__(self, parsed_xml, state_file=None, workers=PROVISION_WORKERS, host_workers=PROVISION_HOST_WORKERS):
+        """
+        :param parsed_xml: the return of xml_utils.parse_xml
+        :param state_file: file to save the steps done, None to not save
+        :param workers: max number of VMs in progress
+        :param host_workers: max number of VMs in progress on one server
+        """
+        self.servers = parsed_xml
+        self.state = ProvisionState(state_file)
+        self.workers = workers
+        self.host_workers = host_workers
+        self._semaphores = {}
+        # whether the drivers to a server can be shared by threads
+        self._thread_safe = {}
+        self._lock = threading.Lock()
+        self._total_steps = 0
+        self._finished_steps = 0
+
+    def is_resumed(self, host, vmname):
+        """
+        :return: True if some steps of the VM were done by a former run
+        """
+        return bool(self.state.done_steps(host, vmname))
+
+    def _progress(self, host, vmname, step):
+        with self._lock:
+            self._finished_steps += 1
+            finished, total = self._finished_steps, self._total_steps
+        log.info("[%s/%s] VM [%s] on server [%s]: %s done.", finished, total, vmname, host, step)
+
+    def _run_step(self, virthost, vm, step):
+        """
+        :return: True or False
+        """
+        vmname = vm['vmname']
+        if step == STEP_CLONE:
+            log.info("Start to create vm [%s]!", vmname)
+            return virthost.create_vm(vmname, vm['template'])
+
+        if step == STEP_CONFIGURE:
+            virthost.config_vcpus(vmname, vcpu_max=vm['cpumax'])
+            if vm['maxMemory']:
+                virthost.config_max_memory(vmname, static_max=vm['maxMemory'])
+            if vm['minMemory']:
+                virthost.config_min_memory(vmname, static_min=vm['minMemory'])
+            if vm['memory']:
+                virthost.config_memory(vmname, dynamic_min=vm['memory'], dynamic_max=vm['memory'])
+            for ipdic in vm['ips']:
+                virthost.config_vif(vmname, ipdic['vifIndex'], ipdic['device'], ipdic['network'], ipdic['bridge'],
+                                    ipdic['ip'])
+            return True
+
+        if step.startswith(STEP_DISK % ""):
+            diskdic = vm['disks'][int(step.split(":")[1])]
+            storage = diskdic['storage']
+            if not storage:
+                storage = virthost.get_max_free_size_storage()  # calc the default sr online
+            return virthost.add_vm_disk(vmname, storage, diskdic['size'])
+
+        if step == STEP_POWER_ON:
+            if not virthost.power_on_vm(vmname):
+                log.warn("Create VM [%s] successfully, but power on vm return False.", vmname)
+                return False
+            if vm['cpucores']:
+                with Deadline(10):
+                    allowed = virthost.virt_driver.wait_for_state(vmname, [POWER_RUNNING], 10) and \
+                              wait_until(lambda: virthost.allowed_set_vcpu_live(vmname), 10)
+                if allowed:
+                    virthost.config_vcpus(vmname, vcpu_nums=vm['cpucores'])
+                else:
+                    log.warn("After waiting for 10s and haven't power on to set vcpu lively.")
+            return True
+
+        raise ValueError("Unknown step: %s" % step)
+
+    def _provision_vm(self, server, vm):
+        """
+        run the steps not done of one VM
+        :return: (host, vmname, failed step or None)
+        """
+        host, vmname = server['host'], vm['vmname']
+        done = self.state.done_steps(host, vmname)
+        with self._semaphores[host]:
+            virthost = None
+            try:
+                for step in vm_steps(vm):
+                    if step in done:
+                        continue
+                    try:
+                        if virthost is None:
+                            virthost = VirtHostDomain(host, server['user'], server['passwd'],
+                                                      pooled=self._thread_safe[host])
+                            if not virthost:
+                                log.error("Can not connect to server [%s] for VM [%s].", host, vmname)
+                                return host, vmname, step
+                        ret = self._run_step(virthost, vm, step)
+                    except Exception as error:
+                        log.exception("Exception when %s VM [%s] on server [%s]: %s", step, vmname, host, error)
+                        ret = False
+                    if not ret:
+                        log.error("Failed to %s VM [%s] on server [%s].", step, vmname, host)
+                        return host, vmname, step
+                    self.state.mark_done(host, vmname, step)
+                    self._progress(host, vmname, step)
+            finally:
+                # the connects not pooled are owned by this VM, do not wait for the garbage collector to close them
+                if virthost is not None:
+                    try:
+                        virthost.close()
+                    except Exception as error:
+                        log.debug("Exception when close the connects to server [%s]: %s", host, error)
+
+        log.info("Create VM [%s] and power on successfully", vmname)
+        return host, vmname, None
+
+    def run(self):
+        """
+        :return: a dict of the VMs failed as {vmname: (host, failed step)}, empty if all succeeded
+        """
+        tasks = []
+        for server in self.servers:
+            host = server['host']
+            # the drivers of a thread safe platform are shared by the VMs, otherwise each VM opens its own
+            virthost = VirtHostDomain(host, server['user'], server['passwd'])
+            if not virthost:
+                log.error("Can not connect to host [%s] or DB driver, initial VirtHostDomain failed.", host)
+                return dict((vm['vmname'], (host, None)) for server in self.servers for vm in server['vms'])
+            self._thread_safe[host] = virthost.virt_driver.thread_safe
+            self._semaphores[host] = threading.Semaphore(max(self.host_workers, 1))
+            for vm in server['vms']:
+                done = self.state.done_steps(host, vm['vmname'])
+                self._total_steps += len([step for step in vm_steps(vm) if step not in done])
+                tasks.append((server, vm))
+
+        log.info("Start to create %s VMs on %s servers, %s steps to run.", len(tasks), len(self.servers),
+                 self._total_steps)
+        start = time.time()
+        if self.workers <= 1 or len(tasks) <= 1:
+            results = [self._provision_vm(server, vm) for server, vm in tasks]
+        else:
+            pool = ThreadPool(min(self.workers, len(tasks)))
+            try:
+                results = pool.map(lambda task: self._provision_vm(*task), tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        failed = dict((vmname, (host, step)) for host, vmname, step in results if step is not None)
+        log.info("Provision finished in %.1fs, %s VMs succeeded, %s failed.", time.time() - start,
+                 len(results) - len(failed), len(failed))
+        if not failed:
+            self.state.remove()
+        return failed
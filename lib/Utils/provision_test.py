@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: provision_test.py
+ Author: longhui
+ Created Time: 2026-10-18 18:40:25
+'''
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import lib.Utils.provision as provision
+from lib.Utils.provision import ProvisionExecutor, ProvisionState, vm_steps, STEP_CLONE, STEP_CONFIGURE, STEP_POWER_ON
+
+
+class FakeVirtDriver(object):
+
+    thread_safe = False
+
+
+class FakeVirtHost(object):
+    """
+    record the steps called on each server, the VMs in broken fail to power on
+    """
+    lock = threading.Lock()
+    broken = set()
+    steps = []
+    in_progress = {}
+    max_in_progress = {}
+    opened = 0
+    closed = 0
+
+    def __init__(self, host_name, user="root", passwd="", pooled=True):
+        self.host = host_name
+        self.virt_driver = FakeVirtDriver()
+        with self.lock:
+            FakeVirtHost.opened += 1
+
+    def __nonzero__(self):
+        return True
+
+    def close(self):
+        with self.lock:
+            FakeVirtHost.closed += 1
+
+    def _record(self, vmname, step):
+        with self.lock:
+            self.steps.append((vmname, step))
+
+    def create_vm(self, vmname, template):
+        with self.lock:
+            self.in_progress[self.host] = self.in_progress.get(self.host, 0) + 1
+            self.max_in_progress[self.host] = max(self.max_in_progress.get(self.host, 0),
+                                                  self.in_progress[self.host])
+        time.sleep(0.02)
+        with self.lock:
+            self.in_progress[self.host] -= 1
+        self._record(vmname, STEP_CLONE)
+        return True
+
+    def config_vcpus(self, vmname, vcpu_max=None, vcpu_nums=None):
+        self._record(vmname, STEP_CONFIGURE)
+
+    def config_memory(self, vmname, dynamic_min=None, dynamic_max=None):
+        pass
+
+    def add_vm_disk(self, vmname, storage, size):
+        self._record(vmname, "disk")
+        return True
+
+    def power_on_vm(self, vmname):
+        self._record(vmname, STEP_POWER_ON)
+        return vmname not in self.broken
+
+
+def fake_vm(vmname, disks=0):
+    return {'vmname': vmname, 'template': "template", 'cpucores': 0, 'cpumax': 2, 'memory': 2, 'minMemory': None,
+            'maxMemory': None, 'ips': [], 'disks': [{'size': "2", 'storage': "pool"}] * disks}
+
+
+class ProvisionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp_dir, "setup.xml.state")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_vm_steps(self):
+        vm = {'vmname': "vm1", 'disks': [{'size': "2", 'storage': None}, {'size': "4", 'storage': None}]}
+        self.assertEqual(vm_steps(vm), [STEP_CLONE, STEP_CONFIGURE, "disk:0", "disk:1", STEP_POWER_ON])
+
+    def test_state_resume(self):
+        state = ProvisionState(self.state_file)
+        state.mark_done("192.168.1.10", "vm1", STEP_CLONE)
+        state.mark_done("192.168.1.10", "vm1", STEP_CONFIGURE)
+
+        resumed = ProvisionState(self.state_file)
+        self.assertEqual(resumed.done_steps("192.168.1.10", "vm1"), [STEP_CLONE, STEP_CONFIGURE])
+        self.assertEqual(resumed.done_steps("192.168.1.11", "vm1"), [])
+        resumed.remove()
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_no_state_file(self):
+        state = ProvisionState(None)
+        state.mark_done("192.168.1.10", "vm1", STEP_CLONE)
+        self.assertEqual(state.done_steps("192.168.1.10", "vm1"), [STEP_CLONE])
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+
+class ProvisionExecutorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp_dir, "setup.xml.state")
+        self.origin_virthost = provision.VirtHostDomain
+        provision.VirtHostDomain = FakeVirtHost
+        FakeVirtHost.broken = set()
+        FakeVirtHost.steps = []
+        FakeVirtHost.in_progress = {}
+        FakeVirtHost.max_in_progress = {}
+        FakeVirtHost.opened = FakeVirtHost.closed = 0
+
+    def tearDown(self):
+        provision.VirtHostDomain = self.origin_virthost
+        shutil.rmtree(self.tmp_dir)
+
+    def test_host_workers(self):
+        servers = [{'host': "192.168.1.10", 'user': "root", 'passwd': "", 'vms': [fake_vm("vm%s" % index)
+                                                                               for index in range(4)]},
+                   {'host': "192.168.1.11", 'user': "root", 'passwd': "", 'vms': [fake_vm("vm4"), fake_vm("vm5")]}]
+        executor = ProvisionExecutor(servers, self.state_file, workers=6, host_workers=1)
+        self.assertEqual(executor.run(), {})
+        self.assertEqual(FakeVirtHost.max_in_progress, {"192.168.1.10": 1, "192.168.1.11": 1})
+        # the connects of each VM are closed
+        self.assertEqual(FakeVirtHost.closed, 6)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_failed_step_and_resume(self):
+        servers = [{'host': "192.168.1.10", 'user': "root", 'passwd': "", 'vms': [fake_vm("vm1", disks=1),
+                                                                               fake_vm("vm2")]}]
+        FakeVirtHost.broken = set(["vm1"])
+        self.assertEqual(ProvisionExecutor(servers, self.state_file, workers=2).run(),
+                         {"vm1": ("192.168.1.10", STEP_POWER_ON)})
+        self.assertEqual(ProvisionState(self.state_file).done_steps("192.168.1.10", "vm1"),
+                         [STEP_CLONE, STEP_CONFIGURE, "disk:0"])
+
+        # only the step failed is run again
+        FakeVirtHost.broken = set()
+        FakeVirtHost.steps = []
+        self.assertEqual(ProvisionExecutor(servers, self.state_file, workers=2).run(), {})
+        self.assertEqual(FakeVirtHost.steps, [("vm1", STEP_POWER_ON)])
+        self.assertFalse(os.path.exists(self.state_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: reservation.py
+ Author: longhui
+ Created Time: 2026-10-18 21:02:37
+ Descriptions: a json file of the keys reserved with the time they expire, such as the ips or names chosen for the new
+        vms which are not in cmdb yet. It is read and written under a file lock, so the processes scheduling at the
+        same time do not take the same key.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from lib.Log.log import log
+
+
+class ReservationStore(object):
+    """
+    A json file with content: {"10.0.0.5": 1539830400.0}, a key is reserved until the time
+    """
+
+    def __init__(self, path, ttl):
+        """
+        :param path: the json file
+        :param ttl: default seconds a key is reserved
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as store_file:
+                entries = json.load(store_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _dump(self, entries):
+        """
+        write to a temp file and rename it, so a reader without lock never sees a partial file
+        """
+        store_dir = os.path.dirname(self.path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".reservation", dir=store_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entries, tmp_file)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as error:
+            log.error("Can not write reservations to %s: %s", self.path, error)
+
+    @contextmanager
+    def transaction(self):
+        """
+        hold the lock and yield the keys reserved as {key: expire time}, the expired ones are left out. Change the
+        dict to reserve or release keys, it is saved when the block exits without exception.
+        """
+        store_dir = os.path.dirname(self.path) or "."
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        with self._lock:
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    now = time.time()
+                    loaded = self._load()
+                    entries = dict((key, expire) for key, expire in loaded.items() if expire > now)
+                    yield entries
+                    # changed by the caller, or some keys expired
+                    if entries != loaded:
+                        self._dump(entries)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def active(self):
+        """
+        :return: a set of the keys reserved
+        """
+        with self.transaction() as entries:
+            return set(entries)
+
+    def reserve(self, keys, ttl=None):
+        """
+        :param keys: the keys to reserve, the expire time of a key reserved is extended
+        :param ttl: seconds to reserve, default self.ttl
+        """
+        expire = time.time() + (self.ttl if ttl is None else ttl)
+        with self.transaction() as entries:
+            for key in keys:
+                entries[key] = expire
+
+    def release(self, keys):
+        with self.transaction() as entries:
+            for key in keys:
+                entries.pop(key, None)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: reservation_test.py
+ Author: longhui
+ Created Time: 2026-10-18 21:47:50
+'''
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from lib.Utils.reservation import ReservationStore
+
+
+class ReservationStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "store", "reservations.json")
+        self.store = ReservationStore(self.path, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reserve_and_release(self):
+        self.assertEqual(self.store.active(), set())
+        self.store.reserve(["10.0.0.2", "10.0.0.3"])
+        # shared through the file with other process
+        self.assertEqual(ReservationStore(self.path, ttl=60).active(), set(["10.0.0.2", "10.0.0.3"]))
+        self.store.release(["10.0.0.2"])
+        self.assertEqual(self.store.active(), set(["10.0.0.3"]))
+
+    def test_expire(self):
+        self.store.reserve(["10.0.0.2"], ttl=0.01)
+        self.store.reserve(["10.0.0.3"])
+        time.sleep(0.02)
+        self.assertEqual(self.store.active(), set(["10.0.0.3"]))
+
+    def test_transaction(self):
+        with self.store.transaction() as entries:
+            entries["name1"] = time.time() + 60
+        self.assertEqual(self.store.active(), set(["name1"]))
+        try:
+            with self.store.transaction() as entries:
+                entries["name2"] = time.time() + 60
+                raise ValueError("failed")
+        except ValueError:
+            pass
+        # not saved when failed
+        self.assertEqual(self.store.active(), set(["name1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,21 +6,38 @@
  Created Time: 2019-04-24 16:13:39
 """
 
-import operator
+import fcntl
+import itertools
+import multiprocessing
+import os
 import platform
 import re
 import subprocess
+import time
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 from ipaddress import ip_network
 
 import lib.Db.mysqldb as mysqldb
 from lib.Log.log import log
-from lib.Utils.constans import Libvirtd_Pass, Libvirtd_User, DISK_POOL, MEMORY_OVERCOMMIT_FRACTION
-from lib.Utils.network_utils import is_IP_pingable
-from lib.Utils.signal_utils import TimeoutError
+from lib.Utils.capacity_snapshot import CAPACITY_SNAPSHOT_FILE, load_capacity_snapshot
+from lib.Utils.constans import Libvirtd_Pass, Libvirtd_User, DISK_POOL, DEFAULT_NETWORK, MEMORY_OVERCOMMIT_FRACTION
+from lib.Utils.constans import CPU_OVERCOMMIT_FRACTION, IP_RESERVATION_TTL
+from lib.Utils.constans import SCAN_WORKERS, SCAN_HOST_TIMEOUT
+from lib.Utils.ip_allocator import IPAllocator, get_ip_reservations
+from lib.Utils.name_allocator import get_name_allocator, get_name_index
+from lib.Utils.prober import get_prober
+from lib.Utils.placement import PLACEMENT_CONFIG_KEY, PlacementEngine, explain_ranking
+from lib.Utils.signal_utils import Deadline, TimeoutError
+from lib.Val.connection_pool import get_handler_pool
 from lib.Val.kvm.virt_driver_kvm import QemuVirtDriver
 from lib.Val.kvm.vnet_driver_kvm import QemuVnetDriver
 
+# held while a schedule chooses the resources for new vms
+SCHEDULE_LOCK_FILE = os.getenv("VIRT_SCHEDULE_LOCK",
+                               os.path.join(os.path.dirname(CAPACITY_SNAPSHOT_FILE), "schedule.lock"))
+
 
 def generate_vmname_key(role, cluster):
     """
@@ -60,14 +77,12 @@ def fetch_used_ips_from_db():
     """
     try:
         with mysqldb.MysqlDB() as dbconn:
-            firstIPs = dbconn.get_firt_ip_list()
-            secondIps = dbconn.get_second_ip_list()
-            vips = dbconn.get_vip_list()
+            used_ips = dbconn.get_used_ip_list()
     except TimeoutError:
         log.error("Connect to mysql db timeout.")
         exit(1)
 
-    return firstIPs + secondIps + vips
+    return used_ips
 
 
 def fetch_vm_name_list(key):
@@ -76,7 +91,7 @@ def fetch_vm_name_list(key):
     """
     try:
         with mysqldb.MysqlDB() as dbconn:
-            vmlist = dbconn.get_kvm_vmname_list(key)
+            vmlist = dbconn.get_kvm_vmname_list_by_key(key)
     except TimeoutError:
         log.error("Connect to mysql db timeout.")
         exit(1)
@@ -84,16 +99,14 @@ def fetch_vm_name_list(key):
     return vmlist
 
 
-def find_default_available_ip(server_ip, template_name):
+def get_template_network(server_ip, template_name):
     """
-    use the template's network to find the default ip for new vm
     :param server_ip: host ip
     :param template_name: template name for new vm
-    :return: 
+    :return: the network of the bridge which the template's first vif attached to, as ip_network, None if not found
     """
-
     target_network, target_netmask = None, None
-    vnetDeriver = QemuVnetDriver(server_ip, Libvirtd_User, Libvirtd_Pass)
+    vnetDeriver = QemuVnetDriver(server_ip, Libvirtd_User, Libvirtd_Pass, pool=get_handler_pool())
     if vnetDeriver:
         br_name = vnetDeriver.get_vif_bridge_name(template_name, 0)
         device_info = vnetDeriver.get_bridge_info(bridge_name=br_name)
@@ -106,135 +119,399 @@ def find_default_available_ip(server_ip, template_name):
     if not target_netmask:
         target_netmask = "24"
 
-    ip_address_netmask = ip_network(unicode(target_network + "/" + target_netmask), strict=False)
-    avaiable_hosts = [str(ip) for ip in ip_address_netmask.hosts()]
+    return ip_network(unicode(target_network + "/" + target_netmask), strict=False)
+
+
+def scan_down_ips(ip_address_netmask):
+    """
+    :param ip_address_netmask: the network to scan
+    :return: the ips reported down by nmap, None if the network is not scanned on this platform or nmap failed
+    """
+    if platform.system() != "Linux":
+        return None
+
+    cmd = "nmap -v -sn -n %s -oG - | awk '/Status: Down/{print $2}'" % ip_address_netmask
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+    pout, perr = p.communicate()
+    if perr:
+        log.error("subprocess execute return eror: %s", perr)
+        return None
+    return pout.splitlines()
+
+
+def _ip_checker(network, snapshot=None):
+    """
+    :return: function(ips) to check the candidate ips are free, the ips found down in snapshot, or not replied to
+    the probe
+    """
+    down_ips = snapshot.get_down_ips(network) if snapshot else None
+    if down_ips is not None:
+        down_set = set(down_ips)
+        return lambda ips: [ip for ip in ips if ip in down_set]
+    prober = get_prober()
+    return lambda ips: [ip for ip, alive in prober.probe_many(ips).items() if not alive]
+
+
+def allocate_ips(servers, template_name, snapshot=None):
+    """
+    find an ip for each new vm in the network of the template on its server, the used ips are fetched once and only
+    the candidate ips are probed, the ips found are reserved until they are in cmdb
+    :param servers: the server ip of each new vm
+    :param template_name: template name for new vms
+    :param snapshot: the CapacitySnapshot loaded, None to read from server and probe the candidate ips
+    :return: a list of ip in same order as servers, an item is None if no ip for it
+    """
+    networks = {}
+    for server_ip in set(servers):
+        network = snapshot.get_network(server_ip, template_name) if snapshot else None
+        if not network:
+            if snapshot:
+                log.debug("No network of template %s on %s in capacity snapshot, read it from server.",
+                          template_name, server_ip)
+            ip_address_netmask = get_template_network(server_ip, template_name)
+            network = str(ip_address_netmask) if ip_address_netmask is not None else None
+        networks[server_ip] = network
+    if not any(networks.values()):
+        return [None] * len(servers)
+
     # just to fetch ip info when find default ip
-    used_ips = fetch_used_ips_from_db()
+    used_ips = snapshot.get_used_ips() if snapshot else fetch_used_ips_from_db()
+    # the ips of the vms in same network are allocated and probed at once
+    wanted = {}
+    for server_ip in servers:
+        if networks[server_ip] is not None:
+            wanted[networks[server_ip]] = wanted.get(networks[server_ip], 0) + 1
+    allocated = {}
+    with get_ip_reservations().transaction() as reservations:
+        for network, count in wanted.items():
+            allocator = IPAllocator(network, itertools.chain(used_ips, reservations), _ip_checker(network, snapshot))
+            allocated[network] = allocator.allocate(count)
+            for ip in allocated[network]:
+                reservations[ip] = time.time() + IP_RESERVATION_TTL
+
+    ips = []
+    for server_ip in servers:
+        network = networks[server_ip]
+        if network is None or not allocated[network]:
+            log.warn("Can not find a available ip for new vm on server %s", server_ip)
+            ips.append(None)
+            continue
+        ips.append(allocated[network].pop(0))
+    return ips
 
-    if platform.system() == "Linux":
-        cmd = "nmap -v -sn -n %s -oG - | awk '/Status: Down/{print $2}'" % ip_address_netmask
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        pout, perr = p.communicate()
-        if perr:
-            log.error("subprocess execute return eror: %s", perr)
-            return None
 
-        for ip in pout.splitlines():
-            if (ip not in used_ips) and (ip in avaiable_hosts):
-                return ip
-    elif platform.system() == "Darwin":
-        for ip in avaiable_hosts:
-            if ip in used_ips:
+def find_default_available_ip(server_ip, template_name, snapshot=None):
+    """
+    use the template's network to find the default ip for new vm
+    :param server_ip: host ip
+    :param template_name: template name for new vm
+    :param snapshot: the CapacitySnapshot loaded, None to read from server and scan the network
+    :return: 
+    """
+    return allocate_ips([server_ip], template_name, snapshot)[0]
+
+
+def get_server_info(host):
+    """
+    :param host: server ip
+    :return: [logic-free-mem-without-overCommit, physic-free-mem, logic-free-mem-overCommit, physic-free-disk,
+    logic-free-disk, cpu-cores, logic-free-vcpus-overCommit], None if can not connect to the server; the cpu items are
+    None if the cpu info can not be got, the vcpus are not checked then
+    """
+    info_list = [0, 0, 0, 0, 0, None, None]
+    virtDeriver = QemuVirtDriver(host, Libvirtd_User, Libvirtd_Pass, pool=get_handler_pool())
+    if not virtDeriver:
+        return None
+
+    pysical_mem_info = virtDeriver.get_host_phymem()
+    pysical_total = pysical_mem_info.get("size_total", 0)
+    allocated = virtDeriver.get_all_allocated_resources()
+    logic_allocted = allocated["memory"]
+    info_list[0] = float("%.3f" % (pysical_total - logic_allocted))
+    info_list[1] = pysical_mem_info.get("size_free", 0)
+    info_list[2] = float("%.3f" % (pysical_total * MEMORY_OVERCOMMIT_FRACTION - logic_allocted))
+    info_list[3], info_list[4] = virtDeriver.get_storage_pool_free_size(DISK_POOL)
+    cpu_cores = virtDeriver.get_host_cpu_info().get("cpu_cores", None)
+    if cpu_cores:
+        info_list[5] = cpu_cores
+        info_list[6] = float("%.3f" % (cpu_cores * CPU_OVERCOMMIT_FRACTION - allocated["vcpus"]))
+    return info_list
+
+
+def _call_in_time(func, host, timeout, started):
+    """
+    the connects in func give up when the server is timeout, the timeout is counted from here, not when queued
+    :param started: a dict to record the time the server is started to scan
+    """
+    started[host] = time.time()
+    with Deadline(timeout):
+        return func(host)
+
+
+def scan_servers(hosts, func, workers=SCAN_WORKERS, host_timeout=SCAN_HOST_TIMEOUT, timeout=None):
+    """
+    call func(host) for the servers concurrently, a server which failed or not finished in host_timeout is left out
+    :param hosts: a server list with its item is server ip
+    :param func: function(host), return None if failed
+    :param workers: max number of servers scanned at the same time, 1 to scan one by one
+    :param host_timeout: seconds to wait for each server, counted from its scan starts
+    :param timeout: seconds to wait for all the servers, default enough for each round of workers to use host_timeout
+    :return: a dict with server ip as key, and value is the return of func
+    """
+    results = {}
+    if not hosts:
+        return results
+
+    if workers <= 1:
+        for host in hosts:
+            result = func(host)
+            if result is not None:
+                results[host] = result
+        return results
+
+    start = time.time()
+    pool_size = min(workers, len(hosts))
+    if timeout is None:
+        timeout = host_timeout * ((len(hosts) + pool_size - 1) // pool_size)
+    scan_deadline = start + timeout
+    started = {}
+    thread_pool = ThreadPool(pool_size)
+    try:
+        async_results = [(host, thread_pool.apply_async(_call_in_time, (func, host, host_timeout, started)))
+                         for host in hosts]
+        for host, async_result in async_results:
+            try:
+                while True:
+                    # a server queued behind the others is waited once its scan starts
+                    begin = started.get(host, None)
+                    deadline = scan_deadline if begin is None else min(begin + host_timeout, scan_deadline)
+                    remain = max(deadline - time.time(), 0)
+                    if begin is None and remain > 0:
+                        remain = min(remain, 1)
+                    try:
+                        result = async_result.get(remain)
+                        break
+                    except multiprocessing.TimeoutError:
+                        if begin is not None or time.time() >= scan_deadline:
+                            raise
+            except multiprocessing.TimeoutError:
+                if host in started:
+                    log.warn("Get information from server %s timeout in %s seconds, skip it.", host, host_timeout)
+                else:
+                    log.warn("Server %s is not scanned in %s seconds, skip it.", host, timeout)
                 continue
-            if is_IP_pingable(ip):
+            except Exception as error:
+                log.warn("Get information from server %s failed: %s, skip it.", host, error)
                 continue
-            return ip
-    else:
-        for ip in avaiable_hosts:
-            if ip not in used_ips:
-                return ip
+            if result is not None:
+                results[host] = result
+    finally:
+        # not join, a worker hanging on a dead server should not block the schedule
+        thread_pool.close()
 
-    log.warn("Can not find a available ip for new vm")
-    return None
+    log.debug("Get information from %s/%s servers in %.2f seconds.", len(results), len(hosts), time.time() - start)
+    return results
 
 
-def get_server_infors(hosts):
+def get_server_infors(hosts, workers=SCAN_WORKERS, host_timeout=SCAN_HOST_TIMEOUT):
     """
     logic-free-mem: server-total-phyMem * scale - allocated-to-vm
     logic-free-disk: disk-pool-phySize - allocated-to-vm
+    logic-free-vcpus: server-cpu-cores * cpu-scale - vcpus-of-running-vm
+    The servers are scanned concurrently, a server which failed or not finished in host_timeout is left out
     :param hosts: a server list with its item is server ip
+    :param workers: max number of servers scanned at the same time, 1 to scan one by one
+    :param host_timeout: seconds to wait for each server
     :return: a dict with server ip as key, and value is 
-    [logic-free-mem-without-overCommit, physic-free-mem, logic-free-mem-overCommit, physic-free-disk, logic-free-disk]
+    [logic-free-mem-without-overCommit, physic-free-mem, logic-free-mem-overCommit, physic-free-disk, logic-free-disk,
+     cpu-cores, logic-free-vcpus-overCommit]
     """
-    server_infors = {}
-    for host in hosts:
-        info_list = [0, 0, 0, 0, 0]
-        virtDeriver = QemuVirtDriver(host, Libvirtd_User, Libvirtd_Pass)
-        if not virtDeriver:
-            continue
+    return scan_servers(hosts, get_server_info, workers, host_timeout)
 
-        pysical_mem_info = virtDeriver.get_host_phymem()
-        pysical_total = pysical_mem_info.get("size_total", 0)
-        logic_allocted = virtDeriver.get_all_allocaled_mem()
-        info_list[0] = float("%.3f" % (pysical_total - logic_allocted))
-        info_list[1] = pysical_mem_info.get("size_free", 0)
-        info_list[2] = float("%.3f" % (pysical_total * MEMORY_OVERCOMMIT_FRACTION - logic_allocted))
-        info_list[3], info_list[4] = virtDeriver.get_storage_pool_free_size(DISK_POOL)
-        server_infors[host] = info_list
-
-    return server_infors
-
-
-def find_default_server(hosts, role, config_dict):
-    """
-    :param hosts: server's ip list
-    :return: a default server's Ip
-    """
-    server_infors = get_server_infors(hosts)
-    # each item is tuple (server_ip,  [logicFreeNoOverCommit, physic-free-mem, logic-free-mem, physic-free-disk, logic-free-disk])
-    sorted_servers = sorted(server_infors.iteritems(), key=lambda (k, v): operator.itemgetter(0, 1, 2)(v), reverse=True)
-    for item in sorted_servers:
-        log.debug("%s", item)
-
-    for ip, info in sorted_servers:
-        # find a server's physical memory at least has 10GB free memory to start a new vm,
-        # and logic free memory with over commit fit the logic memory size in new vm,
-        # and the disk pool has at least 100G free 
-        if (info[1] > 10) and (info[2] - config_dict[role]['memory'] > 0) and (info[3] > 100):
-            default_server = ip
-            break
-    else:
-        log.error("No server is available for the new vm, please confirm it.")
-        return None
 
-    log.info("Schedual to server: %s", default_server)
+def collect_capacity_snapshot(config_dict, snapshot, workers=SCAN_WORKERS, host_timeout=SCAN_HOST_TIMEOUT):
+    """
+    read all the servers and scan the networks of the templates once, and write them to the snapshot
+    :param config_dict: the roles config, the network of each template in it is recorded
+    :param snapshot: the CapacitySnapshot to write
+    :return: True or False
+    """
+    hosts = fetch_hosts_info()
+    if not hosts:
+        log.error("Can not get server info from cmdb...")
+        return False
+
+    templates = sorted(set(role["template"] for role in config_dict.values()
+                           if isinstance(role, dict) and "template" in role))
 
-    return default_server
+    def collect_host(host):
+        info_list = get_server_info(host)
+        if info_list is None:
+            return None
+        networks = {}
+        for template_name in templates:
+            network = get_template_network(host, template_name)
+            if network is not None:
+                networks[template_name] = str(network)
+        return {"info": info_list, "networks": networks}
+
+    host_entries = scan_servers(hosts, collect_host, workers, host_timeout)
+    if not host_entries:
+        log.error("Can not get information from any server.")
+        return False
+
+    networks = {}
+    for network in set(cidr for entry in host_entries.values() for cidr in entry["networks"].values()):
+        networks[network] = {"down": scan_down_ips(ip_network(unicode(network)))}
+    used_ips = fetch_used_ips_from_db()
 
+    log.info("Collected %s/%s servers and %s networks.", len(host_entries), len(hosts), len(networks))
+    return snapshot.write(host_entries, networks, used_ips)
 
-def generate_default_vm_name(role, cluster, default_server):
+
+def count_peers(vmlist, hosts):
     """
-    :return: a default vm name
+    the vm name is as "kvm<last number of server ip>-<name key><index>", such as kvm12-sa-k8s-node3
+    :param vmlist: the vm names with same name key
+    :param hosts: server ip list
+    :return: {server ip: the number of vms in vmlist on it}
     """
-    vm_key = generate_vmname_key(role, cluster)
-    vmlist = fetch_vm_name_list(vm_key)
-    nums_list = [1] # default 1 in case of no such vm
-    myreg = re.compile(r'%s([0-9]+)' % vm_key)
+    hosts_by_suffix = dict((str.split(str(host), ".")[-1], host) for host in hosts)
+    myreg = re.compile(r'^kvm([0-9]+)-')
+    peers = {}
     for vm_name in vmlist:
         res = myreg.search(vm_name)
-        if res:
-            nums_list.append(int(res.group(1)))
-    upper = max(nums_list)
-    for i in xrange(1, upper + 1):
-        if i not in nums_list:
-            default_vmname = "".join(["kvm", str.split(default_server, ".")[-1], "-", vm_key, str(i)])
-            break
-    else:
-        default_vmname = "".join(["kvm", str.split(default_server, ".")[-1], "-", vm_key, str(i + 1)])
-
-    return default_vmname
+        if res and res.group(1) in hosts_by_suffix:
+            host = hosts_by_suffix[res.group(1)]
+            peers[host] = peers.get(host, 0) + 1
+    return peers
 
 
-def get_available_vm_info(role, cluster, config_dict):
+def generate_vm_names(role, cluster, servers):
     """
-    return host_ip, new_vm_name and new_ip for a new vm
+    :param servers: the server ip of each new vm
+    :return: a list of new vm names in same order as servers, the names are reserved until they are in cmdb
     """
-    hosts = fetch_hosts_info()
-    if not hosts:
-        log.error("Can not get server info from cmdb...")
-        return None, None, None
+    index = get_name_index(generate_vmname_key(role, cluster), fetch_vm_name_list)
+    return get_name_allocator().allocate(index, servers)
 
-    log.info("Start to calculate default server...")
-    default_server = find_default_server(hosts, role, config_dict)
-    if not default_server:
-        log.error("Failed to find default server.")
-        return None, None, None
 
-    # get the default vm name
-    default_vmname = generate_default_vm_name(role, cluster, default_server)
-    default_ip = find_default_available_ip(default_server, config_dict[role]["template"])
+def generate_default_vm_name(role, cluster, default_server):
+    """
+    :return: a default vm name
+    """
+    return generate_vm_names(role, cluster, [default_server])[0]
+
 
-    return default_server, default_vmname, default_ip
+@contextmanager
+def schedule_lock(path=SCHEDULE_LOCK_FILE):
+    """
+    an exclusive file lock, so the schedules run at the same time do not choose the same server resources, name or ip
+    """
+    lock_dir = os.path.dirname(path) or "."
+    if not os.path.isdir(lock_dir):
+        os.makedirs(lock_dir)
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def plan_vms(role, cluster, config_dict, count=1, refresh=False, explain=False):
+    """
+    gather the servers, vm names and ips once, and assign them to count new vms as one plan
+    :param refresh: True to read from the servers even if there is a capacity snapshot
+    :param explain: True to log the ranking of servers for each vm in info level
+    :return: a list of (host_ip, new_vm_name, new_ip), empty if can not place all the vms
+    """
+    role_config = config_dict[role]
+    memory, vcpus = role_config["memory"], role_config.get("cpu", 0)
+    disk_size = role_config.get("disk_size", 0) * role_config.get("add_disk_num", 0)
+
+    with schedule_lock():
+        snapshot = None if refresh else load_capacity_snapshot()
+        if snapshot:
+            log.info("Use capacity snapshot collected %d seconds ago.", snapshot.age)
+            hosts = snapshot.get_hosts()
+        else:
+            hosts = fetch_hosts_info()
+        if not hosts:
+            log.error("Can not get server info from cmdb...")
+            return []
+
+        log.info("Start to calculate servers for %s new vms...", count)
+        if snapshot:
+            server_infors = snapshot.get_server_infors(hosts)
+        else:
+            server_infors = get_server_infors(hosts)
+
+        name_index = get_name_index(generate_vmname_key(role, cluster), fetch_vm_name_list)
+        try:
+            engine = PlacementEngine(server_infors, config_dict.get(PLACEMENT_CONFIG_KEY, None),
+                                     peers=count_peers(name_index.names, server_infors.keys()))
+        except (KeyError, TypeError, ValueError) as error:
+            log.error("Invalid placement config: %s", error)
+            return []
+
+        logger = log.info if explain else log.debug
+        servers = []
+        for _ in xrange(count):
+            server, ranking = engine.place(memory, disk_size, vcpus)
+            logger("Ranking of servers with policy %s for the new vm %s:", engine.policy_name, len(servers) + 1)
+            explain_ranking(ranking, logger=logger)
+            if not server:
+                log.error("Only %s of %s new vms can be placed, please confirm it.", len(servers), count)
+                return []
+            servers.append(server)
+
+        vm_names = get_name_allocator().allocate(name_index, servers)
+        ips = allocate_ips(servers, role_config["template"], snapshot)
+        if None in ips:
+            log.error("Can not find an ip for each new vm.")
+            get_ip_reservations().release([ip for ip in ips if ip])
+            get_name_allocator().release(name_index, vm_names)
+            return []
+
+        plan = zip(servers, vm_names, ips)
+        if snapshot:
+            snapshot.consume_all([(host, memory, ip, vcpus, disk_size) for host, _, ip in plan])
+
+    for server, vm_name, ip in plan:
+        log.info("Schedual VM [%s] with ip %s to server: %s", vm_name, ip, server)
+    return plan
+
+
+def build_provision_servers(plan, role_config):
+    """
+    :param plan: the return of plan_vms
+    :param role_config: the config of role, as {"cpu": 8, "memory": 16, "template": "k8s-template"}
+    :return: the servers and vms as the return of xml_utils.parse_xml, to run by provision.ProvisionExecutor
+    """
+    memory, cpu_cores = role_config["memory"], role_config["cpu"]
+    disks = [{'storage': DISK_POOL, 'size': role_config.get("disk_size", 0)}] * role_config.get("add_disk_num", 0)
+    servers = {}
+    for host, vm_name, ip in plan:
+        server = servers.setdefault(host, {'host': host, 'user': Libvirtd_User, 'passwd': Libvirtd_Pass, 'vms': []})
+        server['vms'].append({'vmname': vm_name, 'template': role_config["template"], 'cpucores': cpu_cores,
+                              'cpumax': cpu_cores, 'memory': memory, 'minMemory': memory, 'maxMemory': memory,
+                              'ips': [{'vifIndex': "0", 'network': DEFAULT_NETWORK, 'ip': ip, 'netmask': None,
+                                       'device': None, 'bridge': None}],
+                              'disks': [dict(disk) for disk in disks]})
+    return servers.values()
+
+
+def get_available_vm_info(role, cluster, config_dict, refresh=False, explain=False):
+    """
+    return host_ip, new_vm_name and new_ip for a new vm
+    :param refresh: True to read from the servers even if there is a capacity snapshot
+    :param explain: True to log the ranking of servers in info level
+    """
+    plan = plan_vms(role, cluster, config_dict, 1, refresh, explain)
+    if not plan:
+        return None, None, None
+    return plan[0]
 
 
 if __name__ == "__main__":
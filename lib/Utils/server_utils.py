@@ -8,7 +8,8 @@
 '''
 from lib.Db.db_factory import DbFactory
 from lib.Log.log import log
-from lib.Utils.network_utils import IpCheck, is_IP_pingable
+from lib.Utils.network_utils import IpCheck
+from lib.Utils.prober import get_prober
 from lib.Val.virt_factory import VirtFactory
 
 
@@ -29,6 +30,13 @@ class ServerDomain(object):
                 log.error("Can not connect to DB driver.")
             return False
 
+    def close(self):
+        """
+        release the connects to server, the pooled ones are given back to the pool
+        """
+        self.virt_driver.delete_handler()
+        self.vnet_driver.delete_handler()
+
     @property
     def server_name(self):
         """
@@ -255,9 +263,9 @@ class ServerDomain(object):
         if self.check_ip_used(vif_ip):
             log.error("Ip address [%s] already in used.(Check from database).", vif_ip)
             return False
-        # This ping test take a second, put it at last.
-        if is_IP_pingable(vif_ip):
-            log.error("Ipaddress [%s] is already be used(Ping test).", vif_ip)
+        # This probe takes a second when no reply, put it at last.
+        if get_prober().is_alive(vif_ip):
+            log.error("Ipaddress [%s] is already be used(Probe test).", vif_ip)
             return False
 
         return True
@@ -4,10 +4,14 @@
  File Name: signal_utils.py
  Author: longhui
  Created Time: 2018-03-24 22:18:06
+ Descriptions: timeout utils. It used to be signal.alarm, which only works in main thread and can not be nested,
+        now each call is run in its own thread and waited with a deadline, so it can be used in any thread
 """
 
-import signal
 import functools
+import sys
+import threading
+import time
 from lib.Log.log import log
 
 
@@ -15,13 +19,123 @@ class TimeoutError(Exception):
     pass
 
 
-def timeout_handler(signal_num, frame):
+class Deadline(object):
     """
-    :param signal_num:
-    :param frame:
-    :return:
+    A point in time a block of code should finish, used as context manager:
+        with Deadline(10):
+            run_with_timeout(func1, 4)  # wait at most 4 seconds
+            run_with_timeout(func2, 8)  # wait at most the 10 seconds left
+    Deadlines are kept per thread, an inner deadline never expires after the outer one.
+    """
+    _local = threading.local()
+
+    def __init__(self, timeout):
+        """
+        :param timeout: seconds from now
+        """
+        self.timeout = timeout
+        self.expire_at = None
+
+    @classmethod
+    def _stack(cls):
+        if not hasattr(cls._local, "stack"):
+            cls._local.stack = []
+        return cls._local.stack
+
+    @classmethod
+    def current(cls):
+        """
+        :return: the innermost deadline of current thread, None if no deadline
+        """
+        stack = cls._stack()
+        return stack[-1] if stack else None
+
+    @classmethod
+    def clip(cls, timeout):
+        """
+        :return: the timeout shortened to the seconds left of current deadline
+        """
+        deadline = cls.current()
+        if deadline is None:
+            return timeout
+        return min(timeout, deadline.remaining())
+
+    def remaining(self):
+        """
+        :return: seconds left, 0 when expired
+        """
+        if self.expire_at is None:
+            return self.timeout
+        return max(self.expire_at - time.time(), 0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def __enter__(self):
+        expire_at = time.time() + self.timeout
+        outer = self.current()
+        if outer is not None:
+            expire_at = min(expire_at, outer.expire_at)
+        self.expire_at = expire_at
+        self._stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        stack = self._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        return False
+
+
+def run_with_timeout(func, timeout, args=(), kwargs=None, on_abandon=None):
+    """
+    run func in a daemon thread and wait for it at most timeout seconds, or less if current deadline is earlier.
+    A python thread can not be killed, so a timeout call is abandoned and goes on in background.
+    :param func: the function to call
+    :param timeout: seconds to wait
+    :param on_abandon: function(result), called with the result when an abandoned call finally returns, such as to
+                       close a connection nobody will use
+    :return: the return of func, the exception raised by func is raised again
+    :raise TimeoutError: when func not returns in time
     """
-    raise TimeoutError("Timeout signal raised.")
+    kwargs = kwargs or {}
+    timeout = Deadline.clip(timeout)
+    if timeout <= 0:
+        raise TimeoutError("Deadline exceeded before calling %s." % getattr(func, "__name__", func))
+
+    lock = threading.Lock()
+    state = {"done": False, "abandoned": False, "result": None, "exc_info": None}
+
+    def runner():
+        # the calls inside func are bounded by the same timeout
+        with Deadline(timeout):
+            try:
+                state["result"] = func(*args, **kwargs)
+            except BaseException:
+                state["exc_info"] = sys.exc_info()
+        with lock:
+            state["done"] = True
+            abandoned = state["abandoned"]
+        if abandoned and on_abandon is not None and state["exc_info"] is None:
+            try:
+                on_abandon(state["result"])
+            except Exception as error:
+                log.debug("Exception when clean up the abandoned call: %s", error)
+
+    worker = threading.Thread(target=runner, name="timeout-%s" % getattr(func, "__name__", "call"))
+    worker.daemon = True
+    worker.start()
+    worker.join(timeout)
+
+    with lock:
+        if not state["done"]:
+            state["abandoned"] = True
+            raise TimeoutError("Call %s timeout in %.1f seconds." % (getattr(func, "__name__", func), timeout))
+
+    if state["exc_info"] is not None:
+        exc_type, exc_value, exc_tb = state["exc_info"]
+        raise exc_type, exc_value, exc_tb
+    return state["result"]
 
 
 def timeout_func(func, timeout_duration=1, default_ret=None, *args, **kwargs):
@@ -33,17 +147,10 @@ def timeout_func(func, timeout_duration=1, default_ret=None, *args, **kwargs):
     :param kwargs:
     :return:
     """
-
-    # set the timeout handler
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout_duration)
     try:
-        result = func(*args, **kwargs)
+        result = run_with_timeout(func, timeout_duration, args, kwargs)
     except TimeoutError as exc:
         result = default_ret
-    finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, signal.SIG_DFL)
 
     return result
 
@@ -52,30 +159,43 @@ def timeout_decrator(time_wait=3, default_ret=None):
     def decrator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            old = signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(time_wait)
             try:
-                return func(*args, **kwargs)
+                return run_with_timeout(func, time_wait, args, kwargs)
             except TimeoutError as error:
                 log.warn(error)
                 return default_ret
-            finally:
-                signal.alarm(0)
-                signal.signal(signal.SIGALRM, old)
         return wrapper
     return decrator
 
 
+def wait_until(predicate, timeout, interval=0.1, max_interval=2.0):
+    """
+    poll predicate until it returns True, the interval is doubled after each poll up to max_interval, so a quick
+    change is noticed soon and a slow one is not polled too often
+    :param predicate: function without params
+    :param timeout: seconds to wait, or less if current deadline is earlier
+    :return: True if predicate returns True in time, else False
+    """
+    expire_at = time.time() + Deadline.clip(timeout)
+    while True:
+        if predicate():
+            return True
+        remaining = expire_at - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
 @timeout_decrator()
 def detest_wrapper(timeout=1):
     print("In test wrapper..")
     print("name:%s" % detest_wrapper.__name__)
-    import time
     time.sleep(timeout)
     return True
 
 
 if __name__ == "__main__":
-    for time in [1, 2, 3, 4]:
-        res = detest_wrapper(time)
-        print "time=%s, value=%s"  % (time, res)
+    for wait in [1, 2, 3, 4]:
+        res = detest_wrapper(wait)
+        print "time=%s, value=%s"  % (wait, res)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: signal_utils_test.py
+ Author: longhui
+ Created Time: 2026-10-18 11:40:12
+'''
+import threading
+import time
+import unittest
+from lib.Utils.signal_utils import Deadline, TimeoutError, run_with_timeout, timeout_decrator, timeout_func, wait_until
+
+
+class SignalUtilsTestCase(unittest.TestCase):
+
+    def test_return_and_raise(self):
+        self.assertEqual(run_with_timeout(lambda x, y: x + y, 1, (1, 2)), 3)
+        self.assertRaises(ValueError, run_with_timeout, int, 1, ("a",))
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertRaises(TimeoutError, run_with_timeout, time.sleep, 0.1, (1,))
+        self.assertLess(time.time() - start, 0.5)
+        self.assertIsNone(timeout_func(time.sleep, 0.1, None, 1))
+
+    def test_abandon_callback(self):
+        abandoned = threading.Event()
+
+        def slow():
+            time.sleep(0.2)
+            return "conn"
+
+        self.assertRaises(TimeoutError, run_with_timeout, slow, 0.05, on_abandon=lambda result: abandoned.set())
+        self.assertTrue(abandoned.wait(2))
+
+    def test_nested_deadline(self):
+        with Deadline(0.1) as outer:
+            with Deadline(10) as inner:
+                self.assertEqual(inner.expire_at, outer.expire_at)
+                start = time.time()
+                self.assertRaises(TimeoutError, run_with_timeout, time.sleep, 5, (1,))
+                self.assertLess(time.time() - start, 0.5)
+            self.assertIs(Deadline.current(), outer)
+        self.assertIsNone(Deadline.current())
+
+    def test_in_worker_thread(self):
+        @timeout_decrator(0.1, default_ret="timeout")
+        def sleep_for(seconds):
+            time.sleep(seconds)
+            return "done"
+
+        results = []
+        threads = [threading.Thread(target=lambda s=s: results.append(sleep_for(s))) for s in (0, 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), ["done", "timeout"])
+
+    def test_wait_until(self):
+        polls = []
+
+        def ready():
+            polls.append(time.time())
+            return len(polls) == 4
+
+        self.assertTrue(wait_until(ready, 5, interval=0.01))
+        # the interval is doubled after each poll
+        self.assertGreater(polls[3] - polls[2], polls[2] - polls[1])
+
+        start = time.time()
+        self.assertFalse(wait_until(lambda: False, 0.1, interval=0.01))
+        self.assertLess(time.time() - start, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,16 +9,25 @@
 """
 
 import os
+from multiprocessing.pool import ThreadPool
+
 from lib.Db.db_factory import DbFactory
+from lib.Db.sync_state import compared_fields, get_sync_state, normalize_value
 from lib.Log.log import log
+from lib.Utils.constans import BULK_POWER_RATE, BULK_POWER_WORKERS, DB_SYNC_WORKERS
+from lib.Utils.lifecycle import run_lifecycle, POWER_OFF, POWER_ON, REBOOT
 from lib.Utils.server_utils import ServerDomain
 from lib.Val.virt_factory import VirtFactory, VM_MAC_PREFIX
 
 
 class VirtHostDomain(ServerDomain):
-    def __init__(self, host_name=None, user="root", passwd=""):
-        self.virt_driver = VirtFactory.get_virt_driver(host_name, user, passwd)
-        self.vnet_driver = VirtFactory.get_vnet_driver(host_name, user, passwd)
+    def __init__(self, host_name=None, user="root", passwd="", pooled=True):
+        """
+        :param pooled: share the connections to host with others, set False when used in a thread and the handler is
+                       not thread safe
+        """
+        self.virt_driver = VirtFactory.get_virt_driver(host_name, user, passwd, pooled=pooled)
+        self.vnet_driver = VirtFactory.get_vnet_driver(host_name, user, passwd, pooled=pooled)
         self.db_driver = DbFactory.get_db_driver("VirtHost")
 
     def create_vm(self, new_vm_name, template_name, target_pool=None):
@@ -313,6 +322,32 @@ class VirtHostDomain(ServerDomain):
 
         return ret
 
+    def bulk_power_on(self, vm_names, workers=BULK_POWER_WORKERS, rate=BULK_POWER_RATE):
+        """
+        power on VMs concurrently and update their power status to database in one pass at the end
+        :param vm_names: list of VM names
+        :param workers: max number of VMs powered on at the same time
+        :param rate: max VMs started per second on this host
+        :return: LifecycleReport
+        """
+        report = run_lifecycle(self.virt_driver, POWER_ON, vm_names, workers=workers, rate=rate)
+        self.update_power_states_to_database(report.succeeded, power_state="ON")
+        return report
+
+    def bulk_power_off(self, vm_names, workers=BULK_POWER_WORKERS, rate=BULK_POWER_RATE):
+        """
+        :return: LifecycleReport
+        """
+        report = run_lifecycle(self.virt_driver, POWER_OFF, vm_names, workers=workers, rate=rate)
+        self.update_power_states_to_database(report.succeeded, power_state="OFF")
+        return report
+
+    def bulk_reset(self, vm_names, workers=BULK_POWER_WORKERS, rate=BULK_POWER_RATE):
+        """
+        :return: LifecycleReport
+        """
+        return run_lifecycle(self.virt_driver, REBOOT, vm_names, workers=workers, rate=rate)
+
     def add_vm_disk(self, inst_name, storage_name, size):
         """
         :param inst_name: VM name
@@ -412,14 +447,16 @@ class VirtHostDomain(ServerDomain):
         log.info("VM OS informations:")
         log.info("OS type: %s", self.virt_driver.get_os_type(inst_name, short_name=False))
 
-    def create_database_info(self, inst_name):
+    def create_database_info(self, inst_name, vm_record=None):
         """
         :param inst_name: VM name
+        :param vm_record: the record from virt_driver.get_all_vm_records, fetched from virt_driver if None
         :return:
         """
         log.info("Start to create [%s] information to databse.", inst_name)
 
-        vm_record = self.virt_driver.get_vm_record(inst_name=inst_name)
+        if vm_record is None:
+            vm_record = self.virt_driver.get_vm_record(inst_name=inst_name)
         if not vm_record:
             return False
 
@@ -433,19 +470,19 @@ class VirtHostDomain(ServerDomain):
         cpu_cores = vm_record['VCPUs_live']
         memory_size = vm_record['memory_target']
 
-        disk_info = self.virt_driver.get_all_disk(inst_name=inst_name)
+        disk_info = vm_record.get('disk_info', None)
+        if disk_info is None:
+            disk_info = self.virt_driver.get_all_disk(inst_name=inst_name)
         disk_num = len(disk_info)
         # disk_size = self.virt_driver.get_disk_size(inst_name, 0)  # only write the system disk size when create
         disk_size = disk_info.get(0, {}).get('disk_size', 0)  # device_num with 0 default to be system disk
 
-        vm_host_ip = self.vnet_driver.get_host_manage_interface_infor().get('IP', None)
-        # KVM platform cat not get host ip, get it from virt_driver.hostname
-        if not vm_host_ip:
-            vm_host_ip = self.virt_driver.hostname
+        vm_host_ip = self.get_host_ip()
 
         ret = self.db_driver.create(hostname, sn, cpu_cores, int(memory_size), int(disk_size), disk_num,
                                     vm_host_ip=vm_host_ip)
         if ret:
+            get_sync_state().forget(sn)
             log.info("Create record to database successfully.")
         else:
             log.error("Create record to database failed.")
@@ -462,23 +499,22 @@ class VirtHostDomain(ServerDomain):
 
         return self.db_driver.delete(hostname=inst_name)
 
-    def update_database_info(self, inst_name):
+    def get_host_ip(self):
         """
-        This function is used to sync VM information when config changed, include:cpu_cores, memory_size, disk_num
-        :param inst_name:
-        :return:
+        :return: the manage ip of host server
         """
-        log.info("Start to update [%s] information to databse.", inst_name)
-
-        vm_record = self.virt_driver.get_vm_record(inst_name=inst_name)
-        if not vm_record:
-            return False
-
-        sn = vm_record['uuid']
-        if not self.db_driver.query(sn=sn):
-            log.info("No record found with given VM:[%s], don't update database", inst_name)
-            return True
+        vm_host_ip = self.vnet_driver.get_host_manage_interface_infor().get('IP', None)
+        # KVM platform cat not get host ip, get it from virt_driver.hostname
+        if not vm_host_ip:
+            vm_host_ip = self.virt_driver.hostname
+        return vm_host_ip
 
+    def get_sync_data(self, inst_name, vm_record, vm_host_ip=None):
+        """
+        :param vm_record: the record from virt_driver.get_vm_record or get_all_vm_records
+        :param vm_host_ip: the manage ip of host, looked up if None
+        :return: the VM information to sync to database, without comment
+        """
         cpu_cores = vm_record['VCPUs_live']
         memory_size = vm_record['memory_target']
         if vm_record['running']:
@@ -488,7 +524,9 @@ class VirtHostDomain(ServerDomain):
         else:
             power_state = "unknown"
 
-        disk_info = self.virt_driver.get_all_disk(inst_name=inst_name)
+        disk_info = vm_record.get('disk_info', None)
+        if disk_info is None:
+            disk_info = self.virt_driver.get_all_disk(inst_name=inst_name)
         disk_size, disk_num, disk_free = 0, 0, 0
         for disk in disk_info:
             size = disk_info[disk]['disk_size']  # self.virt_driver.get_disk_size(inst_name, disk)
@@ -511,24 +549,52 @@ class VirtHostDomain(ServerDomain):
         # second_ip = vif_dic.get('1', {}).get('ip', None)
         if os.getenv("PLATFORM", "Xen") == "Xen":
             first_ip = None
-        vm_host_ip = self.vnet_driver.get_host_manage_interface_infor().get('IP', None)
         if not vm_host_ip:
-            vm_host_ip = self.virt_driver.hostname
+            vm_host_ip = self.get_host_ip()
 
         os_info = self.virt_driver.get_os_type(inst_name, short_name=False)
 
-        sync_data = {"cpu_cores": cpu_cores,
-                     "memory_size": int(memory_size),
-                     "disk_num": int(disk_num),
-                     "disk_size": int(disk_size),
-                     "disk_free": int(disk_free) if disk_free else None,
-                     "first_ip": first_ip,
-                     # "second_ip": second_ip,
-                     "vm_host_ip": vm_host_ip,
-                     "os_info": os_info,
-                     "power_state": power_state,
-                     "hostname": inst_name
-                     }
+        return {"cpu_cores": cpu_cores,
+                "memory_size": int(memory_size),
+                "disk_num": int(disk_num),
+                "disk_size": int(disk_size),
+                "disk_free": int(disk_free) if disk_free else None,
+                "first_ip": first_ip,
+                # "second_ip": second_ip,
+                "vm_host_ip": vm_host_ip,
+                "os_info": os_info,
+                "power_state": power_state,
+                "hostname": inst_name
+                }
+
+    def update_database_info(self, inst_name, vm_record=None):
+        """
+        This function is used to sync VM information when config changed, include:cpu_cores, memory_size, disk_num
+        :param inst_name:
+        :param vm_record: the record from virt_driver.get_all_vm_records, fetched from virt_driver if None
+        :return:
+        """
+        log.info("Start to update [%s] information to databse.", inst_name)
+
+        if vm_record is None:
+            vm_record = self.virt_driver.get_vm_record(inst_name=inst_name)
+        if not vm_record:
+            return False
+
+        sn = vm_record['uuid']
+        sync_state = get_sync_state()
+        sync_data = self.get_sync_data(inst_name, vm_record)
+        total = len(compared_fields(sync_data))
+        sync_data = sync_state.changed_fields(sn, sync_data, count=False)
+        if not sync_data:
+            sync_state.count(0, total)
+            log.info("VM [%s] information not changed since last sync, don't update database", inst_name)
+            return True
+        # the VM not in database is neither written nor skipped
+        if not self.db_driver.query(sn=sn):
+            log.info("No record found with given VM:[%s], don't update database", inst_name)
+            return True
+
         comment = "Update VM by virtualization API with data: %s" % sync_data
         sync_data['comment'] = comment
         try:
@@ -536,11 +602,129 @@ class VirtHostDomain(ServerDomain):
         except Exception as error:
             log.debug("Exception raise when update vm database: %s", error)
             ret = False
-        if not ret:
+        if ret:
+            sync_state.commit(sn, sync_data)
+            sync_state.count(len(compared_fields(sync_data)), total)
+        else:
             log.warn("Update database information with ret: [%s], data: %s", ret, sync_data['comment'])
 
         return ret
 
+    def update_changed_fields(self, sn, data=None, json_data=None):
+        """
+        update the fields changed since last sync to the record with sn, the others are not sent
+        :param data: Dict data
+        :param json_data: Dict data, the None values are set to null
+        :return: True or False
+        """
+        sync_state = get_sync_state()
+        total = len(compared_fields(data if data is not None else json_data))
+        changed = sync_state.changed_fields(sn, data if data is not None else json_data, count=False)
+        if not changed:
+            sync_state.count(0, total)
+            log.debug("Fields %s of [%s] not changed since last sync, skip update.", sorted(data or json_data), sn)
+            return True
+
+        if data is not None:
+            ret = self.db_driver.update(sn=sn, data=changed)
+        else:
+            ret = self.db_driver.update(sn=sn, json_data=changed)
+        if ret:
+            sync_state.commit(sn, changed)
+            sync_state.count(len(compared_fields(changed)), total)
+        return ret
+
+    def sync_database_info(self, workers=DB_SYNC_WORKERS):
+        """
+        sync all the VMs on host to database: the VMs are read from one get_all_vm_records call and the records are
+        queried by vm_host_ip page by page, only the records changed are updated, at most workers at the same time.
+        All the fields are sent when the sync state is force_full.
+        :return: the list of VM names failed to update
+        """
+        all_records = self.virt_driver.get_all_vm_records()
+        if not all_records:
+            return []
+        vm_host_ip = self.get_host_ip()
+
+        sync_state = get_sync_state()
+        records_by_sn = self.query_records([vm_record['uuid'] for vm_record in all_records.values()], vm_host_ip)
+
+        changes = []
+        for inst_name in sorted(all_records):
+            vm_record = all_records[inst_name]
+            sn = vm_record['uuid']
+            record = records_by_sn.get(sn, None)
+            if record is None:
+                log.info("No record found with given VM:[%s], don't update database", inst_name)
+                continue
+
+            sync_data = self.get_sync_data(inst_name, vm_record, vm_host_ip=vm_host_ip)
+            if sync_state.force_full:
+                changed = dict(sync_data)
+            else:
+                changed = dict((key, value) for key, value in sync_data.items()
+                               if normalize_value(value) != normalize_value(record.get(key, None)))
+            if not changed:
+                log.debug("Record of VM [%s] is up to date.", inst_name)
+                sync_state.count(0, len(sync_data))
+                sync_state.commit(sn, sync_data)
+                continue
+            changed['comment'] = "Update VM by virtualization API with data: %s" % changed
+            changes.append((inst_name, sn, record, changed, sync_data))
+
+        log.info("%s of %s VMs on host changed, update them to database.", len(changes), len(all_records))
+        failed = self._update_records(changes, workers)
+        for inst_name in failed:
+            log.warn("Update database information of VM [%s] failed.", inst_name)
+        return failed
+
+    def query_records(self, sns, vm_host_ip=None):
+        """
+        :param sns: the uuids of VMs on host
+        :param vm_host_ip: the manage ip of host, looked up if None
+        :return: {sn: record} of the sns found, the records of host are read page by page and the others by sn
+        """
+        if not vm_host_ip:
+            vm_host_ip = self.get_host_ip()
+        records_by_sn = dict(self.db_driver.query_by_host(vm_host_ip).by_sn)
+        # the VMs moved from another host still have the old vm_host_ip in database, and the VMs never registered are
+        # not there at all, query them one by one instead of reading the whole table for them
+        missing = [sn for sn in sns if sn not in records_by_sn]
+        if missing:
+            records_by_sn.update(self.db_driver.query_each(missing))
+        return records_by_sn
+
+    def _update_records(self, changes, workers=DB_SYNC_WORKERS):
+        """
+        :param changes: a list of (inst_name, sn, record, data to send, data to commit to sync state when success)
+        :return: the list of VM names failed to update
+        """
+        if not changes:
+            return []
+        sync_state = get_sync_state()
+
+        def worker(change):
+            inst_name, sn, record, changed, sync_data = change
+            try:
+                ret = self.db_driver.update_record(record, data=changed)
+            except Exception as error:
+                log.debug("Exception raise when update vm [%s] database: %s", inst_name, error)
+                return False
+            if ret:
+                # the fields not sent are same as database too
+                sync_state.commit(sn, sync_data)
+                sync_state.count(len(compared_fields(changed)), len(compared_fields(sync_data)))
+            return ret
+
+        thread_pool = ThreadPool(max(min(workers, len(changes)), 1))
+        try:
+            results = thread_pool.map(worker, changes)
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+
+        return [change[0] for change, ret in zip(changes, results) if not ret]
+
     def update_ip_infor_to_database(self, inst_name, vif_index=None, ip=None, host_ip=None):
         """
         As the IP for xenserver'VM is not accessable when it is down, so update it with user's input
@@ -572,7 +756,7 @@ class VirtHostDomain(ServerDomain):
 
         try:
             #  json_data = json.dumps(sync_data)
-            ret = self.db_driver.update(sn=sn, data=sync_data)  # use sn in case of the same hostname in DB
+            ret = self.update_changed_fields(sn, data=sync_data)  # use sn in case of the same hostname in DB
         except Exception as error:
             log.exception("update IP information raise error: %s", error)
             ret = False
@@ -605,7 +789,7 @@ class VirtHostDomain(ServerDomain):
         sn = vm_record['uuid']
 
         try:
-            ret = self.db_driver.update(sn=sn, json_data=sync_data)  # use sn in case of the same hostname in DB
+            ret = self.update_changed_fields(sn, json_data=sync_data)  # use sn in case of the same hostname in DB
         except Exception as error:
             log.warn("Delete ip information raise error: %s", error)
             ret = False
@@ -627,7 +811,7 @@ class VirtHostDomain(ServerDomain):
         memory_size = vm_record['memory_target']
         sn = vm_record['uuid']
 
-        return self.db_driver.update(sn=sn, data={"memory_size": int(memory_size)})
+        return self.update_changed_fields(sn, data={"memory_size": int(memory_size)})
 
     def update_vcpu_to_database(self, inst_name):
         """
@@ -642,7 +826,7 @@ class VirtHostDomain(ServerDomain):
         cpu_cores = vm_record['VCPUs_live']
         sn = vm_record['uuid']
 
-        return self.db_driver.update(sn=sn, data={"cpu_cores": cpu_cores})
+        return self.update_changed_fields(sn, data={"cpu_cores": cpu_cores})
 
     def update_power_status_to_database(self, inst_name, power_state="ON"):
         """
@@ -660,7 +844,52 @@ class VirtHostDomain(ServerDomain):
         else:
             sync_data = {"power_state": "unknown"}
 
-        return self.db_driver.update(sn=sn, data=sync_data)
+        return self.update_changed_fields(sn, data=sync_data)
+
+    def update_power_states_to_database(self, inst_names, power_state="ON", workers=DB_SYNC_WORKERS):
+        """
+        update the power status of many VMs, their uuids are got from one get_all_vm_records call, the records are
+        queried once and updated at most workers at the same time
+        :param inst_names: list of instance names
+        :return: the list of instance names failed to update
+        """
+        if not inst_names:
+            return []
+        log.info("Update power status of %s VMs to database.", len(inst_names))
+
+        all_records = self.virt_driver.get_all_vm_records()
+        failed = []
+        sns = {}
+        for inst_name in inst_names:
+            vm_record = all_records.get(inst_name, None) or self.virt_driver.get_vm_record(inst_name=inst_name)
+            if vm_record:
+                sns[inst_name] = vm_record['uuid']
+            else:
+                failed.append(inst_name)
+
+        sync_state = get_sync_state()
+        records_by_sn = self.query_records(sns.values()) if sns else {}
+        changes = []
+        for inst_name in inst_names:
+            if inst_name not in sns:
+                continue
+            sn = sns[inst_name]
+            record = records_by_sn.get(sn, None)
+            if record is None:
+                log.info("No record found with given VM:[%s], don't update database", inst_name)
+                failed.append(inst_name)
+                continue
+            data = {"power_state": power_state}
+            changed = sync_state.changed_fields(sn, data, count=False)
+            if changed:
+                changes.append((inst_name, sn, record, changed, data))
+            else:
+                sync_state.count(0, len(data))
+        failed.extend(self._update_records(changes, workers))
+
+        if failed:
+            log.warn("Failed to update power status of VMs %s to database.", failed)
+        return failed
 
 
 if __name__ == "__main__":
@@ -8,23 +8,31 @@
 # Created Time: 2018-02-08 11:34:12
 #########################################################################
 
-import signal
 import time
 
 from lib.Log.log import log
+from lib.Utils.constans import HYPERVISOR_CONNECT_TIMEOUT, POWER_STATE_TIMEOUT
+from lib.Utils.signal_utils import Deadline, run_with_timeout, wait_until
 from lib.Val.Xen import XenAPI
+from lib.Val.Xen import xen_records
+from lib.Val.inventory_cache import cached_inventory, invalidates_inventory, STORAGES, TEMPLATES, VM_LIST
+from lib.Val.transport_cache import connect_by_transports
 from lib.Val.virt_driver import VirtDriver
 
 
 API_VERSION_1_1 = '1.1'
+# transports in default trying order
+XEN_TRANSPORTS = ["http", "https"]
 
 
 class XenVirtDriver(VirtDriver):
     '''
     '''
 
-    def __init__(self, hostname=None, user="root", passwd=""):
-        VirtDriver.__init__(self, hostname, user, passwd)
+    platform = "Xen"
+
+    def __init__(self, hostname=None, user="root", passwd="", pool=None):
+        VirtDriver.__init__(self, hostname, user, passwd, pool)
 
         self._hypervisor_handler = self.get_handler()
 
@@ -32,45 +40,58 @@ class XenVirtDriver(VirtDriver):
         try:
             if self._hypervisor_handler is not None:
                 log.debug("Release handler in virt driver, ID:%s", id(self._hypervisor_handler))
-                self._hypervisor_handler.xenapi.session.logout()
-                self._hypervisor_handler = None
+                self._release_handler()
         except Exception as error:
             log.debug(error)
 
-    def get_handler(self):
-        '''
-        return the handler of the virt_driver
-        '''
-        if self._hypervisor_handler is not None:
-            return self._hypervisor_handler
+    @staticmethod
+    def _is_handler_alive(handler):
+        # any cheap call will fail if the session has expired on server
+        handler.xenapi.session.get_this_host(handler.handle)
+        return True
 
-        if self.hostname is None:
-            self._hypervisor_handler = XenAPI.xapi_local()  # no __nonzero__, can not use if/not for bool test
-        else:
-            log.debug("connecting to %s with user:%s,passwd:%s", "http://" + str(self.hostname), self.user, self.passwd)
-            self._hypervisor_handler = XenAPI.Session("http://" + str(self.hostname))
+    @staticmethod
+    def _close_handler(handler):
+        handler.xenapi.session.logout()
 
-        old = signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(4)  # connetctions timeout set to 4 secs
-        try:
-            self._hypervisor_handler.xenapi.login_with_password(self.user, self.passwd, API_VERSION_1_1,
-                                                                'XenVirtDriver')
-        except Exception as error:
-            log.warn("Exception raised: %s when get handler.", error)
-            log.info("Retry connecting to :%s", "https://" + str(self.hostname))
-            self._hypervisor_handler = XenAPI.Session("https://" + str(self.hostname))
+    def _login(self, scheme):
+        """
+        :param scheme: http or https
+        """
+        url = "%s://%s" % (scheme, self.hostname)
+        log.debug("connecting to %s with user:%s,passwd:%s", url, self.user, self.passwd)
+        handler = XenAPI.Session(url)
+        run_with_timeout(handler.xenapi.login_with_password, HYPERVISOR_CONNECT_TIMEOUT,
+                         (self.user, self.passwd, API_VERSION_1_1, 'XenVirtDriver'),
+                         on_abandon=lambda result: self._close_handler(handler))
+        return handler
 
-            signal.alarm(4)
+    def _connect(self):
+        """
+        login to Xenserver, try the transport last succeed first, default http and then https
+        :return: the session or None
+        """
+        if self.hostname is None:
+            handler = XenAPI.xapi_local()  # no __nonzero__, can not use if/not for bool test
             try:
-                self._hypervisor_handler.xenapi.login_with_password(self.user, self.passwd, API_VERSION_1_1,
-                                                                    'XenVirtDriver')
+                run_with_timeout(handler.xenapi.login_with_password, HYPERVISOR_CONNECT_TIMEOUT,
+                                 (self.user, self.passwd, API_VERSION_1_1, 'XenVirtDriver'),
+                                 on_abandon=lambda result: self._close_handler(handler))
             except Exception as errors:
                 log.exception("Exception errors:%s when get handler", errors)
                 return None
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old)
+            return handler
 
+        return connect_by_transports(self.platform, self.hostname, XEN_TRANSPORTS, self._login)
+
+    def get_handler(self):
+        '''
+        return the handler of the virt_driver
+        '''
+        if self._hypervisor_handler is not None:
+            return self._hypervisor_handler
+
+        self._hypervisor_handler = self._acquire_handler()
         log.debug("Get handler in virt driver, ID:%s", id(self._hypervisor_handler))
         return self._hypervisor_handler
 
@@ -81,11 +102,11 @@ class XenVirtDriver(VirtDriver):
         try:
             if self._hypervisor_handler is not None:
                 log.debug("Release handler manually in virt driver, ID:%s", id(self._hypervisor_handler))
-                self._hypervisor_handler.xenapi.session.logout()
-                self._hypervisor_handler = None
+                self._release_handler()
         except Exception as error:
             log.debug(error)
 
+    @cached_inventory(VM_LIST)
     def get_vm_list(self):
         """
         Return the VMs from system
@@ -102,6 +123,7 @@ class XenVirtDriver(VirtDriver):
             log.error("Cann't get handler while get all vm list.")
             return []
 
+    @cached_inventory(TEMPLATES)
     def get_templates_list(self):
         '''
         return all templates ref list
@@ -121,37 +143,68 @@ class XenVirtDriver(VirtDriver):
         @note Object name_label fields are not guaranteed to be unique and so the get_by_name_label
         API call returns a set of references rather than a single reference.
         '''
+        # the VM list is cached in a short time, so checking VMs in loop will not pull all the records every time
         return inst_name in self.get_vm_list()
 
+    def _get_power_state(self, inst_name):
+        """
+        :return: the power state of the VM instance, None if it doesn't exist
+        """
+        handler = self.get_handler()
+        _, record = xen_records.get_vm_by_name(handler, inst_name)
+        if not record or not xen_records.is_vm_instance(record):
+            log.error("Instance with name %s doesn't exist.", inst_name)
+            return None
+        return record['power_state']
+
     def is_instance_running(self, inst_name):
         '''
         VM states including:Halted, Paused, Running, Suspended
         '''
-        if not self.is_instance_exists(inst_name):
-            log.error("Instance with name %s doesn't exist.", inst_name)
-            return False
-
-        handler = self.get_handler()
-        vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        record = handler.xenapi.VM.get_record(vm_ref)
-
-        return record['power_state'] == 'Running'
+        return self._get_power_state(inst_name) == 'Running'
 
     def is_instance_halted(self, inst_name):
         """
         VM is offline and not using any resources
         """
-        if not self.is_instance_exists(inst_name):
-            log.error("Instance with name %s doesn't exist.", inst_name)
-            return False
+        return self._get_power_state(inst_name) == 'Halted'
 
+    def wait_for_state(self, inst_name, states, timeout=POWER_STATE_TIMEOUT):
+        """
+        wait on event.from for the changes of the VM, poll the power state when event.from is not supported
+        """
         handler = self.get_handler()
-        vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        record = handler.xenapi.VM.get_record(vm_ref)
+        vm_ref, record = xen_records.get_vm_by_name(handler, inst_name)
+        if vm_ref is None:
+            log.error("Instance with name %s doesn't exist.", inst_name)
+            return False
+        if record['power_state'] in states:
+            return True
 
-        return record['power_state'] == 'Halted'
+        expire_at = time.time() + Deadline.clip(timeout)
+        # the token from the first call skips the changes already returned
+        token = ""
+        try:
+            # 'from' is a keyword in python
+            event_from = getattr(handler.xenapi.event, 'from')
+            while True:
+                remaining = expire_at - time.time()
+                if remaining <= 0:
+                    return False
+                result = event_from(["VM/%s" % vm_ref], token, float(remaining))
+                token = result['token']
+                for event in result['events']:
+                    if event['operation'] == 'del':
+                        log.error("Instance %s is deleted when waiting for its power state.", inst_name)
+                        return False
+                    if event.get('snapshot', {}).get('power_state', None) in states:
+                        return True
+        except Exception as error:
+            log.debug("Can not wait on event.from, poll the power state: %s", error)
+            return VirtDriver.wait_for_state(self, inst_name, states, expire_at - time.time())
 
     # TODO
+    @invalidates_inventory(VM_LIST, TEMPLATES)
     def create_instance(self, inst_name, reference_vm, storage_pool=None):
         '''
         VM.clone doesn't support tartget storage, VM.copy support a new SR. Clone automatically exploits the capabilities
@@ -173,6 +226,7 @@ class XenVirtDriver(VirtDriver):
 
         return True
 
+    @invalidates_inventory(VM_LIST, TEMPLATES)
     def delete_instance(self, inst_name, delete_disk=False):
         """
         @see void destroy (session ref session_id, VM ref self), This function can
@@ -196,6 +250,7 @@ class XenVirtDriver(VirtDriver):
             log.exception("Exception: %s raised when destory vm [%s].", error, inst_name)
             return False
 
+    @invalidates_inventory(TEMPLATES)
     def power_off_vm(self, inst_name):
         """
         @see: void shutdown (session ref session_id, VM ref vm), it will attempts to
@@ -215,13 +270,13 @@ class XenVirtDriver(VirtDriver):
 
         try:
             handler.xenapi.VM.shutdown(vm_ref)
-            time.sleep(0.5)
         except Exception as error:
             log.exception("Exception raised: %s when shutdown VM [%s].", error, inst_name)
             return False
 
         return True
 
+    @invalidates_inventory(TEMPLATES)
     def power_on_vm(self, inst_name):
         """
         @summary: power on vm with name label inst_name
@@ -242,7 +297,6 @@ class XenVirtDriver(VirtDriver):
                     handler.xenapi.VM.unpause(vm_ref)
                 else:  # vm_state == "Halted"
                     handler.xenapi.VM.start(vm_ref, False, True)
-                time.sleep(1)
             except Exception as error:
                 log.error("Raise exception:'%s' while power on vm:%s", error, inst_name)
                 return False
@@ -269,7 +323,6 @@ class XenVirtDriver(VirtDriver):
         vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
         try:
             handler.xenapi.VM.clean_reboot(vm_ref)
-            time.sleep(2)
         except Exception as error:
             log.exception("Exception: %s when reboot VM [%s].", error, inst_name)
             return False
@@ -480,20 +533,14 @@ class XenVirtDriver(VirtDriver):
             return None
         return vm_ref
 
-    def get_vm_record(self, inst_name):
+    @staticmethod
+    def _to_vm_record(inst_name, record, metrics_record):
         """
-        return the record dict for inst_name
+        :param record: the VM record from XenAPI
+        :param metrics_record: the VM_metrics record from XenAPI
+        :return: the record dict returned by get_vm_record
         """
-        handler = self.get_handler()
-
         vm_record = {}
-        try:
-            vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
-            record = handler.xenapi.VM.get_record(vm_ref)
-        except Exception as error:
-            log.exception("Exception: %s when get record for VM [%s].", error, inst_name)
-            return {}
-
         GB = 1024 ** 3
         vm_record['VCPUs_max'] = record.get('VCPUs_max', None)
         vm_record['VCPUs_live'] = record.get('VCPUs_at_startup', None)
@@ -507,16 +554,52 @@ class XenVirtDriver(VirtDriver):
         # current target for memory available to this VM
         vm_record['memory_target'] = float("%.3f" % (float(record.get("memory_target", 0)) / GB))
         try:
-            guest_metrics = handler.xenapi.VM.get_metrics(vm_ref)
-            memory_actual = handler.xenapi.VM_metrics.get_memory_actual(guest_metrics)
+            memory_actual = metrics_record['memory_actual']
             vm_record['memory_actual'] = float("%.3f" % (float(memory_actual) / GB))
-        except Exception as error:
+        except (KeyError, TypeError, ValueError):
+            # no metrics record when failed to get it
             vm_record['memory_actual'] = vm_record['memory_target']
         vm_record['running'] = record['power_state'] == 'Running'
         vm_record['halted'] = record['power_state'] == 'Halted'
 
         return vm_record
 
+    def get_vm_record(self, inst_name):
+        """
+        return the record dict for inst_name
+        """
+        handler = self.get_handler()
+
+        try:
+            records = xen_records.get_vm_records(handler, inst_name, metrics=True)
+            record = records['VM']
+        except Exception as error:
+            log.exception("Exception: %s when get record for VM [%s].", error, inst_name)
+            return {}
+
+        return self._to_vm_record(inst_name, record, records['VM_metrics'])
+
+    def get_all_vm_records(self):
+        """
+        return the records of all the VMs with two get_all_records calls
+        :return: {vm_name: record same as get_vm_record}
+        """
+        handler = self.get_handler()
+        if handler is None:
+            log.error("Cann't get handler while get all vm records.")
+            return {}
+
+        all_vms = handler.xenapi.VM.get_all_records()
+        all_metrics = handler.xenapi.VM_metrics.get_all_records()
+        all_records = {}
+        for record in all_vms.values():
+            if not xen_records.is_vm_instance(record):
+                continue
+            inst_name = record['name_label']
+            all_records[inst_name] = self._to_vm_record(inst_name, record, all_metrics.get(record['metrics'], {}))
+
+        return all_records
+
     def get_os_type(self, inst_name, short_name=True):
         """
         get the os type, return string
@@ -540,9 +623,7 @@ class XenVirtDriver(VirtDriver):
         """
         handler = self.get_handler()
         try:
-            vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
-            guest_metrics_ref = handler.xenapi.VM.get_guest_metrics(vm_ref)
-            return handler.xenapi.VM_guest_metrics.get_record(guest_metrics_ref)
+            return xen_records.get_vm_records(handler, inst_name, guest_metrics=True).get('VM_guest_metrics', {})
         except Exception as error:
             log.debug("Exceptions raised when get vm guest metrics:%s", error)
             return {}
@@ -554,9 +635,7 @@ class XenVirtDriver(VirtDriver):
         """
         handler = self.get_handler()
         try:
-            vm_ref = handler.xenapi.VM.get_by_name_label(inst_name)[0]
-            vm_metrics_ref = handler.xenapi.VM.get_metrics(vm_ref)
-            return handler.xenapi.VM_metrics.get_record(vm_metrics_ref)
+            return xen_records.get_vm_records(handler, inst_name, metrics=True).get('VM_metrics', {})
         except Exception as error:
             log.exception("Exceptions raised:%s", error)
             return {}
@@ -591,16 +670,18 @@ class XenVirtDriver(VirtDriver):
         """
         handler = self.get_handler()
 
-        vm_ref = self._get_vm_ref(inst_name)
-        all_vdbs = handler.xenapi.VM.get_VBDs(vm_ref)
+        records = xen_records.get_vm_records(handler, inst_name, disks=True)
+        if not records:
+            log.error("No VM with name [%s].", inst_name)
+            return {}
+
         device_dict = {}
-        for vdb_ref in all_vdbs:
-            device_number = handler.xenapi.VBD.get_userdevice(vdb_ref)
-            device_name = handler.xenapi.VBD.get_device(vdb_ref)
-            vdi_ref = handler.xenapi.VBD.get_VDI(vdb_ref)
-            if "NULL" not in vdi_ref:
-                disk_size = handler.xenapi.VDI.get_virtual_size(vdi_ref)
-                disk_size = int(disk_size) / 1024.0 / 1024.0 / 1024.0
+        for vbd_record in records['VBD'].values():
+            device_number = vbd_record['userdevice']
+            device_name = vbd_record['device']
+            vdi_record = records['VDI'].get(vbd_record['VDI'], {})
+            if vdi_record:
+                disk_size = int(vdi_record['virtual_size']) / 1024.0 / 1024.0 / 1024.0
             else:
                 disk_size = 0
 
@@ -633,6 +714,7 @@ class XenVirtDriver(VirtDriver):
             log.debug("No virtual disk with device_num [%s].", device_num)
             return 0
 
+    @invalidates_inventory(STORAGES)
     def add_vdisk_to_vm(self, inst_name, storage_name='Local storage', size=2):
         """
         @param inst_name: the name of VM
@@ -684,15 +766,16 @@ class XenVirtDriver(VirtDriver):
             log.info("Virtual disk created, but didn't plugin.")
             return True
 
+        def plugged():
+            if handler.xenapi.VBD.get_device(vbd_ref) != '':
+                return True
+            handler.xenapi.VBD.plug(vbd_ref)
+            return False
+
         try:
             log.info("Waiting for the virtual disk plug in...")
-            sleep_time = 0
-            while ((handler.xenapi.VBD.get_device(vbd_ref) == '') and (sleep_time < 10)):
-                log.debug("wait device [%s] to plug in, sleep time %s.", handler.xenapi.VBD.get_device(vbd_ref),
-                          sleep_time)
-                time.sleep(2)
-                handler.xenapi.VBD.plug(vbd_ref)
-                sleep_time += 2
+            if not wait_until(plugged, 10):
+                log.warn("The virtual disk is not plugged in after 10 seconds.")
         except Exception as error:
             log.exception("Exception when plug VBD: %s", error)
             return False
@@ -764,6 +847,7 @@ class XenVirtDriver(VirtDriver):
 
         return ret_cpu_dict
 
+    @cached_inventory(STORAGES)
     def get_host_all_storages(self):
         """
         return a list of all the storage names
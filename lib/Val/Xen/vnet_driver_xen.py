@@ -10,10 +10,15 @@
      host <-----    PIF    ----->network<-----  VIF----->    VM
 '''
 
-import signal
 
 from lib.Log.log import log
+from lib.Utils.constans import HYPERVISOR_CONNECT_TIMEOUT
+from lib.Utils.signal_utils import run_with_timeout
 from lib.Val.Xen import XenAPI
+from lib.Val.Xen import xen_records
+from lib.Val.Xen.virt_driver_xen import XEN_TRANSPORTS
+from lib.Val.inventory_cache import cached_inventory, invalidates_inventory, BRIDGES, NETWORKS
+from lib.Val.transport_cache import connect_by_transports
 from lib.Val.vnet_driver import VnetDriver
 
 
@@ -24,8 +29,10 @@ class XenVnetDriver(VnetDriver):
     '''
     '''
 
-    def __init__(self, hostname=None, user="root", passwd=""):
-        VnetDriver.__init__(self, hostname, user, passwd)
+    platform = "Xen"
+
+    def __init__(self, hostname=None, user="root", passwd="", pool=None):
+        VnetDriver.__init__(self, hostname, user, passwd, pool)
 
         self._hypervisor_handler = self.get_handler()
 
@@ -33,45 +40,58 @@ class XenVnetDriver(VnetDriver):
         try:
             if self._hypervisor_handler is not None:
                 log.debug("Release handler in vnet driver, ID:%s", id(self._hypervisor_handler))
-                self._hypervisor_handler.xenapi.session.logout()
-                self._hypervisor_handler = None
+                self._release_handler()
         except Exception as error:
             log.debug(error)
 
-    def get_handler(self):
-        '''
-        return the handler of the virt_driver
-        '''
-        if self._hypervisor_handler is not None:
-            return self._hypervisor_handler
+    @staticmethod
+    def _is_handler_alive(handler):
+        # any cheap call will fail if the session has expired on server
+        handler.xenapi.session.get_this_host(handler.handle)
+        return True
 
-        if self.hostname is None:
-            self._hypervisor_handler = XenAPI.xapi_local()  # no __nonzero__, can not use if/not for bool test
-        else:
-            log.debug("connecting to %s with user:%s,passwd:%s", "http://" + str(self.hostname), self.user, self.passwd)
-            self._hypervisor_handler = XenAPI.Session("http://" + str(self.hostname))
+    @staticmethod
+    def _close_handler(handler):
+        handler.xenapi.session.logout()
 
-        old = signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(4)  # connetctions timeout set to 4 secs
-        try:
-            self._hypervisor_handler.xenapi.login_with_password(self.user, self.passwd, API_VERSION_1_1,
-                                                                'XenVirtDriver')
-        except Exception as error:
-            log.warn("Exception raised: %s when get handler.", error)
-            log.info("Retry connecting to :%s", "https://" + str(self.hostname))
-            self._hypervisor_handler = XenAPI.Session("https://" + str(self.hostname))
+    def _login(self, scheme):
+        """
+        :param scheme: http or https
+        """
+        url = "%s://%s" % (scheme, self.hostname)
+        log.debug("connecting to %s with user:%s,passwd:%s", url, self.user, self.passwd)
+        handler = XenAPI.Session(url)
+        run_with_timeout(handler.xenapi.login_with_password, HYPERVISOR_CONNECT_TIMEOUT,
+                         (self.user, self.passwd, API_VERSION_1_1, 'XenVirtDriver'),
+                         on_abandon=lambda result: self._close_handler(handler))
+        return handler
 
-            signal.alarm(4)
+    def _connect(self):
+        """
+        login to Xenserver, try the transport last succeed first, default http and then https
+        :return: the session or None
+        """
+        if self.hostname is None:
+            handler = XenAPI.xapi_local()  # no __nonzero__, can not use if/not for bool test
             try:
-                self._hypervisor_handler.xenapi.login_with_password(self.user, self.passwd, API_VERSION_1_1,
-                                                                    'XenVirtDriver')
+                run_with_timeout(handler.xenapi.login_with_password, HYPERVISOR_CONNECT_TIMEOUT,
+                                 (self.user, self.passwd, API_VERSION_1_1, 'XenVirtDriver'),
+                                 on_abandon=lambda result: self._close_handler(handler))
             except Exception as errors:
                 log.exception("Exception errors:%s when get handler", errors)
                 return None
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old)
+            return handler
+
+        return connect_by_transports(self.platform, self.hostname, XEN_TRANSPORTS, self._login)
 
+    def get_handler(self):
+        '''
+        return the handler of the vnet_driver
+        '''
+        if self._hypervisor_handler is not None:
+            return self._hypervisor_handler
+
+        self._hypervisor_handler = self._acquire_handler()
         log.debug("Get handler ID in vnet driver: %s", id(self._hypervisor_handler))
         return self._hypervisor_handler
 
@@ -82,11 +102,11 @@ class XenVnetDriver(VnetDriver):
         try:
             if self._hypervisor_handler is not None:
                 log.debug("Release handler manually in vnet driver, ID:%s", id(self._hypervisor_handler))
-                self._hypervisor_handler.xenapi.session.logout()
-                self._hypervisor_handler = None
+                self._release_handler()
         except Exception as error:
             log.debug(error)
 
+    @cached_inventory(BRIDGES)
     def get_bridge_list(self):
         """
         return all the switch/bridge/network on host
@@ -100,6 +120,7 @@ class XenVnetDriver(VnetDriver):
 
         return switch_names_list
 
+    @cached_inventory(NETWORKS)
     def get_network_list(self):
         """
         :return: all the bridge names
@@ -293,6 +314,7 @@ class XenVnetDriver(VnetDriver):
         else:
             return "unKnown"
 
+    @invalidates_inventory(NETWORKS, BRIDGES)
     def _create_new_network(self, bridge_name):
         """
         create a new network
@@ -318,13 +340,12 @@ class XenVnetDriver(VnetDriver):
         if self._hypervisor_handler is None:
             self._hypervisor_handler = self.get_handler()
 
-        try:
-            vm_ref = self._hypervisor_handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        except IndexError:
+        vm_ref, _ = xen_records.get_vm_by_name(self._hypervisor_handler, inst_name)
+        if vm_ref is None:
             log.error("No VM with name [%s].", inst_name)
             return []
-        all_vifs = self._hypervisor_handler.xenapi.VM.get_VIFs(vm_ref)
-        return sorted([self._hypervisor_handler.xenapi.VIF.get_device(vif) for vif in all_vifs])
+        all_vifs = xen_records.get_records_where(self._hypervisor_handler, "VIF", "VM", vm_ref)
+        return sorted([vif_record['device'] for vif_record in all_vifs.values()])
 
     def is_vif_exist(self, inst_name, vif_index):
         """
@@ -347,17 +368,18 @@ class XenVnetDriver(VnetDriver):
             self._hypervisor_handler = self.get_handler()
 
         try:
-            vm_ref = self._hypervisor_handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        except IndexError:
+            records = xen_records.get_vm_records(self._hypervisor_handler, inst_name, vifs=True, guest_metrics=True)
+        except Exception as error:
+            log.debug("Except in get_vif_ip: %s", error)
+            return None
+        if not records:
             log.error("No VM with name [%s].", inst_name)
             return None
 
-        try:
-            all_vifs = self.get_all_vifs_indexes(inst_name)
-            guest_metrics_ref = self._hypervisor_handler.xenapi.VM.get_guest_metrics(vm_ref)
-            network_dict = self._hypervisor_handler.xenapi.VM_guest_metrics.get_networks(guest_metrics_ref)
-        except Exception as error:
-            log.debug("Except in get_vif_ip: %s", error)
+        all_vifs = [vif_record['device'] for vif_record in records['VIF'].values()]
+        network_dict = records['VM_guest_metrics'].get('networks', None)
+        if network_dict is None:
+            log.debug("No guest metrics for VM [%s] in get_vif_ip.", inst_name)
             return None
 
         if str(vif_index) not in all_vifs:
@@ -430,26 +452,18 @@ class XenVnetDriver(VnetDriver):
         if self._hypervisor_handler is None:
             self._hypervisor_handler = self.get_handler()
 
-        try:
-            vm_ref = self._hypervisor_handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        except IndexError:
+        records = xen_records.get_vm_records(self._hypervisor_handler, inst_name, vifs=True, guest_metrics=True)
+        if not records:
             log.error("No VM with name [%s].", inst_name)
             return {}
 
         vifs_info = {}
-        all_vifs = self._hypervisor_handler.xenapi.VM.get_VIFs(vm_ref)
-        for vif_ref in all_vifs:
-            device_index = self._hypervisor_handler.xenapi.VIF.get_device(vif_ref)
+        for vif_record in records['VIF'].values():
+            device_index = vif_record['device']
             vifs_info.setdefault(device_index, {})
-            mac = self._hypervisor_handler.xenapi.VIF.get_MAC(vif_ref)
-            vifs_info[device_index]['mac'] = mac
-        try:
-            guest_metrics_ref = self._hypervisor_handler.xenapi.VM.get_guest_metrics(vm_ref)
-            # When vm first start up, the guest_metrics_ref is 'OpaqueRef:NULL', so no networks information
-            network_dict = self._hypervisor_handler.xenapi.VM_guest_metrics.get_networks(guest_metrics_ref)
-        except Exception as error:
-            log.debug("Exceptions when get VM_guest_metrics: %s", error)
-            network_dict = {}
+            vifs_info[device_index]['mac'] = vif_record['MAC']
+        # When vm first start up, the guest_metrics_ref is 'OpaqueRef:NULL', so no networks information
+        network_dict = records['VM_guest_metrics'].get('networks', {})
 
         # by test, if there are vif 0,1,3, and each device with a ip, then the dic are about "2/ip: 192.168.1.122;  1/ip: 192.168.1.200;  0/ip: 10.143.248.253;"
         # if there are vif 0,1,2,3, with ip attached to 0,1,3, then the dic looks like "3/ip: 192.168.1.122; 1/ip: 192.168.1.200;  0/ip: 10.143.248.253;"
@@ -469,19 +483,19 @@ class XenVnetDriver(VnetDriver):
         if self._hypervisor_handler is None:
             self._hypervisor_handler = self.get_handler()
 
-        try:
-            vm_ref = self._hypervisor_handler.xenapi.VM.get_by_name_label(inst_name)[0]
-        except IndexError:
+        vm_ref, _ = xen_records.get_vm_by_name(self._hypervisor_handler, inst_name)
+        if vm_ref is None:
             log.error("No VM with name [%s].", inst_name)
             return None
-        all_vifs = self._hypervisor_handler.xenapi.VM.get_VIFs(vm_ref)
-        for vif in all_vifs:
-            if str(vif_index) == self._hypervisor_handler.xenapi.VIF.get_device(vif):
+        all_vifs = xen_records.get_records_where(self._hypervisor_handler, "VIF", "VM", vm_ref)
+        for vif, vif_record in all_vifs.items():
+            if str(vif_index) == vif_record['device']:
                 return vif
         # No vif match with vif_index
         log.debug("No virtual interface with given index:[%s].", vif_index)
         return None
 
+    @invalidates_inventory(NETWORKS, BRIDGES)
     def create_new_vif(self, inst_name, vif_index, device_name=None, network=None, bridge=None, MAC=None):
         """
         @param inst_name: name of the guest VM
@@ -529,6 +543,7 @@ class XenVnetDriver(VnetDriver):
         new_vif = handler.xenapi.VIF.create(record)
         return new_vif
 
+    @invalidates_inventory(NETWORKS, BRIDGES)
     def destroy_vif(self, inst_name, vif_index):
         """
         @param vif_index: index of virtual interface in guest VM
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: connection_pool.py
+ Author: longhui
+ Created Time: 2026-10-18 09:12:40
+ Descriptions: A process wide pool of hypervisor handlers, keyed on (platform, host, user, passwd), so that the virt
+        driver and the vnet driver to the same host share one connection instead of each opening its own
+"""
+
+import abc
+import atexit
+import threading
+import time
+
+import six
+
+from lib.Log.log import log
+
+
+# max number of handlers kept in the pool
+DEFAULT_POOL_SIZE = 64
+# an unused handler is closed after being idle for so many seconds
+DEFAULT_IDLE_TIMEOUT = 300
+# a pooled handler is health checked again after so many seconds
+DEFAULT_CHECK_INTERVAL = 30
+
+
+class _PoolEntry(object):
+    """
+    a pooled handler with its reference count and bookkeeping times
+    """
+
+    def __init__(self, handler, checker, closer):
+        self.handler = handler
+        self.checker = checker
+        self.closer = closer
+        self.refs = 0
+        self.last_used = time.time()
+        self.last_checked = self.last_used
+
+
+class HandlerPool(object):
+    """
+    Pool of hypervisor handlers. The driver supplies how to open, check and close a handler, the pool decides when.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 check_interval=DEFAULT_CHECK_INTERVAL):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _close_handler(closer, handler):
+        try:
+            closer(handler)
+        except Exception as error:
+            log.debug("Exception when close handler: %s", error)
+
+    def _is_healthy(self, entry):
+        """
+        check the handler only when it has not been checked for a while
+        """
+        now = time.time()
+        if now - entry.last_checked < self.check_interval:
+            return True
+        try:
+            alive = entry.checker(entry.handler)
+        except Exception as error:
+            log.debug("Health check of pooled handler raise exception: %s", error)
+            alive = False
+        entry.last_checked = now
+        return bool(alive)
+
+    def _evict_idle(self, force=False):
+        """
+        close the handlers not used by any driver, those idle longer than idle_timeout or all of them when force
+        :return: the number of evicted handlers
+        """
+        now = time.time()
+        evicted = 0
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1].last_used):
+            if entry.refs > 0:
+                continue
+            if force or now - entry.last_used > self.idle_timeout:
+                log.debug("Evict idle handler to %s from pool.", key[1])
+                del self._entries[key]
+                self._close_handler(entry.closer, entry.handler)
+                evicted += 1
+                if force and len(self._entries) < self.max_size:
+                    break
+        return evicted
+
+    def acquire(self, key, opener, checker, closer):
+        """
+        :param key: (platform, host, user, passwd)
+        :param opener: function without params, return a new handler or None
+        :param checker: function(handler), return True if the handler is still usable
+        :param closer: function(handler), close the handler
+        :return: a handler or None if can not connect
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                if self._is_healthy(entry):
+                    entry.refs += 1
+                    entry.last_used = time.time()
+                    log.debug("Reuse pooled handler to %s, refs: %s", key[1], entry.refs)
+                    return entry.handler
+
+                log.info("Pooled handler to %s is not alive, reconnecting...", key[1])
+                del self._entries[key]
+                # drivers still holding the dead handler will fail anyway, only close it when nobody use it
+                if entry.refs == 0:
+                    self._close_handler(closer, entry.handler)
+
+        # connecting may take seconds, do not block the drivers to other hosts
+        handler = opener()
+        if handler is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                # another driver connected to the same host meanwhile, use the pooled one
+                self._close_handler(closer, handler)
+                entry.refs += 1
+                entry.last_used = time.time()
+                return entry.handler
+
+            if len(self._entries) >= self.max_size:
+                self._evict_idle(force=True)
+            if len(self._entries) >= self.max_size:
+                log.warn("Handler pool is full with %s handlers, the handler to %s will not be pooled.",
+                         self.max_size, key[1])
+                return handler
+
+            entry = _PoolEntry(handler, checker, closer)
+            entry.refs = 1
+            self._entries[key] = entry
+            return handler
+
+    def release(self, key, handler, closer):
+        """
+        give back a handler got from acquire; a handler which is not (or no longer) pooled is closed
+        """
+        if handler is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None or entry.handler is not handler:
+                self._close_handler(closer, handler)
+                return
+
+            entry.refs = max(entry.refs - 1, 0)
+            entry.last_used = time.time()
+
+    def close_all(self):
+        """
+        close all the handlers in pool, it is called when the process exit
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                log.debug("Close pooled handler to %s.", key[1])
+                self._close_handler(entry.closer, entry.handler)
+            self._entries.clear()
+
+
+_handler_pool = HandlerPool()
+atexit.register(_handler_pool.close_all)
+
+
+def get_handler_pool():
+    """
+    :return: the process wide handler pool
+    """
+    return _handler_pool
+
+
+@six.add_metaclass(abc.ABCMeta)
+class PooledHandlerMixin(object):
+    """
+    open, share and close the hypervisor handler of a driver, the driver sets platform, hostname, user, passwd and
+    _pool, and implements _connect
+    """
+
+    @property
+    def pool_key(self):
+        """
+        the key of handler in connection pool, drivers with same key share one handler. A driver with another password
+        does not get the handler logged in by others.
+        """
+        return (self.platform, self.hostname, self.user, self.passwd)
+
+    @property
+    def cache_key(self):
+        """
+        the key of the caches and domain events of host, shared by the drivers to the host with any password
+        """
+        return (self.platform, self.hostname, self.user)
+
+    @abc.abstractmethod
+    def _connect(self):
+        """
+        open a new handler to hypervisor
+        :return: the handler or None if failed
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _is_handler_alive(handler):
+        """
+        :return: True if the handler is still usable
+        """
+        return handler is not None
+
+    @staticmethod
+    def _close_handler(handler):
+        """
+        close the handler to hypervisor
+        """
+        pass
+
+    def _acquire_handler(self):
+        """
+        get a handler from the pool if there is, else open a new one
+        """
+        if self._pool is None:
+            return self._connect()
+        return self._pool.acquire(self.pool_key, self._connect, self._is_handler_alive, self._close_handler)
+
+    def _release_handler(self):
+        """
+        give back the handler to the pool if there is, else close it
+        """
+        handler, self._hypervisor_handler = self._hypervisor_handler, None
+        if handler is None:
+            return
+        if self._pool is None:
+            self._close_handler(handler)
+        else:
+            self._pool.release(self.pool_key, handler, self._close_handler)
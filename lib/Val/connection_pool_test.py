@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: connection_pool_test.py
+ Author: longhui
+ Created Time: 2026-10-18 10:05:21
+'''
+import unittest
+from lib.Val.connection_pool import HandlerPool, PooledHandlerMixin
+
+
+class FakeHandler(object):
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+
+class FakeDriver(PooledHandlerMixin):
+
+    platform = "Fake"
+
+    def __init__(self, passwd, pool):
+        self.hostname = "pool-test-host"
+        self.user = "root"
+        self.passwd = passwd
+        self._pool = pool
+        self._hypervisor_handler = None
+
+    def _connect(self):
+        return FakeHandler()
+
+
+class HandlerPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = HandlerPool(max_size=2, idle_timeout=300, check_interval=0)
+        self.opened = []
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def opener(self):
+        handler = FakeHandler()
+        self.opened.append(handler)
+        return handler
+
+    @staticmethod
+    def checker(handler):
+        return handler.alive
+
+    @staticmethod
+    def closer(handler):
+        handler.closed = True
+
+    def acquire(self, host):
+        return self.pool.acquire(("KVM", host, "root"), self.opener, self.checker, self.closer)
+
+    def test_share_handler(self):
+        handler = self.acquire("host1")
+        self.assertIs(handler, self.acquire("host1"))
+        self.assertIsNot(handler, self.acquire("host2"))
+        self.assertEqual(len(self.opened), 2)
+
+    def test_reconnect_dead_handler(self):
+        handler = self.acquire("host1")
+        self.pool.release(("KVM", "host1", "root"), handler, self.closer)
+        handler.alive = False
+        new_handler = self.acquire("host1")
+        self.assertIsNot(handler, new_handler)
+        self.assertTrue(handler.closed)
+
+    def test_full_pool(self):
+        handler1 = self.acquire("host1")
+        self.acquire("host2")
+        handler3 = self.acquire("host3")
+        self.assertEqual(len(self.pool), 2)
+        # the unpooled handler is closed when released
+        self.pool.release(("KVM", "host3", "root"), handler3, self.closer)
+        self.assertTrue(handler3.closed)
+        # an idle handler is evicted to make room
+        self.pool.release(("KVM", "host1", "root"), handler1, self.closer)
+        self.acquire("host4")
+        self.assertTrue(handler1.closed)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_driver_password(self):
+        self.assertRaises(TypeError, PooledHandlerMixin)
+        driver, other = FakeDriver("passwd", self.pool), FakeDriver("other", self.pool)
+        handler = driver._acquire_handler()
+        # a wrong password does not get the handler logged in by others, but shares the caches
+        self.assertIsNot(other._acquire_handler(), handler)
+        self.assertEqual(driver.cache_key, other.cache_key)
+        self.assertIs(FakeDriver("passwd", self.pool)._acquire_handler(), handler)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: inventory_cache.py
+ Author: longhui
+ Created Time: 2026-10-18 14:02:18
+ Descriptions: a short lived cache of the inventory on a host, such as VM names, templates, networks, bridges and
+        storages, shared by the drivers to the same host. The drivers invalidate it when they change the inventory.
+"""
+
+import atexit
+import functools
+import os
+import threading
+import time
+
+from lib.Log.log import log
+
+
+# seconds a cached list is used, 0 to disable the cache
+INVENTORY_CACHE_TTL = float(os.getenv("VIRT_INVENTORY_CACHE_TTL", 30))
+
+VM_LIST = "vm_list"
+TEMPLATES = "templates"
+NETWORKS = "networks"
+BRIDGES = "bridges"
+STORAGES = "storages"
+
+
+class InventoryCache(object):
+    """
+    cached lists of one host with their loaded time, and the hit/miss counters. The generation of a kind is increased
+    when it is invalidated, a list loaded before that is not cached.
+    """
+
+    def __init__(self, ttl=INVENTORY_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generations = {}
+        # increased when all the kinds are invalidated
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, kind):
+        return self._epoch, self._generations.get(kind, 0)
+
+    def get(self, kind, loader):
+        """
+        :param kind: VM_LIST, TEMPLATES, etc
+        :param loader: function without params, return the list from hypervisor
+        :return: a copy of the cached list, or the one from loader when not cached or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(kind, None)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            generation = self._generation(kind)
+
+        value = loader()
+        if self.ttl > 0:
+            with self._lock:
+                # invalidated during loading, the list may be stale
+                if self._generation(kind) == generation:
+                    self._entries[kind] = (now, list(value))
+        return value
+
+    def invalidate(self, *kinds):
+        """
+        :param kinds: the kinds to drop, all the kinds when not given
+        """
+        with self._lock:
+            if not kinds:
+                self._entries.clear()
+                self._epoch += 1
+            for kind in kinds:
+                self._entries.pop(kind, None)
+                self._generations[kind] = self._generations.get(kind, 0) + 1
+
+    def stats(self):
+        """
+        :return: {"hits": , "misses": }
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_inventory_cache(key):
+    """
+    :param key: the cache_key of driver, (platform, host, user)
+    :return: the inventory cache shared by the drivers with same key
+    """
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = InventoryCache()
+        return _caches[key]
+
+
+def _log_stats():
+    for key, cache in _caches.items():
+        stats = cache.stats()
+        if stats["hits"] or stats["misses"]:
+            log.debug("Inventory cache of %s: %s hits, %s misses.", key[1], stats["hits"], stats["misses"])
+
+
+atexit.register(_log_stats)
+
+
+def cached_inventory(kind):
+    """
+    decorator for the driver method without params which list the inventory
+    """
+    def decrator(func):
+        @functools.wraps(func)
+        def wrapper(self):
+            # not connected, the empty list should not be cached
+            if not self:
+                return func(self)
+            return get_inventory_cache(self.cache_key).get(kind, lambda: func(self))
+        return wrapper
+    return decrator
+
+
+def invalidates_inventory(*kinds):
+    """
+    decorator for the driver method which changes the inventory, the kinds are dropped from cache after it
+    """
+    def decrator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                get_inventory_cache(self.cache_key).invalidate(*kinds)
+        return wrapper
+    return decrator
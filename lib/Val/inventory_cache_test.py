@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: inventory_cache_test.py
+ Author: longhui
+ Created Time: 2026-10-18 14:30:51
+'''
+import unittest
+from lib.Val.inventory_cache import cached_inventory, get_inventory_cache, invalidates_inventory, InventoryCache
+
+
+class FakeDriver(object):
+
+    def __init__(self, host):
+        self.cache_key = ("KVM", host, "root")
+        self.vms = ["vm1", "vm2"]
+        self.list_calls = 0
+
+    def __nonzero__(self):
+        return True
+
+    @cached_inventory("vm_list")
+    def get_vm_list(self):
+        self.list_calls += 1
+        return list(self.vms)
+
+    @invalidates_inventory("vm_list")
+    def create_instance(self, inst_name):
+        self.vms.append(inst_name)
+
+
+class InventoryCacheTestCase(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = InventoryCache(ttl=60)
+        self.assertEqual(cache.get("vm_list", lambda: ["vm1"]), ["vm1"])
+        self.assertEqual(cache.get("vm_list", lambda: ["vm2"]), ["vm1"])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+        cache.invalidate()
+        self.assertEqual(cache.get("vm_list", lambda: ["vm2"]), ["vm2"])
+
+    def test_invalidated_during_loading(self):
+        cache = InventoryCache(ttl=60)
+
+        def loader(kinds):
+            # the inventory is changed and invalidated by another driver when loading
+            cache.invalidate(*kinds)
+            return ["vm1"]
+
+        self.assertEqual(cache.get("vm_list", lambda: loader(["vm_list"])), ["vm1"])
+        self.assertEqual(cache.get("vm_list", lambda: ["vm1", "vm2"]), ["vm1", "vm2"])
+        # other kinds are still cached
+        cache.invalidate("templates")
+        self.assertEqual(cache.get("vm_list", lambda: []), ["vm1", "vm2"])
+        # all the kinds are invalidated
+        self.assertEqual(cache.get("templates", lambda: loader([])), ["vm1"])
+        self.assertEqual(cache.get("templates", lambda: ["template1"]), ["template1"])
+
+    def test_disabled(self):
+        cache = InventoryCache(ttl=0)
+        cache.get("vm_list", lambda: ["vm1"])
+        self.assertEqual(cache.get("vm_list", lambda: ["vm2"]), ["vm2"])
+
+    def test_driver_decorators(self):
+        driver = FakeDriver("inventory-test-host")
+        for _ in range(30):
+            self.assertTrue("vm1" in driver.get_vm_list())
+        self.assertEqual(driver.list_calls, 1)
+        # the cached list can not be changed by caller
+        driver.get_vm_list().append("vm3")
+        self.assertFalse("vm3" in driver.get_vm_list())
+
+        driver.create_instance("vm3")
+        self.assertTrue("vm3" in driver.get_vm_list())
+        self.assertEqual(driver.list_calls, 2)
+        # shared by the drivers to the same host
+        self.assertTrue("vm3" in FakeDriver("inventory-test-host").get_vm_list())
+        self.assertEqual(get_inventory_cache(driver.cache_key).stats()["misses"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: domain_xml_cache.py
+ Author: longhui
+ Created Time: 2026-10-18 15:10:26
+ Descriptions: the parsed XML description of domains, keyed on domain uuid and the inactive flag, shared by the drivers
+        to the same host. It is dropped by our own mutating calls and by the libvirt domain events, and expires after
+        a short time in case an event is missed.
+"""
+
+import functools
+import os
+import threading
+import time
+import xml.etree.ElementTree as xmlEtree
+
+import libvirt
+
+
+# seconds a parsed tree is used, 0 to disable the cache
+DOMAIN_XML_CACHE_TTL = float(os.getenv("VIRT_DOMAIN_XML_CACHE_TTL", 10))
+
+
+class DomainXMLCache(object):
+    """
+    parsed trees as {(uuid, inactive): (loaded time, generation, tree)}, the generation of a domain is increased when
+    it is invalidated, so a tree fetched before the change is not stored
+    """
+
+    def __init__(self, ttl=DOMAIN_XML_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._names = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get_tree(self, domain, inactive=False):
+        """
+        the tree is shared by the callers, it should be read only, deepcopy it before any change
+        :param domain: libvirt domain object
+        :param inactive: True for the persistent config, False for the live one
+        :return: the root element of the domain XML description
+        """
+        # the uuid and name are kept in domain object, no remote call for them
+        uuid = domain.UUIDString()
+        key = (uuid, bool(inactive))
+        now = time.time()
+        with self._lock:
+            self._names[domain.name()] = uuid
+            entry = self._entries.get(key, None)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = self._generations.get(uuid, 0)
+
+        flags = libvirt.VIR_DOMAIN_XML_INACTIVE if inactive else 0
+        tree = xmlEtree.fromstring(domain.XMLDesc(flags))
+        if self.ttl > 0:
+            with self._lock:
+                if self._generations.get(uuid, 0) == generation:
+                    self._entries[key] = (now, generation, tree)
+        return tree
+
+    def invalidate(self, uuid=None, name=None):
+        """
+        :param uuid: the domain uuid
+        :param name: the domain name, used when uuid is not known
+        drop all the trees when neither is given
+        """
+        with self._lock:
+            if uuid is None and name is None:
+                for known_uuid in self._generations.keys():
+                    self._generations[known_uuid] += 1
+                self._entries.clear()
+                return
+            if uuid is None:
+                uuid = self._names.get(name, None)
+                if uuid is None:
+                    return
+            self._generations[uuid] = self._generations.get(uuid, 0) + 1
+            self._entries.pop((uuid, True), None)
+            self._entries.pop((uuid, False), None)
+
+    def stats(self):
+        """
+        :return: {"hits": , "misses": }
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_domain_xml_cache(key):
+    """
+    :param key: the cache_key of driver, (platform, host, user)
+    :return: the domain XML cache shared by the drivers with same key
+    """
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DomainXMLCache()
+        return _caches[key]
+
+
+def invalidates_domain_xml(func):
+    """
+    decorator for the driver method which changes a domain, its first param is inst_name
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        inst_name = kwargs.get("inst_name", args[0] if args else None)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            get_domain_xml_cache(self.cache_key).invalidate(name=inst_name)
+    return wrapper
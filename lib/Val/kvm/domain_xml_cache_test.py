@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: domain_xml_cache_test.py
+ Author: longhui
+ Created Time: 2026-10-18 15:48:03
+'''
+import unittest
+from lib.Val.kvm.domain_xml_cache import DomainXMLCache, get_domain_xml_cache, invalidates_domain_xml
+
+
+class FakeDomain(object):
+
+    def __init__(self, name, uuid, vcpus=2):
+        self._name = name
+        self._uuid = uuid
+        self.vcpus = vcpus
+        self.desc_calls = 0
+
+    def name(self):
+        return self._name
+
+    def UUIDString(self):
+        return self._uuid
+
+    def XMLDesc(self, flags=0):
+        self.desc_calls += 1
+        return "<domain><name>%s</name><vcpu>%s</vcpu></domain>" % (self._name, self.vcpus)
+
+
+class FakeDriver(object):
+
+    def __init__(self, domain):
+        self.cache_key = ("KVM", "xml-cache-test-host", "root")
+        self.domain = domain
+
+    @invalidates_domain_xml
+    def set_vm_vcpu_max(self, inst_name, vcpu_num):
+        self.domain.vcpus = vcpu_num
+
+
+class DomainXMLCacheTestCase(unittest.TestCase):
+
+    def test_parse_once(self):
+        cache = DomainXMLCache(ttl=60)
+        domain = FakeDomain("vm1", "uuid-1")
+        for _ in range(10):
+            self.assertEqual(cache.get_tree(domain).find("vcpu").text, "2")
+        self.assertEqual(domain.desc_calls, 1)
+        # the inactive and live description are cached apart
+        cache.get_tree(domain, inactive=True)
+        self.assertEqual(domain.desc_calls, 2)
+        self.assertEqual(cache.stats(), {"hits": 9, "misses": 2})
+
+    def test_invalidate(self):
+        cache = DomainXMLCache(ttl=60)
+        domain1, domain2 = FakeDomain("vm1", "uuid-1"), FakeDomain("vm2", "uuid-2")
+        cache.get_tree(domain1)
+        cache.get_tree(domain2)
+        domain1.vcpus = 4
+        cache.invalidate(uuid="uuid-1")
+        self.assertEqual(cache.get_tree(domain1).find("vcpu").text, "4")
+        cache.get_tree(domain2)
+        self.assertEqual(domain2.desc_calls, 1)
+        cache.invalidate(name="vm2")
+        cache.get_tree(domain2)
+        self.assertEqual(domain2.desc_calls, 2)
+
+    def test_disabled(self):
+        cache = DomainXMLCache(ttl=0)
+        domain = FakeDomain("vm1", "uuid-1")
+        cache.get_tree(domain)
+        cache.get_tree(domain)
+        self.assertEqual(domain.desc_calls, 2)
+
+    def test_driver_decorator(self):
+        driver = FakeDriver(FakeDomain("vm1", "uuid-1"))
+        cache = get_domain_xml_cache(driver.cache_key)
+        self.assertEqual(cache.get_tree(driver.domain).find("vcpu").text, "2")
+        driver.set_vm_vcpu_max("vm1", 8)
+        self.assertEqual(cache.get_tree(driver.domain).find("vcpu").text, "8")
+        driver.set_vm_vcpu_max(inst_name="vm1", vcpu_num=6)
+        self.assertEqual(cache.get_tree(driver.domain).find("vcpu").text, "6")
+
+
+if __name__ == "__main__":
+    unittest.main()
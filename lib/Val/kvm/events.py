@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: events.py
+ Author: longhui
+ Created Time: 2026-10-18 15:32:47
+ Descriptions: the libvirt event loop running in a daemon thread, and the domain event callbacks registered on each
+        connection to drop the cached domain XML when a domain is changed by others, and to keep a live inventory of
+        the domain states which other modules can subscribe to or wait on
+"""
+
+import threading
+import time
+
+import libvirt
+from libvirt import libvirtError
+
+from lib.Log.log import log
+from lib.Utils.signal_utils import Deadline
+from lib.Val.kvm.domain_xml_cache import get_domain_xml_cache
+
+
+_loop_lock = threading.Lock()
+_loop_thread = None
+
+
+def _run_event_loop():
+    while True:
+        try:
+            libvirt.virEventRunDefaultImpl()
+        except Exception as error:
+            # the loop thread must not die, or no connection will deliver events any more
+            log.debug("Exception in libvirt event loop: %s", error)
+            time.sleep(0.1)
+
+
+def start_event_loop():
+    """
+    register the default event implementation and run it in a daemon thread, only the connection opened after it
+    will deliver events
+    :return: True if the event loop is running, else False
+    """
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is not None:
+            return True
+        try:
+            libvirt.virEventRegisterDefaultImpl()
+        except (AttributeError, libvirtError) as error:
+            log.debug("Can not register libvirt event implementation: %s", error)
+            return False
+        _loop_thread = threading.Thread(target=_run_event_loop, name="libvirt-event-loop")
+        _loop_thread.daemon = True
+        _loop_thread.start()
+        return True
+
+
+# the domain state after a lifecycle event, the DEFINED event does not change the state
+LIFECYCLE_EVENT_STATES = [("VIR_DOMAIN_EVENT_STARTED", "VIR_DOMAIN_RUNNING"),
+                          ("VIR_DOMAIN_EVENT_SUSPENDED", "VIR_DOMAIN_PAUSED"),
+                          ("VIR_DOMAIN_EVENT_RESUMED", "VIR_DOMAIN_RUNNING"),
+                          ("VIR_DOMAIN_EVENT_STOPPED", "VIR_DOMAIN_SHUTOFF"),
+                          ("VIR_DOMAIN_EVENT_SHUTDOWN", "VIR_DOMAIN_SHUTDOWN"),
+                          ("VIR_DOMAIN_EVENT_PMSUSPENDED", "VIR_DOMAIN_PMSUSPENDED"),
+                          ("VIR_DOMAIN_EVENT_CRASHED", "VIR_DOMAIN_CRASHED")]
+
+_event_states = dict((getattr(libvirt, event_name), getattr(libvirt, state_name))
+                     for event_name, state_name in LIFECYCLE_EVENT_STATES
+                     if hasattr(libvirt, event_name) and hasattr(libvirt, state_name))
+
+
+class DomainEventInventory(object):
+    """
+    the domains on one host as {name: {"uuid":, "state":, "balloon":, "seq":}}, loaded once from the host and then
+    updated by the domain events. The balloon is the current memory in KB, None if not known.
+    """
+
+    def __init__(self):
+        # True when the events are delivered on a connection to the host
+        self.live = False
+        self.loaded = False
+        self._seq = 0
+        self._domains = {}
+        self._subscribers = []
+        self._cond = threading.Condition(threading.Lock())
+
+    def set_live(self, live):
+        """
+        the events may be missed when the connection is changed, the domains will be loaded again
+        """
+        with self._cond:
+            self.live = live
+            self.loaded = False
+            # wake up the waiters to fall back to polling
+            self._cond.notify_all()
+
+    def load(self, conn):
+        """
+        load the state and balloon of all domains with one getAllDomainStats call, the domains updated by events
+        during loading are not overwritten
+        """
+        with self._cond:
+            seq = self._seq
+
+        domains = {}
+        try:
+            flags = libvirt.VIR_DOMAIN_STATS_STATE | libvirt.VIR_DOMAIN_STATS_BALLOON
+            for dom, stats in conn.getAllDomainStats(flags):
+                domains[dom.name()] = {"uuid": dom.UUIDString(), "state": stats.get("state.state"),
+                                       "balloon": stats.get("balloon.current")}
+        except (AttributeError, libvirtError) as error:
+            log.debug("getAllDomainStats is not supported, load states one by one: %s", error)
+            for dom in conn.listAllDomains():
+                domains[dom.name()] = {"uuid": dom.UUIDString(), "state": dom.state()[0], "balloon": None}
+
+        with self._cond:
+            for name, record in domains.items():
+                if self._domains.get(name, {}).get("seq", 0) > seq:
+                    continue
+                record["seq"] = seq
+                self._domains[name] = record
+            for name in self._domains.keys():
+                if name not in domains and self._domains[name]["seq"] <= seq:
+                    del self._domains[name]
+            self.loaded = True
+            self._cond.notify_all()
+
+    def update(self, name, uuid, event, **fields):
+        """
+        :param event: the event name passed to subscribers, such as "lifecycle", "device_added"
+        :param fields: the fields in record to change, state=None removes the domain
+        """
+        with self._cond:
+            self._seq += 1
+            if "state" in fields and fields["state"] is None:
+                self._domains.pop(name, None)
+                record = {"uuid": uuid, "state": None, "balloon": None, "seq": self._seq}
+            else:
+                record = self._domains.setdefault(name, {"uuid": uuid, "state": None, "balloon": None})
+                record.update(fields)
+                record["uuid"] = uuid
+                record["seq"] = self._seq
+                record = dict(record)
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(name, event, record)
+            except Exception as error:
+                log.exception("Exception in domain event subscriber %s: %s", callback, error)
+
+    def get_state(self, name):
+        """
+        :return: the libvirt domain state, None if domain not found
+        """
+        with self._cond:
+            return self._domains.get(name, {}).get("state", None)
+
+    def get_domains(self):
+        """
+        :return: a copy of all the domain records
+        """
+        with self._cond:
+            return dict((name, dict(record)) for name, record in self._domains.items())
+
+    def subscribe(self, callback):
+        """
+        :param callback: function(name, event, record), called in the event loop thread, it should return quickly
+        """
+        with self._cond:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._cond:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def wait_for_state(self, name, states, timeout):
+        """
+        :param states: a list of libvirt domain states
+        :param timeout: seconds to wait, or less if current deadline is earlier
+        :return: True when the domain is in one of states, False if timeout or the inventory is no longer live
+        """
+        expire_at = time.time() + Deadline.clip(timeout)
+        with self._cond:
+            while True:
+                if self._domains.get(name, {}).get("state", None) in states:
+                    return True
+                remaining = expire_at - time.time()
+                if remaining <= 0 or not self.live:
+                    return False
+                self._cond.wait(remaining)
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_event_inventory(key):
+    """
+    :param key: the cache_key of driver, (platform, host, user)
+    :return: the domain event inventory shared by the drivers with same key
+    """
+    with _inventories_lock:
+        if key not in _inventories:
+            _inventories[key] = DomainEventInventory()
+        return _inventories[key]
+
+
+def _on_lifecycle(conn, dom, event, detail, opaque):
+    """
+    started, stopped, defined, undefined, etc; the live XML changes on them
+    """
+    get_domain_xml_cache(opaque).invalidate(uuid=dom.UUIDString())
+    if event == libvirt.VIR_DOMAIN_EVENT_UNDEFINED:
+        get_event_inventory(opaque).update(dom.name(), dom.UUIDString(), "lifecycle", state=None)
+    elif event in _event_states:
+        get_event_inventory(opaque).update(dom.name(), dom.UUIDString(), "lifecycle", state=_event_states[event])
+    elif event == libvirt.VIR_DOMAIN_EVENT_DEFINED:
+        inventory = get_event_inventory(opaque)
+        # a new domain is shut off, the state of a known one is not changed when redefined
+        if inventory.loaded and inventory.get_state(dom.name()) is None:
+            inventory.update(dom.name(), dom.UUIDString(), "lifecycle", state=libvirt.VIR_DOMAIN_SHUTOFF)
+
+
+def _on_device_added(conn, dom, dev_alias, opaque):
+    get_domain_xml_cache(opaque).invalidate(uuid=dom.UUIDString())
+    get_event_inventory(opaque).update(dom.name(), dom.UUIDString(), "device_added")
+
+
+def _on_device_removed(conn, dom, dev_alias, opaque):
+    get_domain_xml_cache(opaque).invalidate(uuid=dom.UUIDString())
+    get_event_inventory(opaque).update(dom.name(), dom.UUIDString(), "device_removed")
+
+
+def _on_balloon_change(conn, dom, actual, opaque):
+    get_domain_xml_cache(opaque).invalidate(uuid=dom.UUIDString())
+    get_event_inventory(opaque).update(dom.name(), dom.UUIDString(), "balloon_change", balloon=actual)
+
+
+def _on_connection_closed(conn, reason, opaque):
+    """
+    the events of conn stop, the inventory is not live when no other connection to the host feeds it
+    """
+    log.debug("Connection closed with reason %s, the domain events stop.", reason)
+    with _registrations_lock:
+        registration = _registrations.get(id(conn), None)
+        # a connection deregistered already, or closed before
+        if registration is None or not registration["open"]:
+            return
+        registration["open"] = False
+        _stop_if_last(opaque)
+
+
+DOMAIN_EVENT_CALLBACKS = [("VIR_DOMAIN_EVENT_ID_LIFECYCLE", _on_lifecycle),
+                          ("VIR_DOMAIN_EVENT_ID_DEVICE_ADDED", _on_device_added),
+                          ("VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED", _on_device_removed),
+                          ("VIR_DOMAIN_EVENT_ID_BALLOON_CHANGE", _on_balloon_change)]
+
+
+# {id(conn): {"key": key, "callback_ids": [...], "open": True}} of the connections with the domain events registered,
+# the connections to a host with any password share the key
+_registrations = {}
+_registrations_lock = threading.Lock()
+
+
+def _stop_if_last(key):
+    """
+    the inventory of key is not live when no open connection has its events registered, called with
+    _registrations_lock after a connection is closed or deregistered
+    """
+    if not any(registration["key"] == key and registration["open"] for registration in _registrations.values()):
+        get_event_inventory(key).set_live(False)
+
+
+def register_domain_events(conn, key):
+    """
+    :param conn: the libvirt connection
+    :param key: the cache_key of driver, passed to the callbacks to find the cache and inventory
+    :return: a list of callback ids registered, they are deregistered by close_connection
+    """
+    callback_ids = []
+    if _loop_thread is None:
+        return callback_ids
+
+    for event_name, callback in DOMAIN_EVENT_CALLBACKS:
+        # device added event is not in the old libvirt
+        event_id = getattr(libvirt, event_name, None)
+        if event_id is None:
+            continue
+        try:
+            callback_ids.append(conn.domainEventRegisterAny(None, event_id, callback, key))
+        except libvirtError as error:
+            log.debug("Can not register domain event %s: %s", event_name, error)
+
+    if callback_ids:
+        try:
+            conn.registerCloseCallback(_on_connection_closed, key)
+        except (AttributeError, libvirtError) as error:
+            log.debug("Can not register connection close callback: %s", error)
+        with _registrations_lock:
+            _registrations[id(conn)] = {"key": key, "callback_ids": callback_ids, "open": True}
+            # the lifecycle events are there, the inventory will be loaded on next use
+            get_event_inventory(key).set_live(True)
+
+    return callback_ids
+
+
+def deregister_domain_events(conn):
+    """
+    deregister the callbacks of conn, they hold a reference on the connection which is never freed otherwise. The
+    inventory is not live any more when conn is the last connection to the host with the events registered.
+    """
+    with _registrations_lock:
+        registration = _registrations.pop(id(conn), None)
+        if registration is None:
+            return
+        _stop_if_last(registration["key"])
+
+    for callback_id in registration["callback_ids"]:
+        try:
+            conn.domainEventDeregisterAny(callback_id)
+        except libvirtError as error:
+            log.debug("Can not deregister domain event %s: %s", callback_id, error)
+    try:
+        conn.unregisterCloseCallback()
+    except (AttributeError, libvirtError) as error:
+        log.debug("Can not unregister connection close callback: %s", error)
+
+
+def close_connection(conn):
+    """
+    close a libvirt connection opened by the drivers, with its domain events deregistered
+    """
+    deregister_domain_events(conn)
+    conn.close()
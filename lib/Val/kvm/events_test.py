@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: events_test.py
+ Author: longhui
+ Created Time: 2026-10-18 16:24:37
+'''
+import threading
+import unittest
+
+import libvirt
+
+from lib.Val.kvm import events
+from lib.Val.kvm.events import DomainEventInventory, close_connection, get_event_inventory, register_domain_events
+
+
+class FakeDomain(object):
+
+    def __init__(self, name, uuid):
+        self._name = name
+        self._uuid = uuid
+
+    def name(self):
+        return self._name
+
+    def UUIDString(self):
+        return self._uuid
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.callbacks = {}
+        self.closed = False
+
+    def domainEventRegisterAny(self, dom, event_id, callback, opaque):
+        callback_id = len(self.callbacks) + 1
+        self.callbacks[callback_id] = callback
+        return callback_id
+
+    def domainEventDeregisterAny(self, callback_id):
+        del self.callbacks[callback_id]
+
+    def registerCloseCallback(self, callback, opaque):
+        self.callbacks["close"] = callback
+
+    def unregisterCloseCallback(self):
+        del self.callbacks["close"]
+
+    def close(self):
+        self.closed = True
+
+    def getAllDomainStats(self, flags):
+        return [(FakeDomain("vm1", "uuid-1"), {"state.state": libvirt.VIR_DOMAIN_SHUTOFF}),
+                (FakeDomain("vm2", "uuid-2"), {"state.state": libvirt.VIR_DOMAIN_RUNNING, "balloon.current": 1024})]
+
+
+class DomainEventInventoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.inventory = DomainEventInventory()
+        self.inventory.set_live(True)
+        self.inventory.load(FakeConnection())
+
+    def test_load_and_update(self):
+        self.assertEqual(self.inventory.get_state("vm1"), libvirt.VIR_DOMAIN_SHUTOFF)
+        self.assertEqual(self.inventory.get_domains()["vm2"]["balloon"], 1024)
+
+        events = []
+        self.inventory.subscribe(lambda name, event, record: events.append((name, event, record["state"])))
+        self.inventory.update("vm1", "uuid-1", "lifecycle", state=libvirt.VIR_DOMAIN_RUNNING)
+        self.inventory.update("vm2", "uuid-2", "lifecycle", state=None)
+        self.assertEqual(events, [("vm1", "lifecycle", libvirt.VIR_DOMAIN_RUNNING), ("vm2", "lifecycle", None)])
+        self.assertFalse("vm2" in self.inventory.get_domains())
+
+        # the newer state from event is kept when loaded again
+        self.inventory.load(FakeConnection())
+        self.assertEqual(self.inventory.get_state("vm1"), libvirt.VIR_DOMAIN_SHUTOFF)
+
+    def test_wait_for_state(self):
+        self.assertTrue(self.inventory.wait_for_state("vm2", [libvirt.VIR_DOMAIN_RUNNING], 0))
+        self.assertFalse(self.inventory.wait_for_state("vm1", [libvirt.VIR_DOMAIN_RUNNING], 0.05))
+
+        timer = threading.Timer(0.05, self.inventory.update, ("vm1", "uuid-1", "lifecycle"),
+                                {"state": libvirt.VIR_DOMAIN_RUNNING})
+        timer.start()
+        self.assertTrue(self.inventory.wait_for_state("vm1", [libvirt.VIR_DOMAIN_RUNNING], 5))
+        timer.join()
+
+        # the waiter is woken up when the events stop
+        threading.Timer(0.05, self.inventory.set_live, (False,)).start()
+        self.assertFalse(self.inventory.wait_for_state("vm1", [libvirt.VIR_DOMAIN_SHUTOFF], 5))
+
+
+class DomainEventRegistrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop_thread = events._loop_thread
+        events._loop_thread = threading.current_thread()
+
+    def tearDown(self):
+        events._loop_thread = self.loop_thread
+
+    def test_close_connection(self):
+        key = ("kvm", "10.0.0.1", "root")
+        conn = FakeConnection()
+        self.assertTrue(register_domain_events(conn, key))
+        self.assertTrue(get_event_inventory(key).live)
+        close_connection(conn)
+        # the callbacks holding the connection are deregistered before close
+        self.assertEqual(conn.callbacks, {})
+        self.assertTrue(conn.closed)
+        self.assertFalse(get_event_inventory(key).live)
+        # a connection without events is just closed
+        other = FakeConnection()
+        close_connection(other)
+        self.assertTrue(other.closed)
+
+    def test_two_connections(self):
+        key = ("kvm", "10.0.0.2", "root")
+        old, new = FakeConnection(), FakeConnection()
+        register_domain_events(old, key)
+        register_domain_events(new, key)
+        # the connection replaced in pool is closed later, the new one still feeds the inventory
+        events._on_connection_closed(old, 0, key)
+        self.assertTrue(get_event_inventory(key).live)
+        close_connection(old)
+        self.assertTrue(get_event_inventory(key).live)
+        # a connection not registered any more is ignored
+        events._on_connection_closed(old, 0, key)
+        self.assertTrue(get_event_inventory(key).live)
+        events._on_connection_closed(new, 0, key)
+        self.assertFalse(get_event_inventory(key).live)
+        close_connection(new)
+        self.assertFalse(get_event_inventory(key).live)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,14 +8,19 @@
 #########################################################################
 
 import os
-import signal
 import xml.etree.ElementTree as xmlEtree
 
 import libvirt
 from libvirt import libvirtError
 
 from lib.Log.log import log
-from lib.Val.virt_driver import VirtDriver
+from lib.Utils.constans import HYPERVISOR_CONNECT_TIMEOUT, POWER_STATE_TIMEOUT
+from lib.Utils.signal_utils import Deadline, run_with_timeout
+from lib.Val.inventory_cache import cached_inventory, invalidates_inventory, STORAGES, TEMPLATES, VM_LIST
+from lib.Val.kvm.domain_xml_cache import get_domain_xml_cache, invalidates_domain_xml
+from lib.Val.kvm.events import close_connection, get_event_inventory, register_domain_events, start_event_loop
+from lib.Val.transport_cache import connect_by_transports
+from lib.Val.virt_driver import VirtDriver, POWER_HALTED, POWER_PAUSED, POWER_RUNNING, POWER_SUSPENDED
 
 
 # power state: libvirt.
@@ -37,8 +42,22 @@ DOMAIN_INFO_MEM = 2
 DOMAIN_INFO_CPUS = 3
 DOMAIN_INFO_CPU_TIME = 4
 
+# libvirt domain state to power state, shutdown is treated as halted the same as is_instance_halted
+LIBVIRT_POWER_STATES = {libvirt.VIR_DOMAIN_RUNNING: POWER_RUNNING,
+                        libvirt.VIR_DOMAIN_BLOCKED: POWER_RUNNING,
+                        libvirt.VIR_DOMAIN_PAUSED: POWER_PAUSED,
+                        libvirt.VIR_DOMAIN_SHUTDOWN: POWER_HALTED,
+                        libvirt.VIR_DOMAIN_SHUTOFF: POWER_HALTED,
+                        libvirt.VIR_DOMAIN_CRASHED: POWER_HALTED,
+                        libvirt.VIR_DOMAIN_PMSUSPENDED: POWER_SUSPENDED}
+
+# the stats fetched by getAllDomainStats
+DOMAIN_STATS = ["STATE", "BALLOON", "VCPU", "BLOCK", "INTERFACE"]
+
 # qemu:///session is for non-root user
 DEFAULT_HV = "qemu:///session"
+# remote transports in default trying order
+LIBVIRT_TRANSPORTS = ["qemu+tls", "qemu+tcp"]
 
 HV_EXE_SUCCESS = 0
 HV_EXE_ERROR = -1
@@ -52,8 +71,12 @@ class QemuVirtDriver(VirtDriver):
     derived class of VirtDriver
     '''
 
-    def __init__(self, hostname=None, user=None, passwd=None):
-        VirtDriver.__init__(self, hostname, user, passwd)
+    platform = "KVM"
+    # libvirt connection is thread safe
+    thread_safe = True
+
+    def __init__(self, hostname=None, user=None, passwd=None, pool=None):
+        VirtDriver.__init__(self, hostname, user, passwd, pool)
 
         self._auth = [[libvirt.VIR_CRED_AUTHNAME, libvirt.VIR_CRED_PASSPHRASE], self._request_cred, None]
         # conn = libvirt.open(name) need root username
@@ -76,9 +99,8 @@ class QemuVirtDriver(VirtDriver):
     def __del__(self):
 
         if self._hypervisor_handler:
-            log.debug("try to close the connect to libvirt: %s", self.hostname)
-            self._hypervisor_handler.close()
-        self._hypervisor_handler = None
+            log.debug("try to release the connect to libvirt: %s", self.hostname)
+        self._release_handler()
 
     def _get_root_handler(self):
         """
@@ -91,24 +113,8 @@ class QemuVirtDriver(VirtDriver):
             hostname = "localhost"
         else:
             hostname = self.hostname
-        url = "{0}{1}{2}".format('qemu+tls://', hostname, '/system')
-        old = signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(4)  # connetctions timeout set to 4 secs
-        try:
-            self._hypervisor_root_handler = libvirt.openAuth(url, self._auth, 0)
-        except Exception as error:
-            log.debug("Can not connect to %s, error: %s. Retrying...", url, error)
-            url = "{0}{1}{2}".format('qemu+tcp://', hostname, '/system')
-            signal.alarm(4)
-            try:
-                self._hypervisor_root_handler = libvirt.openAuth(url, self._auth, 0)
-            except Exception as error:
-                log.error("Can not connect to url:%s, error: %s", url, error)
-                return None
-
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old)
+        self._hypervisor_root_handler = connect_by_transports(self.platform, hostname, LIBVIRT_TRANSPORTS,
+                                                              lambda scheme: self._open_auth(scheme, hostname))
 
         if self._hypervisor_root_handler:
             return self._hypervisor_root_handler
@@ -123,39 +129,64 @@ class QemuVirtDriver(VirtDriver):
             self._hypervisor_root_handler.close()
         self._hypervisor_root_handler = None
 
-    def get_handler(self):
-        '''
-        return the handler of the virt_driver
-        '''
-        if self._hypervisor_handler:
-            return self._hypervisor_handler
+    @staticmethod
+    def _is_handler_alive(handler):
+        return handler.isAlive() == 1
 
-        old = signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(4)  # connetctions timeout set to 4 secs
+    @staticmethod
+    def _close_handler(handler):
+        close_connection(handler)
 
-        try:
-            if self.hostname is None:
-                url = DEFAULT_HV
-                self._hypervisor_handler = libvirt.open(url)
-            else:
-                url = "{0}{1}{2}".format('qemu+tls://', self.hostname, '/system')
-                self._hypervisor_handler = libvirt.openAuth(url, self._auth, 0)
-        except Exception as error:
-            log.debug("Can not connect to url: %s, error: %s. Retrying...", url, error)
-            signal.alarm(4)
+    def _open_auth(self, scheme, hostname):
+        """
+        :param scheme: qemu+tls or qemu+tcp
+        """
+        url = "{0}://{1}{2}".format(scheme, hostname, '/system')
+        return run_with_timeout(libvirt.openAuth, HYPERVISOR_CONNECT_TIMEOUT, (url, self._auth, 0),
+                                on_abandon=self._close_handler)
+
+    def _connect(self):
+        """
+        open a new connection to libvirt, try the transport last succeed first, default tls and then tcp
+        :return: the connection or None
+        """
+        # the events are delivered only on the connections opened after the event loop
+        start_event_loop()
+        if self.hostname is None:
             try:
-                url = "{0}{1}{2}".format('qemu+tcp://', self.hostname, '/system')
-                self._hypervisor_handler = libvirt.openAuth(url, self._auth, 0)
+                conn = run_with_timeout(libvirt.open, HYPERVISOR_CONNECT_TIMEOUT, (DEFAULT_HV,),
+                                        on_abandon=self._close_handler)
             except Exception as error:
-                log.error("Can not connect to url: %s, error: %s ", url, error)
+                log.error("Can not connect to url: %s, error: %s ", DEFAULT_HV, error)
                 return None
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old)
+        else:
+            conn = connect_by_transports(self.platform, self.hostname, LIBVIRT_TRANSPORTS,
+                                         lambda scheme: self._open_auth(scheme, self.hostname))
 
-        if not self._hypervisor_handler:
+        if conn:
+            register_domain_events(conn, self.cache_key)
+        return conn
+
+    def get_domain_inventory(self):
+        """
+        the states of domains kept by the lifecycle events, load it from host at the first time
+        :return: DomainEventInventory, None if the events are not delivered on the connection
+        """
+        inventory = get_event_inventory(self.cache_key)
+        if not inventory.live or not self.get_handler():
             return None
+        if not inventory.loaded:
+            inventory.load(self.get_handler())
+        return inventory
+
+    def get_handler(self):
+        '''
+        return the handler of the virt_driver
+        '''
+        if self._hypervisor_handler:
+            return self._hypervisor_handler
 
+        self._hypervisor_handler = self._acquire_handler()
         return self._hypervisor_handler
 
     def delete_handler(self):
@@ -163,9 +194,7 @@ class QemuVirtDriver(VirtDriver):
          close the connect to host
         :return:
         """
-        if self._hypervisor_handler:
-            self._hypervisor_handler.close()
-        self._hypervisor_handler = None
+        self._release_handler()
 
     def _get_domain_handler(self, domain_name=None, domain_id=None):
         """
@@ -192,6 +221,14 @@ class QemuVirtDriver(VirtDriver):
             log.exception(str(e))
             return None
 
+    def _get_domain_tree(self, domain, inactive=False):
+        """
+        the parsed XML description is cached, it should be read only
+        :param inactive: True for the persistent config, False for the live one
+        :return: root element of domain XML
+        """
+        return get_domain_xml_cache(self.cache_key).get_tree(domain, inactive)
+
     def is_instance_exists(self, inst_name):
         '''
         instance
@@ -236,6 +273,7 @@ class QemuVirtDriver(VirtDriver):
             log.warn("Exception raise when get_target_path_via_file, error: %s", error)
             return "", None
 
+    @invalidates_inventory(VM_LIST, TEMPLATES)
     def create_instance(self, vm_name, reference_vm, storage_pool=None):
         """
         :param vm_name: new vm name
@@ -295,6 +333,8 @@ class QemuVirtDriver(VirtDriver):
 
         return True
 
+    @invalidates_inventory(VM_LIST, TEMPLATES)
+    @invalidates_domain_xml
     def delete_instance(self, inst_name, delete_disk=False):
         '''
         undefine:If the domain is running, it's converted to transient domain, without stopping it.
@@ -324,6 +364,8 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
+    @invalidates_inventory(TEMPLATES)
+    @invalidates_domain_xml
     def power_off_vm(self, inst_name):
         """
         current we do not consider the power states
@@ -348,6 +390,8 @@ class QemuVirtDriver(VirtDriver):
             log.exception(e)
             return False
 
+    @invalidates_inventory(TEMPLATES)
+    @invalidates_domain_xml
     def power_on_vm(self, inst_name):
         '''
         domain.create() will power on it
@@ -377,6 +421,7 @@ class QemuVirtDriver(VirtDriver):
         else:
             return None
 
+    @invalidates_domain_xml
     def reboot(self, inst_name):
         '''
         refactor
@@ -405,15 +450,141 @@ class QemuVirtDriver(VirtDriver):
             return True
         return False
 
+    def _get_power_state(self, inst_name):
+        """
+        :return: the power state of the domain, None if it doesn't exist
+        """
+        try:
+            state = self.get_handler().lookupByName(inst_name).state()[0]
+        except libvirtError:
+            return None
+        return LIBVIRT_POWER_STATES.get(state, None)
+
+    def wait_for_state(self, inst_name, states, timeout=POWER_STATE_TIMEOUT):
+        """
+        wait on the lifecycle events, poll the power state when the events are not delivered
+        """
+        with Deadline(timeout):
+            inventory = self.get_domain_inventory()
+            if inventory is not None:
+                domain_states = [state for state, power_state in LIBVIRT_POWER_STATES.items() if power_state in states]
+                if inventory.wait_for_state(inst_name, domain_states, timeout):
+                    return True
+                if inventory.live:
+                    return False
+                log.debug("Domain events stop, poll the power state of %s.", inst_name)
+            return VirtDriver.wait_for_state(self, inst_name, states, timeout)
+
     def get_active_vms(self):
         '''
-        The method for listing active domain names:listDomainsID
+        The method for listing active domain names:listAllDomains with active flag
         '''
         hv_hander = self.get_handler()
-        id_list = hv_hander.listDomainsID()
-        domans_list = [hv_hander.lookupByID(domain_id) for domain_id in id_list]
-        return [dom.name() for dom in domans_list]
+        return [dom.name() for dom in hv_hander.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE)]
+
+    @staticmethod
+    def __stats_from_info(dom):
+        """
+        build the same stats as getAllDomainStats from dom.info(), when libvirt is too old to support it
+        """
+        stats = dom.info()
+        return {"state.state": stats[DOMAIN_INFO_STATE],
+                "balloon.current": stats[DOMAIN_INFO_MEM],
+                "balloon.maximum": stats[DOMAIN_INFO_MAX_MEM],
+                "vcpu.current": stats[DOMAIN_INFO_CPUS]}
+
+    def get_all_domain_stats(self, active_only=False):
+        """
+        fetch state, memory, vcpu, block and interface stats of all domains with one getAllDomainStats call
+        :param active_only: only the running domains
+        :return: a dict with domain name as key, and value is a dict:
+        {"id": , "uuid": , "state": , "memory_current": GB, "memory_max": GB, "vcpu_current": , "vcpu_max": ,
+         "block": {"vda": {"path": , "capacity": GB, "allocation": GB}}, "interface": {"vnet0": {"rx.bytes": , ...}}}
+        "block" is None if not supported by libvirt, and "capacity" is None if not reported for the disk
+        """
+        hv_handler = self.get_handler()
+        if not hv_handler:
+            log.error("cannot find the connection to qemu")
+            return {}
 
+        flags = libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE if active_only else 0
+        stats_types = 0
+        for stats_name in DOMAIN_STATS:
+            stats_types |= getattr(libvirt, "VIR_DOMAIN_STATS_" + stats_name, 0)
+        try:
+            all_stats = hv_handler.getAllDomainStats(stats_types, flags)
+        except (AttributeError, libvirtError) as error:
+            log.debug("getAllDomainStats is not supported: %s, fall back to domain info.", error)
+            list_flags = libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE if active_only else 0
+            all_stats = [(dom, self.__stats_from_info(dom)) for dom in hv_handler.listAllDomains(list_flags)]
+
+        GB = 1024.0 * 1024.0 * 1024.0
+        domain_stats = {}
+        for dom, stats in all_stats:
+            # name, ID and UUID are cached in the domain object, no more calls to libvirtd
+            record = {"id": dom.ID(),
+                      "uuid": dom.UUIDString(),
+                      "state": stats.get("state.state", libvirt.VIR_DOMAIN_NOSTATE),
+                      "memory_current": float("%.3f" % (stats.get("balloon.current", 0) / 1024.0 / 1024.0)),
+                      "memory_max": float("%.3f" % (stats.get("balloon.maximum", 0) / 1024.0 / 1024.0)),
+                      "vcpu_current": stats.get("vcpu.current", 0),
+                      "vcpu_max": stats.get("vcpu.maximum", stats.get("vcpu.current", 0)),
+                      "block": None if "block.count" not in stats else {},
+                      "interface": {}}
+            for index in range(stats.get("block.count", 0)):
+                prefix = "block.%d." % index
+                capacity, allocation = stats.get(prefix + "capacity", None), stats.get(prefix + "allocation", 0)
+                record["block"][stats.get(prefix + "name")] = {
+                    "path": stats.get(prefix + "path", None),
+                    "capacity": capacity / GB if capacity is not None else None,
+                    "allocation": allocation / GB}
+            for index in range(stats.get("net.count", 0)):
+                prefix = "net.%d." % index
+                record["interface"][stats.get(prefix + "name")] = dict(
+                    (key[len(prefix):], value) for key, value in stats.items() if key.startswith(prefix))
+            domain_stats[dom.name()] = record
+
+        return domain_stats
+
+    def get_all_vm_records(self):
+        """
+        return the records of all the VMs from one getAllDomainStats call
+        :return: {vm_name: record same as get_vm_record, with the 'disk_info' same as get_all_disk}
+        """
+        all_records = {}
+        for inst_name, stats in self.get_all_domain_stats().items():
+            if "template" in str.lower(inst_name):
+                continue
+            vm_record = {'VCPUs_max': stats['vcpu_max'],
+                         'VCPUs_live': stats['vcpu_current'],
+                         'domid': stats['id'],
+                         'uuid': stats['uuid'],
+                         'name_label': inst_name,
+                         'memory_dynamic_max': stats['memory_max'],
+                         'memory_dynamic_min': None,
+                         'memory_static_max': stats['memory_max'],
+                         'memory_static_min': None,
+                         'memory_target': stats['memory_current'],
+                         'memory_actual': stats['memory_current'],
+                         'running': stats['state'] == libvirt.VIR_DOMAIN_RUNNING,
+                         'halted': stats['state'] in (libvirt.VIR_DOMAIN_SHUTDOWN, libvirt.VIR_DOMAIN_SHUTOFF)}
+
+            # block stats have no device type, the cdrom is the one without source or with an iso image
+            disks = [(device_name, block) for device_name, block in (stats['block'] or {}).items()
+                     if block['path'] and not block['path'].lower().endswith(".iso")]
+            # without the sizes, the caller has to get_all_disk by itself
+            if stats['block'] is not None and all(block['capacity'] is not None for _, block in disks):
+                disk_info = {}
+                for disk_num, (device_name, block) in enumerate(sorted(disks)):
+                    disk_info[disk_num] = {'disk_size': block['capacity'], 'device_name': device_name,
+                                           'disk_free': float("%.3f" % (block['capacity'] - block['allocation']))}
+                vm_record['disk_info'] = disk_info
+
+            all_records[inst_name] = vm_record
+
+        return all_records
+
+    @cached_inventory(VM_LIST)
     def get_vm_list(self):
         """
         Return the VMs from system
@@ -495,6 +666,7 @@ class QemuVirtDriver(VirtDriver):
 
         return ret_cpu_dict
 
+    @cached_inventory(STORAGES)
     def get_host_all_storages(self):
         """
         return a list of all the storage names
@@ -573,17 +745,24 @@ class QemuVirtDriver(VirtDriver):
         """
         :return: return the memorys allocated to vms in logic
         """
+        return self.get_all_allocated_resources()['memory']
+
+    def get_all_allocated_resources(self):
+        """
+        the memory and vcpus allocated to the running vms, from one getAllDomainStats call
+        :return: {"memory": GB, "vcpus": number of vcpus}
+        """
         hv_handler = self.get_handler()
 
-        total_mem = 0
-        id_list = hv_handler.listDomainsID()
-        domans_list = [hv_handler.lookupByID(domain_id) for domain_id in id_list]
-        for dom in domans_list:
-            stats = dom.info()
-            allocated_mem = float("%.3f" % (stats[DOMAIN_INFO_MEM] / 1024.0 / 1024.0))
-            total_mem += allocated_mem
+        if not hv_handler:
+            return {"memory": 0, "vcpus": 0}
+
+        total_mem, total_vcpus = 0, 0
+        for stats in self.get_all_domain_stats(active_only=True).values():
+            total_mem += stats['memory_current']
+            total_vcpus += stats['vcpu_current']
 
-        return total_mem
+        return {"memory": total_mem, "vcpus": total_vcpus}
 
     def get_host_phymem(self):
         """
@@ -647,6 +826,7 @@ class QemuVirtDriver(VirtDriver):
         else:
             return "QEMU"
 
+    @cached_inventory(TEMPLATES)
     def get_templates_list(self):
         """
         :description get all the templates on host
@@ -728,7 +908,7 @@ class QemuVirtDriver(VirtDriver):
             log.error("Domain %s doesn't exist, can not get interfaces information.", inst_name)
             return []
 
-        tree = xmlEtree.fromstring(domain.XMLDesc(libvirt.VIR_DOMAIN_XML_INACTIVE))
+        tree = self._get_domain_tree(domain, inactive=True)
         disk_list = tree.findall("devices/disk[@device='disk']")
         for disk in disk_list:
             device_name = disk.find('target').get('dev')
@@ -792,6 +972,7 @@ class QemuVirtDriver(VirtDriver):
             return False
         return True
 
+    @invalidates_inventory(STORAGES)
     def add_vdisk_to_vm(self, inst_name, storage_name, size, disk_type="qcow2"):
         """
         @param inst_name: the name of VM
@@ -844,6 +1025,7 @@ class QemuVirtDriver(VirtDriver):
 
         return self.attach_disk_to_domain(inst_name, target_vol_path, disk_type)
 
+    @invalidates_inventory(STORAGES)
     def clone_disk_in_pool(self, source_file_path, target_disk_name, different_pool=None):
         """
         :param source_file_path:
@@ -883,6 +1065,8 @@ class QemuVirtDriver(VirtDriver):
         new_vol = pool.createXMLFrom(vol_clone_xml, vol, 0)  # only (name, perms) are passed for a new volume
         return new_vol
 
+    @invalidates_inventory(STORAGES)
+    @invalidates_domain_xml
     def attach_disk_to_domain(self, inst_name, target_volume, disk_type):
         """
         add disk in xml definition
@@ -893,8 +1077,7 @@ class QemuVirtDriver(VirtDriver):
         dom = self._get_domain_handler(domain_name=inst_name)
         if dom is None:
             return False
-        xmlstr = dom.XMLDesc(libvirt.VIR_DOMAIN_XML_INACTIVE)
-        tree = xmlEtree.fromstring(xmlstr)
+        tree = self._get_domain_tree(dom, inactive=True)
         device_elment = tree.find("devices")
         target_dev = [target.get("dev") for target in device_elment.findall("disk[@device='disk']/target")]
 
@@ -907,9 +1090,6 @@ class QemuVirtDriver(VirtDriver):
             <source file='%s'/> 
             <target dev='%s' bus='virtio'/>
         </disk>""" % (disk_type, target_volume, dev)
-        disk_elment = xmlEtree.fromstring(disk_xml_str)
-        device_elment.append(disk_elment)
-
         try:
             if dom.isActive():
                 ret = dom.attachDeviceFlags(disk_xml_str,
@@ -922,6 +1102,8 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
+    @invalidates_inventory(STORAGES)
+    @invalidates_domain_xml
     def detach_disk_from_domain(self, inst_name, target_volume=None, force=False):
         """
         deactivate volume from pool, if force is True, physically remove the volume
@@ -935,8 +1117,7 @@ class QemuVirtDriver(VirtDriver):
             log.error("No domain named %s.", inst_name)
             return False
 
-        xmlstr = dom.XMLDesc()
-        tree = xmlEtree.fromstring(xmlstr)
+        tree = self._get_domain_tree(dom)
         device_elment = tree.find("devices")
         disk_list = device_elment.findall("disk[@device='disk']")
         ret = None
@@ -1029,6 +1210,7 @@ class QemuVirtDriver(VirtDriver):
         """
         return True
 
+    @invalidates_domain_xml
     def set_vm_vcpu_live(self, inst_name, vcpu_num):
         """
         set the vcpu numbers for a running VM; and set vcpus in the config file when domain is deactive
@@ -1057,6 +1239,7 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
+    @invalidates_domain_xml
     def set_vm_vcpu_max(self, inst_name, vcpu_num):
         """
         set the vcpu numbers for a halted VM; when vm is active, the setting will take effect when next reboot
@@ -1080,13 +1263,12 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
-    def __get_vcpu_from_xml(self, xml_str):
+    def __get_vcpu_from_xml(self, xmltree):
         """
         if no current vcpus in xml, return max vcpus as current vcpus
-        :param xml_str:
+        :param xmltree: root element of domain XML
         :return: (max vcpus, current vcpus)
         """
-        xmltree = xmlEtree.fromstring(xml_str)
         vcpu = xmltree.find('vcpu')
         if vcpu is None:
             log.error("No vcpu element found in XML description.")
@@ -1107,7 +1289,7 @@ class QemuVirtDriver(VirtDriver):
         if dom is None:
             return 0
 
-        _, current_vcpu = self.__get_vcpu_from_xml(dom.XMLDesc())
+        _, current_vcpu = self.__get_vcpu_from_xml(self._get_domain_tree(dom))
         return current_vcpu
 
     def get_vm_vcpu_max(self, inst_name):
@@ -1119,7 +1301,7 @@ class QemuVirtDriver(VirtDriver):
         if dom is None:
             return 0
         if not dom.isActive():
-            return self.__get_vcpu_from_xml(dom.XMLDesc())[0]
+            return self.__get_vcpu_from_xml(self._get_domain_tree(dom))[0]
         else:
             return dom.maxVcpus()
 
@@ -1139,6 +1321,7 @@ class QemuVirtDriver(VirtDriver):
 
         return (hostname, hostname)
 
+    @invalidates_domain_xml
     def set_vm_static_memory(self, inst_name, memory_max=None, memory_min=None):
         """
         set memory for a inactive domain
@@ -1173,6 +1356,7 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
+    @invalidates_domain_xml
     def set_vm_dynamic_memory(self, inst_name, memory_max=None, memory_min=None):
         """
         set memory for a domain, if it is active, set it lively and the config file, if it is deactive, set the config file
@@ -1204,6 +1388,7 @@ class QemuVirtDriver(VirtDriver):
 
         return ret == 0
 
+    @invalidates_domain_xml
     def set_vm_memory_live(self, inst_name, memory_target):
         """
         :param memory_target: Memory in GB
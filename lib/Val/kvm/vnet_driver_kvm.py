@@ -6,7 +6,6 @@
  Created Time: 2018-03-14 13:01:13
 '''
 
-import signal
 import xml.etree.ElementTree as xmlEtree
 
 import libvirt
@@ -14,6 +13,13 @@ from ipaddress import IPv4Address
 from libvirt import libvirtError
 
 from lib.Log.log import log
+from lib.Utils.constans import HYPERVISOR_CONNECT_TIMEOUT
+from lib.Utils.signal_utils import run_with_timeout
+from lib.Val.kvm.domain_xml_cache import get_domain_xml_cache, invalidates_domain_xml
+from lib.Val.kvm.events import close_connection, register_domain_events, start_event_loop
+from lib.Val.kvm.virt_driver_kvm import LIBVIRT_TRANSPORTS
+from lib.Val.inventory_cache import cached_inventory, invalidates_inventory, BRIDGES, NETWORKS
+from lib.Val.transport_cache import connect_by_transports
 from lib.Val.vnet_driver import VnetDriver
 
 
@@ -22,8 +28,10 @@ DEFAULT_HV = "qemu:///session"
 
 class QemuVnetDriver(VnetDriver):
 
-    def __init__(self, hostname=None, user=None, passwd=None):
-        VnetDriver.__init__(self, hostname, user, passwd)
+    platform = "KVM"
+
+    def __init__(self, hostname=None, user=None, passwd=None, pool=None):
+        VnetDriver.__init__(self, hostname, user, passwd, pool)
 
         self._auth = [[libvirt.VIR_CRED_AUTHNAME, libvirt.VIR_CRED_PASSPHRASE], self._request_cred, None]
         # conn = libvirt.open(name) need root username
@@ -46,43 +54,55 @@ class QemuVnetDriver(VnetDriver):
     def __del__(self):
 
         if self._hypervisor_handler:
-            log.debug("try to close the connect to libvirt: %s", self.hostname)
-            self._hypervisor_handler.close()
-        self._hypervisor_handler = None
+            log.debug("try to release the connect to libvirt: %s", self.hostname)
+        self._release_handler()
 
-    def get_handler(self):
-        '''
-        return the handler of the virt_driver
-        '''
-        if self._hypervisor_handler:
-            return self._hypervisor_handler
+    @staticmethod
+    def _is_handler_alive(handler):
+        return handler.isAlive() == 1
 
-        old = signal.signal(signal.SIGALRM, self.timeout_handler)
-        signal.alarm(4)  # connetctions timeout set to 4 secs
+    @staticmethod
+    def _close_handler(handler):
+        close_connection(handler)
 
-        try:
-            if self.hostname is None:
-                url = DEFAULT_HV
-                self._hypervisor_handler = libvirt.open(url)
-            else:
-                url = "{0}{1}{2}".format('qemu+tls://', self.hostname, '/system')
-                self._hypervisor_handler = libvirt.openAuth(url, self._auth, 0)
-        except Exception as error:
-            log.debug("Can not connect to url: %s, error: %s. Retrying...", url, error)
-            signal.alarm(4)
+    def _open_auth(self, scheme, hostname):
+        """
+        :param scheme: qemu+tls or qemu+tcp
+        """
+        url = "{0}://{1}{2}".format(scheme, hostname, '/system')
+        return run_with_timeout(libvirt.openAuth, HYPERVISOR_CONNECT_TIMEOUT, (url, self._auth, 0),
+                                on_abandon=self._close_handler)
+
+    def _connect(self):
+        """
+        open a new connection to libvirt, try the transport last succeed first, default tls and then tcp
+        :return: the connection or None
+        """
+        # the events are delivered only on the connections opened after the event loop
+        start_event_loop()
+        if self.hostname is None:
             try:
-                url = "{0}{1}{2}".format('qemu+tcp://', self.hostname, '/system')
-                self._hypervisor_handler = libvirt.openAuth(url, self._auth, 0)
+                conn = run_with_timeout(libvirt.open, HYPERVISOR_CONNECT_TIMEOUT, (DEFAULT_HV,),
+                                        on_abandon=self._close_handler)
             except Exception as error:
-                log.error("Can not connect to url: %s, error: %s ", url, error)
+                log.error("Can not connect to url: %s, error: %s ", DEFAULT_HV, error)
                 return None
-        finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, old)
+        else:
+            conn = connect_by_transports(self.platform, self.hostname, LIBVIRT_TRANSPORTS,
+                                         lambda scheme: self._open_auth(scheme, self.hostname))
 
-        if not self._hypervisor_handler:
-            return None
+        if conn:
+            register_domain_events(conn, self.cache_key)
+        return conn
+
+    def get_handler(self):
+        '''
+        return the handler of the virt_driver
+        '''
+        if self._hypervisor_handler:
+            return self._hypervisor_handler
 
+        self._hypervisor_handler = self._acquire_handler()
         return self._hypervisor_handler
 
     def _get_domain_handler(self, domain_name=None, domain_id=None):
@@ -114,10 +134,9 @@ class QemuVnetDriver(VnetDriver):
          close the connect to host
         :return:
         """
-        if self._hypervisor_handler:
-            self._hypervisor_handler.close()
-        self._hypervisor_handler = None
+        self._release_handler()
 
+    @cached_inventory(BRIDGES)
     def get_bridge_list(self):
         """
         @return: return all the switch/bridge names on host
@@ -139,6 +158,7 @@ class QemuVnetDriver(VnetDriver):
 
         return bridge_name_list
 
+    @cached_inventory(NETWORKS)
     def get_network_list(self):
         """
         return all the switch/bridge/network on host
@@ -253,6 +273,7 @@ class QemuVnetDriver(VnetDriver):
         return default_infor
 
     # VM interface API
+    @invalidates_domain_xml
     def set_mac_address(self, inst_name, eth_index, new_mac):
         """
         <mac address='52:54:00:68:43:c2'/>
@@ -332,7 +353,7 @@ class QemuVnetDriver(VnetDriver):
             return []
 
         interface_dict = {}
-        tree = xmlEtree.fromstring(domain.XMLDesc(libvirt.VIR_DOMAIN_XML_INACTIVE))
+        tree = get_domain_xml_cache(self.cache_key).get_tree(domain, inactive=True)
         interface_list = tree.findall('devices/interface')
         for interface in interface_list:
             address_element = interface.find('address')
@@ -359,6 +380,8 @@ class QemuVnetDriver(VnetDriver):
         else:
             return False
 
+    @invalidates_inventory(NETWORKS, BRIDGES)
+    @invalidates_domain_xml
     def create_new_vif(self, inst_name, vif_index=None, device_name=None, network=None, bridge=None, MAC=None):
         """
         @param inst_name: name of the guest VM
@@ -445,6 +468,8 @@ class QemuVnetDriver(VnetDriver):
 
         return vif_element
 
+    @invalidates_inventory(NETWORKS, BRIDGES)
+    @invalidates_domain_xml
     def destroy_vif(self, inst_name, vif_index):
         """
         In order to be keep same with Xen, destroy it in config
@@ -469,6 +494,7 @@ class QemuVnetDriver(VnetDriver):
 
         return ret == 0
 
+    @invalidates_domain_xml
     def plug_vif_to_vm(self, inst_name, vif_index):
         """
         @description: Hotplug the specified VIF to the running VM
@@ -494,6 +520,7 @@ class QemuVnetDriver(VnetDriver):
             log.error("Exceptions when plug vif: %s", error)
             return False
 
+    @invalidates_domain_xml
     def unplug_vif_from_vm(self, inst_name, vif_index):
         """
         @description Hot-unplug the specified VIF from the running VM
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: transport_cache.py
+ Author: longhui
+ Created Time: 2026-10-18 10:31:07
+ Descriptions: remember the url scheme which last connected to a host successfully, such as qemu+tcp for libvirt or
+        https for Xenserver, so that the next connection try it first instead of waiting for the other one to timeout
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from lib.Log.log import log
+
+
+TRANSPORT_CACHE_FILE = os.getenv("VIRT_TRANSPORT_CACHE",
+                                 os.path.join(os.path.expanduser("~"), ".dev_virt", "transport_cache.json"))
+# the other scheme is probed again after the entry expired
+TRANSPORT_CACHE_TTL = int(os.getenv("VIRT_TRANSPORT_CACHE_TTL", 24 * 3600))
+
+
+class TransportCache(object):
+    """
+    A json file with content: {"platform/host": {"scheme": "qemu+tcp", "time": 1539830400.0}}
+    """
+
+    def __init__(self, path=TRANSPORT_CACHE_FILE, ttl=TRANSPORT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(platform, host):
+        return "%s/%s" % (platform, host)
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _dump(self, entries):
+        """
+        write to a temp file and rename it, so a concurrent reader never sees a partial file
+        """
+        cache_dir = os.path.dirname(self.path) or "."
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp_path = tempfile.mkstemp(prefix=".transport_cache", dir=cache_dir)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entries, tmp_file)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as error:
+            log.debug("Can not write transport cache %s: %s", self.path, error)
+
+    def get(self, platform, host):
+        """
+        :return: the scheme last succeed to the host, None if no entry or the entry expired
+        """
+        with self._lock:
+            entry = self._load().get(self._key(platform, host), None)
+        if not isinstance(entry, dict):
+            return None
+        if time.time() - entry.get("time", 0) > self.ttl:
+            return None
+        return entry.get("scheme", None)
+
+    def set(self, platform, host, scheme):
+        """
+        record the scheme succeed to the host, the file is only rewritten when the entry is missing, expired or the
+        scheme changed. The time of an entry is kept while the same scheme succeeds, so the other scheme is tried again
+        once it expires.
+        """
+        key = self._key(platform, host)
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key, None)
+            if isinstance(entry, dict) and entry.get("scheme") == scheme and now - entry.get("time", 0) <= self.ttl:
+                return
+            entries[key] = {"scheme": scheme, "time": now}
+            self._dump(entries)
+
+    def order(self, platform, host, schemes):
+        """
+        :param schemes: the schemes in default order
+        :return: the schemes with the cached one moved to the first
+        """
+        cached = self.get(platform, host)
+        if cached not in schemes:
+            return list(schemes)
+        return [cached] + [scheme for scheme in schemes if scheme != cached]
+
+
+_transport_cache = TransportCache()
+
+
+def get_transport_cache():
+    """
+    :return: the process wide transport cache
+    """
+    return _transport_cache
+
+
+def connect_by_transports(platform, host, schemes, connector):
+    """
+    try the schemes one by one, beginning with the one last succeed to the host
+    :param schemes: the schemes in default order, such as ["qemu+tls", "qemu+tcp"]
+    :param connector: function(scheme), return a handler or raise exception when failed
+    :return: the handler or None if all schemes failed
+    """
+    cache = get_transport_cache()
+    ordered_schemes = cache.order(platform, host, schemes)
+    for index, scheme in enumerate(ordered_schemes):
+        try:
+            handler = connector(scheme)
+        except Exception as error:
+            if index + 1 < len(ordered_schemes):
+                log.debug("Can not connect to %s with %s, error: %s. Retrying...", host, scheme, error)
+            else:
+                log.error("Can not connect to %s with %s, error: %s", host, scheme, error)
+            continue
+
+        cache.set(platform, host, scheme)
+        return handler
+
+    return None
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+ File Name: transport_cache_test.py
+ Author: longhui
+ Created Time: 2026-10-18 10:52:36
+'''
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from lib.Val.transport_cache import TransportCache
+
+
+class TransportCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "cache", "transport_cache.json")
+        self.cache = TransportCache(path=self.path, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_default_order(self):
+        self.assertIsNone(self.cache.get("KVM", "host1"))
+        self.assertEqual(self.cache.order("KVM", "host1", ["qemu+tls", "qemu+tcp"]), ["qemu+tls", "qemu+tcp"])
+
+    def test_cached_scheme_first(self):
+        self.cache.set("KVM", "host1", "qemu+tcp")
+        self.assertEqual(self.cache.order("KVM", "host1", ["qemu+tls", "qemu+tcp"]), ["qemu+tcp", "qemu+tls"])
+        # shared through the file with other process
+        self.assertEqual(TransportCache(path=self.path, ttl=60).get("KVM", "host1"), "qemu+tcp")
+        self.assertIsNone(self.cache.get("Xen", "host1"))
+
+    def test_expired_entry(self):
+        self.cache.set("KVM", "host1", "qemu+tcp")
+        self.cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(self.cache.get("KVM", "host1"))
+
+    def test_expire_while_used(self):
+        cache = TransportCache(path=self.path, ttl=0.2)
+        cache.set("KVM", "host1", "qemu+tcp")
+        time.sleep(0.12)
+        # connected again with the same scheme after ttl/2, the entry still expires in time
+        self.assertEqual(cache.get("KVM", "host1"), "qemu+tcp")
+        cache.set("KVM", "host1", "qemu+tcp")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("KVM", "host1"))
+
+    def test_broken_file(self):
+        self.cache.set("KVM", "host1", "qemu+tcp")
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{broken")
+        self.assertIsNone(self.cache.get("KVM", "host1"))
+        self.cache.set("KVM", "host1", "qemu+tls")
+        self.assertEqual(self.cache.get("KVM", "host1"), "qemu+tls")
+
+
+if __name__ == "__main__":
+    unittest.main()
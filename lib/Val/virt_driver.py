@@ -5,33 +5,41 @@
 import abc
 import six
 
+from lib.Utils.constans import POWER_STATE_TIMEOUT
+from lib.Utils.signal_utils import wait_until
+from lib.Val.connection_pool import PooledHandlerMixin
+
+# power states of VM instance, the same as power_state in Xen
+POWER_RUNNING = "Running"
+POWER_HALTED = "Halted"
+POWER_PAUSED = "Paused"
+POWER_SUSPENDED = "Suspended"
+
 
 @six.add_metaclass(abc.ABCMeta)
-class VirtDriver(object):
+class VirtDriver(PooledHandlerMixin):
     '''
     abstract class for virt driver
     '''
 
-    def __init__(self, hostname=None, user=None, passwd=None):
+    # name of virtual platform, set by derived class
+    platform = None
+    # whether the handler can be used by many threads at the same time
+    thread_safe = False
+
+    def __init__(self, hostname=None, user=None, passwd=None, pool=None):
         self.hostname = hostname
         self.user = user
         self.passwd = passwd
         self._hypervisor_handler = None
+        # HandlerPool shared by drivers, None means the driver owns its handler
+        self._pool = pool
 
     def __nonzero__(self):
         if self._hypervisor_handler is None:
             return False
         return True
 
-    @staticmethod
-    def timeout_handler(signal_num, frame):
-        """
-        :param signal_num:
-        :param frame:
-        :return:
-        """
-        raise Exception("get timeout signal.")
-
     @abc.abstractmethod
     def get_vm_list(self):
         """
@@ -112,6 +120,23 @@ class VirtDriver(object):
         '''
         raise NotImplementedError()
 
+    def _get_power_state(self, inst_name):
+        '''
+        @param inst_name: instance name
+        @return: POWER_RUNNING, POWER_HALTED, etc, None if the instance doesn't exist
+        '''
+        raise NotImplementedError()
+
+    def wait_for_state(self, inst_name, states, timeout=POWER_STATE_TIMEOUT):
+        '''
+        wait until the instance is in one of states, by polling the power state, the derived class may wait on the
+        hypervisor events and fall back to it
+        @param states: a list of power states, such as [POWER_RUNNING]
+        @param timeout: seconds to wait
+        @return: True if the instance reaches the states in time, else False
+        '''
+        return wait_until(lambda: self._get_power_state(inst_name) in states, timeout)
+
     @abc.abstractmethod
     def add_vdisk_to_vm(self, inst_name, storage_name, size):
         """
@@ -163,6 +188,19 @@ class VirtDriver(object):
         """
         raise NotImplementedError()
 
+    def get_all_vm_records(self):
+        """
+        return the records of all the VMs, driver can override it to fetch them in bulk
+        :return: a dict with VM name as key and the record same as get_vm_record as value, the record may also
+                 have a 'disk_info' same as get_all_disk
+        """
+        all_records = {}
+        for inst_name in self.get_vm_list():
+            vm_record = self.get_vm_record(inst_name)
+            if vm_record:
+                all_records[inst_name] = vm_record
+        return all_records
+
     @abc.abstractmethod
     def get_host_all_storages(self):
         """
@@ -8,6 +8,9 @@
 #########################################################################
 
 import os
+
+from lib.Val.connection_pool import get_handler_pool
+
 PLATFORM = os.getenv("PLATFORM", "Xen")
 
 if PLATFORM == "Xen":
@@ -27,27 +30,31 @@ class VirtFactory(object):
     '''
 
     @classmethod
-    def get_virt_driver(cls, host_name=None, user="root", passwd=""):
+    def get_virt_driver(cls, host_name=None, user="root", passwd="", pooled=True):
         '''
         return virt driver
+        :param pooled: share the connection with other drivers to the same host, set False to own a connection
         '''
+        pool = get_handler_pool() if pooled else None
         if PLATFORM == 'Xen':
-            return XenVirtDriver(host_name, user, passwd)
+            return XenVirtDriver(host_name, user, passwd, pool=pool)
 
         if PLATFORM == 'KVM':
-            return QemuVirtDriver(host_name, user=user, passwd=passwd)
+            return QemuVirtDriver(host_name, user=user, passwd=passwd, pool=pool)
 
         raise TypeError('No virtual driver supported')
 
     @classmethod
-    def get_vnet_driver(cls, host_name=None, user="root", passwd="passwd"):
+    def get_vnet_driver(cls, host_name=None, user="root", passwd="passwd", pooled=True):
         '''
         return vnet
+        :param pooled: share the connection with other drivers to the same host, set False to own a connection
         '''
+        pool = get_handler_pool() if pooled else None
         if PLATFORM == 'Xen':
-            return XenVnetDriver(host_name, user, passwd)
+            return XenVnetDriver(host_name, user, passwd, pool=pool)
 
         if PLATFORM == 'KVM':
-            return  QemuVnetDriver(host_name, user, passwd)
+            return  QemuVnetDriver(host_name, user, passwd, pool=pool)
 
         raise TypeError('No network driver supported')
@@ -9,33 +9,31 @@
 import abc
 import six
 
+from lib.Val.connection_pool import PooledHandlerMixin
+
 
 @six.add_metaclass(abc.ABCMeta)
-class VnetDriver(object):
+class VnetDriver(PooledHandlerMixin):
     '''
     base class of
     '''
 
-    def __init__(self, hostname=None, user="root", passwd=""):
+    # name of virtual platform, set by derived class
+    platform = None
+
+    def __init__(self, hostname=None, user="root", passwd="", pool=None):
         self.hostname = hostname
         self.user = user
         self.passwd = passwd
         self._hypervisor_handler = None
+        # HandlerPool shared by drivers, None means the driver owns its handler
+        self._pool = pool
 
     def __nonzero__(self):
         if self._hypervisor_handler is None:
             return False
         return True
 
-    @staticmethod
-    def timeout_handler(signal_num, frame):
-        """
-        :param signal_num:
-        :param frame:
-        :return:
-        """
-        raise Exception("Timeout signal raised")
-
     @abc.abstractmethod
     def get_network_list(self):
         """
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ File Name: collect_capacity.py
+ Author: longhui
+ Created Time: 2026-10-18 19:20:35
+ Description: collect the free memory and disk of all kvm servers, the network of templates and the ips in use to a
+        capacity snapshot file, which is read by schedule_node.py. Run it in crontab or with --interval.
+"""
+import json
+import os
+import time
+from optparse import OptionParser
+
+from lib.Log.log import log
+from lib.Utils.capacity_snapshot import CapacitySnapshot, CAPACITY_SNAPSHOT_FILE
+from lib.Utils.constans import template_dict
+from lib.Utils.schedule import collect_capacity_snapshot
+
+
+if __name__ == "__main__":
+    usage = """usage: %prog [options] arg1 arg2\n
+        collect_capacity.py [--file=snapshot_file]
+        collect_capacity.py --interval=seconds [--file=snapshot_file]
+        """
+    parser = OptionParser(usage=usage)
+    parser.add_option("--file", dest="snapshot_file", default=CAPACITY_SNAPSHOT_FILE,
+                      help="The capacity snapshot file, default %s" % CAPACITY_SNAPSHOT_FILE)
+    parser.add_option("--interval", dest="interval", type="int", default=0,
+                      help="Collect again every interval seconds, default 0 to collect once")
+
+    (options, args) = parser.parse_args()
+    log.debug("options:%s, args:%s", str(options), str(args))
+
+    if os.getenv("PLATFORM", "Xen") == "Xen":
+        log.fail("This script does'n support 'Xen'.")
+        exit(1)
+
+    config_dict = template_dict
+    try:
+        config_file = os.path.join(os.path.dirname(__file__), "../etc/Nodeconfig.json")
+        with open(config_file, "r") as f:
+            try:
+                config_dict.update(json.load(f))
+            except (KeyError, ValueError) as e:
+                log.fail("raised exception while load json: %s", e)
+                exit(1)
+    except IOError as err:
+        log.warn("%s; Will use default config", err)
+
+    snapshot = CapacitySnapshot(options.snapshot_file)
+    while True:
+        start = time.time()
+        ret = collect_capacity_snapshot(config_dict, snapshot)
+        if ret:
+            log.success("Capacity snapshot written to %s in %.1f seconds.", options.snapshot_file, time.time() - start)
+        else:
+            log.fail("Failed to collect capacity snapshot.")
+
+        if options.interval <= 0:
+            exit(0 if ret else 1)
+        time.sleep(max(options.interval - (time.time() - start), 0))
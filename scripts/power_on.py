@@ -7,8 +7,8 @@
 '''
 
 from optparse import OptionParser
-import time
 from lib.Log.log import log
+from lib.Utils.constans import BULK_POWER_RATE, BULK_POWER_WORKERS
 from lib.Utils.vm_utils import VirtHostDomain
 
 if __name__ == "__main__":
@@ -25,6 +25,10 @@ if __name__ == "__main__":
 
     parser.add_option("--all", dest="all", action="store_true",
                       help="Power on all VMs in server")
+    parser.add_option("--workers", dest="workers", type="int", default=BULK_POWER_WORKERS,
+                      help="Max number of VMs to power on at the same time, default %s" % BULK_POWER_WORKERS)
+    parser.add_option("--rate", dest="rate", type="float", default=BULK_POWER_RATE,
+                      help="Max number of VMs to power on per second, 0 for no limit, default %s" % BULK_POWER_RATE)
 
     (options, args) = parser.parse_args()
     log.debug("options:%s, args:%s", str(options), str(args))
@@ -47,27 +51,19 @@ if __name__ == "__main__":
 
     if options.all:
         log.info("Start power on all VMs in server [%s].", host_name)
-        all_vms_names = virt_driver.get_vm_list()
-        for vm_name in all_vms_names:
-            virthost.power_on_vm(vm_name)
-            time.sleep(0.5)
-        exit(0)
+        report = virthost.bulk_power_on(virt_driver.get_vm_list(), workers=options.workers, rate=options.rate)
+        report.print_report()
+        exit(0 if report else 1)
     elif args:
-        res_dict = {}
-        for vm_name in args:
-            if not virt_driver.is_instance_exists(vm_name):
-                log.warn("No VM exists with name [%s].", vm_name)
-                res_dict[vm_name] = 1
-                continue
+        missing_vms = [vm_name for vm_name in args if not virt_driver.is_instance_exists(vm_name)]
+        for vm_name in missing_vms:
+            log.warn("No VM exists with name [%s].", vm_name)
 
-            res_dict.setdefault(vm_name, 0)
-            ret = virthost.power_on_vm(vm_name)
-            if not ret:
-                log.error("VM [%s] power on failed.", vm_name)
-                res_dict[vm_name] = 1
-            time.sleep(0.5)
+        report = virthost.bulk_power_on([vm_name for vm_name in args if vm_name not in missing_vms],
+                                     workers=options.workers, rate=options.rate)
+        report.print_report()
 
-        failed_vm_list = [item[0] for item in filter(lambda x:x[1] == 1, res_dict.items())]
+        failed_vm_list = missing_vms + sorted(report.failed)
         if failed_vm_list:
             log.fail("VMs %s power on failed.", str(failed_vm_list))
             exit(1)
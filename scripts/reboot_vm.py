@@ -7,8 +7,8 @@
 '''
 
 from optparse import OptionParser
-import time
 from lib.Log.log import log
+from lib.Utils.constans import BULK_POWER_RATE, BULK_POWER_WORKERS
 from lib.Utils.vm_utils import VirtHostDomain
 
 if __name__ == "__main__":
@@ -26,6 +26,10 @@ if __name__ == "__main__":
     parser.add_option("--all", dest="all", action="store_true",
                       help="Reset all VMs in this server")
     parser.add_option("--vm", dest="vm", help="Reset VM in server")
+    parser.add_option("--workers", dest="workers", type="int", default=BULK_POWER_WORKERS,
+                      help="Max number of VMs to reset at the same time, default %s" % BULK_POWER_WORKERS)
+    parser.add_option("--rate", dest="rate", type="float", default=BULK_POWER_RATE,
+                      help="Max number of VMs to reset per second, 0 for no limit, default %s" % BULK_POWER_RATE)
 
     (options, args) = parser.parse_args()
     log.debug("options:%s, args:%s", str(options), str(args))
@@ -47,11 +51,9 @@ if __name__ == "__main__":
 
     if options.all:
         log.info("Start reset all VMs in server.")
-        all_vms_names = virt_driver.get_vm_list()
-        for vm_name in all_vms_names:
-            virthost.reset_vm(vm_name)
-            time.sleep(1)
-        exit(0)
+        report = virthost.bulk_reset(virt_driver.get_vm_list(), workers=options.workers, rate=options.rate)
+        report.print_report()
+        exit(0 if report else 1)
 
     elif options.vm is not None:
         vm_name = options.vm
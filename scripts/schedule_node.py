@@ -13,13 +13,17 @@ from optparse import OptionParser
 
 from lib.Log.log import log
 from lib.Utils.constans import template_dict, DISK_POOL, DEFAULT_NETWORK, Libvirtd_User, Libvirtd_Pass
-from lib.Utils.schedule import get_available_vm_info
+from lib.Utils.constans import PROVISION_WORKERS
+from lib.Utils.placement import PLACEMENT_CONFIG_KEY
+from lib.Utils.provision import ProvisionExecutor
+from lib.Utils.schedule import build_provision_servers, get_available_vm_info, plan_vms
 from lib.Utils.vm_utils import VirtHostDomain
 
 
 if __name__ == "__main__":
     usage = """usage: %prog [options] arg1 arg2\n
-        schedule_node.py --role=rolename --cluster=[test|xyz|kvm]
+        schedule_node.py --role=rolename --cluster=[test|xyz|kvm] [--refresh] [--explain]
+        schedule_node.py --role=rolename --cluster=[test|xyz|kvm] --count=N [--workers=N] [--refresh] [--explain]
         schedule_node.py --role=rolename --name=new_vm_name --host=hostip --ip=vm_ip
         schedule_node.py --list-roles
         """
@@ -30,6 +34,14 @@ if __name__ == "__main__":
     parser.add_option("--ip", dest="vm_ip", help="The ip assigned to the vm")
     parser.add_option("--cluster", dest="cluster", help="The target cluster name, support test|xyz|kvm")
     parser.add_option("--list-roles", dest="list_roles", action="store_true", help="List all supported role names")
+    parser.add_option("--refresh", dest="refresh", action="store_true",
+                      help="Read the servers and network even if there is a capacity snapshot from collect_capacity.py")
+    parser.add_option("--explain", dest="explain", action="store_true",
+                      help="Show the ranking of servers and why a server is rejected when schedule")
+    parser.add_option("--count", dest="count", type="int", default=1,
+                      help="The number of vms to schedule and create with '--cluster', default 1")
+    parser.add_option("--workers", dest="workers", type="int", default=PROVISION_WORKERS,
+                      help="Max number of vms created at the same time with '--count', default %s" % PROVISION_WORKERS)
 
     (options, args) = parser.parse_args()
     log.debug("options:%s, args:%s", str(options), str(args))
@@ -54,7 +66,7 @@ if __name__ == "__main__":
     log.debug(pprint.pformat(config_dict))
 
     if options.list_roles:
-        log.info("Supported role names: %s", list(config_dict.keys()))
+        log.info("Supported role names: %s", [name for name in config_dict if name != PLACEMENT_CONFIG_KEY])
         log.info("You can add a role in the config file: %s", config_file)
         exit(0)
 
@@ -65,16 +77,44 @@ if __name__ == "__main__":
         exit(1)
 
     role_name = str.strip(options.rolename)
-    if role_name not in config_dict:
+    if role_name not in config_dict or role_name == PLACEMENT_CONFIG_KEY:
         log.fail("Does not support role: %s", options.rolename)
         exit(1)
 
+    if options.count < 1 or (options.count > 1 and options.cluster is None):
+        log.fail("'--count' should be a positive number and used with '--cluster'.")
+        exit(1)
+
+    # "schedule_node.py --role=rolename --cluster=cluster-name --count=N", plan all the vms once and create them
+    if options.cluster is not None and options.count > 1:
+        plan = plan_vms(role_name, options.cluster, config_dict, options.count, refresh=options.refresh,
+                        explain=options.explain)
+        if not plan:
+            log.fail("Can not scheduale %s new vms to servers, exiting...", options.count)
+            exit(1)
+
+        log.info(">>")
+        for host_name, new_vm_name, vm_ip in plan:
+            log.info("Get schedualed VM with: host_ip=%s, new_vm_name=%s, vm_ip=%s", host_name, new_vm_name, vm_ip)
+        log.info(">>")
+
+        executor = ProvisionExecutor(build_provision_servers(plan, config_dict[role_name]), workers=options.workers)
+        failed = executor.run()
+        if failed:
+            for vm_name in sorted(failed):
+                log.fail("Failed to create VM [%s] on server [%s], failed step: %s.", vm_name, failed[vm_name][0],
+                         failed[vm_name][1])
+            exit(1)
+        log.success("Create %s VMs and power on successfully.", len(plan))
+        exit(0)
+
     # if "--cluster" is given, use  command "schedule_node.py --role=rolename --cluster=cluster-name" 
     if options.cluster is not None:
         cluster_name = options.cluster
         #  when no input, find default server and default vmname and IP
         host_name, new_vm_name, vm_ip = None, None, None
-        host_name, new_vm_name, vm_ip = get_available_vm_info(role_name, cluster_name, config_dict)
+        host_name, new_vm_name, vm_ip = get_available_vm_info(role_name, cluster_name, config_dict,
+                                                              refresh=options.refresh, explain=options.explain)
 
         if host_name is None or vm_ip is None:
             log.fail("Can not scheduale new vm to a server, exiting...")
@@ -8,21 +8,31 @@
 """
 
 import os
-import time
 from optparse import OptionParser
 from lib.Log.log import log
 import lib.Utils.xml_utils as xml_utils
+from lib.Utils.constans import PROVISION_HOST_WORKERS, PROVISION_WORKERS
+from lib.Utils.provision import ProvisionExecutor, STEP_DISK, STEP_POWER_ON
 from lib.Utils.vm_utils import VirtHostDomain
 
 
 if __name__ == "__main__":
     usage = """usage: %prog [options] arg1 arg2\n
         setup_vms.py --validate xmlFile
-        setup_vms.py --create   xmlFile
+        setup_vms.py --create   xmlFile [--resume] [--workers=8 --host-workers=2]
         """
     parser = OptionParser(usage=usage)
     parser.add_option("--validate", dest="validate", action="store_true", help="Validate the given xml file")
     parser.add_option("--create", dest="create", action="store_true", help="Do the create up according to the xml file")
+    parser.add_option("--resume", dest="resume", action="store_true",
+                      help="Resume a former create of the xml file, skip the steps already done")
+    parser.add_option("--state-file", dest="state_file",
+                      help="File to save the steps done for resuming, default is the xml file name with '.state'")
+    parser.add_option("--workers", dest="workers", type="int", default=PROVISION_WORKERS,
+                      help="Max number of VMs created at the same time, default %s" % PROVISION_WORKERS)
+    parser.add_option("--host-workers", dest="host_workers", type="int", default=PROVISION_HOST_WORKERS,
+                      help="Max number of VMs created at the same time on one server, default %s"
+                           % PROVISION_HOST_WORKERS)
 
     (options, args) = parser.parse_args()
     log.debug("options:%s, args:%s", str(options), str(args))
@@ -52,6 +62,13 @@ if __name__ == "__main__":
     parsed_xml = xml_utils.parse_xml(filename)
     # [{'passwd': '123456', 'host': '192.168.1.10', 'user': 'root', 'vms': []}]
 
+    state_file = options.state_file if options.state_file else filename + ".state"
+    if create and not options.resume and os.path.isfile(state_file):
+        log.info("Remove the state file %s of former create, use --resume to continue it.", state_file)
+        os.remove(state_file)
+    executor = ProvisionExecutor(parsed_xml, state_file=state_file if create else None, workers=options.workers,
+                                 host_workers=options.host_workers)
+
     # 1. validate xml items
     iplist = []
     for server in parsed_xml:
@@ -77,13 +94,17 @@ if __name__ == "__main__":
         bridge_list = virthost.get_bridge_list()
         network_list = virthost.get_network_list()
         for vm in server['vms']:
-            if virt_driver.is_instance_exists(vm['vmname']):
+            # the resources of a VM created by the former run are already taken
+            done_steps = executor.state.done_steps(hostname, vm['vmname'])
+            if done_steps:
+                log.info("VM [%s] was partially created, steps done: %s", vm['vmname'], done_steps)
+            elif virt_driver.is_instance_exists(vm['vmname']):
                 log.fail("There is already one VM named [%s]", vm['vmname'])
                 exit(1)
-            if vm['template'] not in virt_driver.get_templates_list():
+            elif vm['template'] not in virt_driver.get_templates_list():
                 log.fail("No template named: %s on server %s", vm['template'], virthost.server_name)
                 exit(1)
-            if vm['memory']:
+            if vm['memory'] and STEP_POWER_ON not in done_steps:
                 total_memory += float(vm['memory'])
             if vm['minMemory'] and vm['memory'] and vm['minMemory'] > vm['memory']:
                 log.fail("minMemory should not be more than memory!")
@@ -91,7 +112,9 @@ if __name__ == "__main__":
             if vm['maxMemory'] and vm['memory'] and vm['maxMemory'] < vm['memory']:
                 log.fail("maxMemory should  be more than memory!")
                 exit(1)
-            for diskdic in vm['disks']:
+            for disk_index, diskdic in enumerate(vm['disks']):
+                if STEP_DISK % disk_index in done_steps:
+                    continue
                 storage = diskdic['storage']
                 if not storage:
                     storage = default_sr
@@ -123,6 +146,8 @@ if __name__ == "__main__":
                     log.fail("No available bridge [%s] in server [%s].", ipdic['bridge'], hostname)
                     exit(1)
                 log.debug("VM [%s] has a IP infor: %s", vm['vmname'], ipdic)
+                if done_steps:
+                    continue
                 if not virthost.is_IP_available(ipdic['ip'], ipdic['netmask'], ipdic['device'], ipdic['network'],
                                                 ipdic['bridge']):
                     log.fail("IP [%s] check failed in vm [%s].", ipdic['ip'], vm['vmname'])
@@ -147,57 +172,12 @@ if __name__ == "__main__":
     else:
         log.info("All resource validate successfully.")
     # 2. create vms in xml
-    for server in parsed_xml:
-        hostname, user, passwd = server['host'], server['user'], server['passwd']
-        virthost = VirtHostDomain(hostname, user, passwd)
-        vnet_driver = virthost.vnet_driver
-        virt_driver = virthost.virt_driver
-
-        log.info("Start to create VMs in server: %s", hostname)
-        for vm in server['vms']:
-            vmname = vm['vmname']
-            log.info("Start to create vm [%s]!", vmname)
-            ret = virthost.create_vm(vmname, vm['template'])
-            if not ret:
-                log.fail("Failed to create VM [%s].Exiting....", vmname)
-                exit(1)
-            log.info("New instance [%s] created successfully.", vmname)
-
-            log.info("Start to config vm [%s].", vmname)
-
-            virthost.config_vcpus(vmname, vcpu_max=vm['cpumax'])
-            if vm['maxMemory']:
-                virthost.config_max_memory(vmname, static_max=vm['maxMemory'])
-            if vm['minMemory']:
-                virthost.config_min_memory(vmname, static_min=vm['minMemory'])
-            if vm['memory']:
-                virthost.config_memory(vmname, dynamic_min=vm['memory'], dynamic_max=vm['memory'])
-
-            for ipdic in vm['ips']:
-                virthost.config_vif(vmname, ipdic['vifIndex'], ipdic['device'], ipdic['network'], ipdic['bridge'],
-                                    ipdic['ip'])
-
-            for diskdic in vm['disks']:
-                storage = diskdic['storage']
-                if not storage:
-                    storage = virthost.get_max_free_size_storage()  # calc the default sr online
-                virthost.add_vm_disk(vmname, storage, diskdic['size'])
-
-            ret = virthost.power_on_vm(vmname)
-            if not ret:
-                log.warn("Create VM [%s] successfully, but power on vm return False.", vmname)
-            else:
-                if vm['cpucores']:
-                    t = 0
-                    while t <= 10 and not virthost.allowed_set_vcpu_live(vmname):
-                        log.info("Waiting vm to power on and set vcpu lively....")
-                        time.sleep(2)
-                        t += 2
-                    if virthost.allowed_set_vcpu_live(vmname):
-                        virthost.config_vcpus(vmname, vcpu_nums=vm['cpucores'])
-                    else:
-                        log.warn("After waiting for %ss and haven't power on to set vcpu lively.", t)
-                log.info("Create VM [%s] and power on successfully", vmname)
+    failed = executor.run()
+    if failed:
+        for vmname, (hostname, step) in sorted(failed.items()):
+            log.error("Failed to create VM [%s] on server [%s] at step: %s", vmname, hostname, step)
+        log.fail("Failed to create %s VMs, fix the errors and run again with --resume.", len(failed))
+        exit(1)
 
     log.success("All vms created on all servers.")
     exit(0)
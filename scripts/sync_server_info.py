@@ -3,6 +3,7 @@
 
 
 from optparse import OptionParser
+from lib.Db.sync_state import get_sync_state
 from lib.Log.log import log
 from lib.Utils.vm_utils import VirtHostDomain
 from lib.Utils.server_utils import ServerDomain
@@ -15,6 +16,8 @@ if __name__ == "__main__":
         sync_vm_info.py             [--host=ip --user=user --pwd=passwd]
         sync_vm_info.py --update    [--host=ip --user=user --pwd=passwd]
         sync_vm_info.py --vm=vmname [--host=ip --user=user --pwd=passwd]
+
+        Only the fields changed since last sync are written, use --force-full to write all of them.
         """
 
     parser = OptionParser(usage=usage)
@@ -23,6 +26,8 @@ if __name__ == "__main__":
     parser.add_option("-p", "--pwd", dest="passwd", help="Passward for host server")
     parser.add_option("--update", dest="update", action="store_true", help="Update the server's infor to database")
     parser.add_option("--vm", dest="vm_name", help="Sync the VM's infor to database")
+    parser.add_option("--force-full", dest="force_full", action="store_true",
+                      help="Write all the fields even they are not changed since last sync")
 
     (options, args) = parser.parse_args()
     log.debug("options: %s, args: %s", options, args)
@@ -34,6 +39,8 @@ if __name__ == "__main__":
     host_name = options.host
     user = options.user if options.user else "root"
     passwd = str(options.passwd).replace('\\', '') if options.passwd else ""
+    sync_state = get_sync_state()
+    sync_state.force_full = bool(options.force_full)
 
 
     if options.vm_name:
@@ -44,7 +51,9 @@ if __name__ == "__main__":
         if not virt_host.virt_driver.is_instance_exists(options.vm_name):
             log.fail("VM [%s] doesn't exist. Exiting...", options.vm_name)
             exit(1)
-        if virt_host.update_database_info(inst_name=options.vm_name):
+        ret = virt_host.update_database_info(inst_name=options.vm_name)
+        log.info(sync_state.summary())
+        if ret:
             log.success("Sync VM [%s] information successfully.", options.vm_name)
             exit(0)
         else:
@@ -57,8 +66,11 @@ if __name__ == "__main__":
             exit(1)
         server.update_database_info()
         virt_host = VirtHostDomain(host_name, user, passwd)
-        for vm_name in  virt_host.virt_driver.get_vm_list():
-            virt_host.update_database_info(inst_name=vm_name)
+        # diff all VMs with their records at once, and only update the changed ones
+        failed = virt_host.sync_database_info()
+        log.info(sync_state.summary())
+        if failed:
+            exit(1)
 
     else:
         server = ServerDomain(host_name, user, passwd)
@@ -68,8 +80,10 @@ if __name__ == "__main__":
         server.create_database_info()
         server.update_database_info()
         virt_host = VirtHostDomain(host_name, user, passwd)
-        for vm_name in virt_host.virt_driver.get_vm_list():
-            virt_host.create_database_info(inst_name=vm_name)
-            virt_host.update_database_info(inst_name=vm_name)
+        all_records = virt_host.virt_driver.get_all_vm_records()
+        for vm_name in sorted(all_records):
+            virt_host.create_database_info(inst_name=vm_name, vm_record=all_records[vm_name])
+        virt_host.sync_database_info()
+        log.info(sync_state.summary())
 
 